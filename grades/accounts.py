@@ -0,0 +1,76 @@
+# grades/accounts.py
+"""Set-based UserProfile maintenance shared by the account commands.
+
+Roles are derived in SQL from the user's flags (superuser -> admin, staff
+-> teacher, otherwise student), so backfilling profiles for any number of
+users takes a handful of statements instead of queries per user.
+"""
+from collections import Counter
+
+from django.contrib.auth import get_user_model
+from django.db.models import Case, CharField, Count, Exists, OuterRef, Value, When
+
+from .models import Student, UserProfile
+from .writer import serialized_writes
+
+ROLE_FROM_FLAGS = Case(
+    When(is_superuser=True, then=Value('admin')),
+    When(is_staff=True, then=Value('teacher')),
+    default=Value('student'),
+    output_field=CharField(),
+)
+
+
+def users_without_profile(students_first=False):
+    """Users with no UserProfile, annotated with ``new_role``.
+
+    With ``students_first`` a user linked to a Student is always a student,
+    whatever their flags.
+    """
+    role = ROLE_FROM_FLAGS
+    if students_first:
+        role = Case(
+            When(Exists(Student.objects.filter(user=OuterRef('pk'))), then=Value('student')),
+            default=ROLE_FROM_FLAGS,
+            output_field=CharField(),
+        )
+    return get_user_model().objects.filter(profile__isnull=True).annotate(new_role=role)
+
+
+def count_by_role(users):
+    """{role: count} for a queryset from users_without_profile()."""
+    return dict(users.order_by().values_list('new_role').annotate(n=Count('pk')))
+
+
+def create_missing_profiles(users, batch_size=2000):
+    """bulk_create a profile for every user in ``users``; return {role: count}."""
+    created = Counter()
+    batch = []
+    with serialized_writes():
+        for pk, role in users.values_list('pk', 'new_role').iterator(chunk_size=batch_size):
+            batch.append(UserProfile(user_id=pk, role=role))
+            created[role] += 1
+            if len(batch) >= batch_size:
+                UserProfile.objects.bulk_create(batch, ignore_conflicts=True)
+                batch = []
+        if batch:
+            UserProfile.objects.bulk_create(batch, ignore_conflicts=True)
+    return dict(created)
+
+
+def role_fixes():
+    """(label, queryset of profiles, new role) for staff whose role is out of date.
+
+    Superusers become admins and other staff still marked as students become
+    teachers; staff already set to teacher or admin are left alone.
+    """
+    profiles = UserProfile.objects.all()
+    return [
+        ('superusers -> admin', profiles.filter(user__is_superuser=True).exclude(role='admin'), 'admin'),
+        ('staff -> teacher', profiles.filter(user__is_staff=True, user__is_superuser=False, role='student'),
+         'teacher'),
+    ]
+
+
+def format_counts(counts):
+    return ', '.join(f'{n} {role}' for role, n in sorted(counts.items())) or 'none'
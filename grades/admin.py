@@ -1,9 +1,69 @@
-from django.contrib import admin
+from django import forms
+from django.contrib import admin, messages
 from django.contrib.auth.admin import UserAdmin
 from django.contrib.auth.models import User
+from django.core.paginator import Paginator
+from django.db import connections
+from django.db.models import Case, Value, When
+from django.utils.functional import cached_property
 
 # Import your models
 from .models import Student, Subject, Grade
+from .curriculum import subjects_for_form
+from .rollups import rebuild_rollups
+from .search import search_student_ids
+from .writer import serialized_writes
+
+# Cap on indexed search hits shown in the admin changelists
+ADMIN_SEARCH_LIMIT = 500
+# Unfiltered changelists over tables larger than this show the planner's
+# row estimate instead of running an exact COUNT(*)
+ADMIN_ESTIMATED_COUNT_ABOVE = 100_000
+
+# Same bands as Grade.letter, computed by the database
+LETTER_GRADE = Case(
+    When(score__gte=80, then=Value('A')),
+    When(score__gte=70, then=Value('B')),
+    When(score__gte=60, then=Value('C')),
+    When(score__gte=40, then=Value('D')),
+    default=Value('F'),
+)
+
+
+def estimated_row_count(model, using='default'):
+    """The database's statistics estimate of ``model``'s row count, or None.
+
+    Postgres keeps one in pg_class (refreshed by autovacuum); SQLite only has
+    sqlite_stat1 once ANALYZE or ``PRAGMA optimize`` has run.
+    """
+    connection = connections[using]
+    table = model._meta.db_table
+    with connection.cursor() as cursor:
+        if connection.vendor == 'postgresql':
+            cursor.execute('SELECT reltuples::bigint FROM pg_class WHERE oid = %s::regclass', [table])
+            row = cursor.fetchone()
+            return row[0] if row and row[0] >= 0 else None
+        if connection.vendor == 'sqlite':
+            cursor.execute("SELECT 1 FROM sqlite_master WHERE type = 'table' AND name = 'sqlite_stat1'")
+            if cursor.fetchone() is None:
+                return None
+            cursor.execute('SELECT stat FROM sqlite_stat1 WHERE tbl = %s LIMIT 1', [table])
+            row = cursor.fetchone()
+            return int(row[0].split()[0]) if row else None
+    return None
+
+
+class EstimatedCountPaginator(Paginator):
+    """Paginator that skips the exact COUNT(*) on large unfiltered tables."""
+
+    @cached_property
+    def count(self):
+        queryset = self.object_list
+        if not queryset.query.where:
+            estimate = estimated_row_count(queryset.model, queryset.db)
+            if estimate is not None and estimate > ADMIN_ESTIMATED_COUNT_ABOVE:
+                return estimate
+        return super().count
 
 # Check if UserProfile exists in models (it should after migration)
 UserProfile = None
@@ -36,6 +96,7 @@ if UserProfile:
         
         list_display = UserAdmin.list_display + ('get_role',)
         list_filter = UserAdmin.list_filter + ('profile__role',)
+        list_select_related = ('profile',)  # get_role
     
     # Register/Unregister logic
     if admin.site.is_registered(User):
@@ -54,8 +115,19 @@ if UserProfile:
 @admin.register(Student)
 class StudentAdmin(admin.ModelAdmin):
     list_display = ('student_id', 'first_name', 'last_name', 'form', 'class_level', 'linked_user', 'assigned_password_status')
-    list_filter = ('form',)
+    list_filter = ('is_senior', 'base_form', 'stream', 'form')
+    list_select_related = ('user',)  # linked_user
     search_fields = ('first_name', 'last_name', 'student_id')
+    paginator = EstimatedCountPaginator
+    show_full_result_count = False
+    actions = ['clear_assigned_passwords']
+
+    def get_search_results(self, request, queryset, search_term):
+        # Indexed search (grades/search.py) instead of icontains table scans;
+        # also used by GradeAdmin's student autocomplete
+        if not search_term:
+            return queryset, False
+        return queryset.filter(pk__in=search_student_ids(search_term, ADMIN_SEARCH_LIMIT)), False
 
     def get_exclude(self, request, obj=None):
         if not request.user.is_superuser:
@@ -81,14 +153,73 @@ class StudentAdmin(admin.ModelAdmin):
         return "✓ Set" if obj.assigned_password else "✗ Not set"
     assigned_password_status.short_description = 'Password'
 
+    @admin.action(description='Clear assigned passwords of selected students', permissions=['change'])
+    def clear_assigned_passwords(self, request, queryset):
+        cleared = queryset.update(assigned_password=None)
+        self.message_user(request, f"Cleared the assigned password of {cleared} student(s).", messages.SUCCESS)
+
 
 @admin.register(Subject)
 class SubjectAdmin(admin.ModelAdmin):
-    list_display = ('name',)
+    list_display = ('name', 'stream', 'form_level')
+    list_filter = ('stream', 'form_level')
+
+
+class GradeAdminForm(forms.ModelForm):
+    class Meta:
+        model = Grade
+        fields = '__all__'
+
+    def clean(self):
+        cleaned = super().clean()
+        student, subject = cleaned.get('student'), cleaned.get('subject')
+        if student and subject and subject not in subjects_for_form(student.form):
+            self.add_error('subject', f"{subject.name} is not taught in {student.get_form_display()}.")
+        return cleaned
 
 
 @admin.register(Grade)
 class GradeAdmin(admin.ModelAdmin):
-    list_display = ('student', 'subject', 'score', 'letter', 'term', 'created_at')
-    list_filter = ('subject', 'term', 'student__form')
-    search_fields = ('student__first_name', 'student__last_name', 'student__student_id')
\ No newline at end of file
+    form = GradeAdminForm
+    # Columns read joined/annotated fields, not Student.__str__ and Grade.letter per row
+    list_display = ('student_name', 'student_code', 'subject_name', 'score', 'letter_grade', 'term',
+                    'academic_year', 'created_at')
+    list_select_related = ('student', 'subject')
+    list_filter = ('academic_year', 'term', 'subject', 'student__form')
+    search_fields = ('student__first_name', 'student__last_name', 'student__student_id')
+    autocomplete_fields = ('student',)
+    paginator = EstimatedCountPaginator
+    show_full_result_count = False
+
+    def get_queryset(self, request):
+        return super().get_queryset(request).annotate(letter_grade=LETTER_GRADE)
+
+    @admin.display(description='Student', ordering='student__last_name')
+    def student_name(self, obj):
+        return f"{obj.student.first_name} {obj.student.last_name}"
+
+    @admin.display(description='Student ID', ordering='student__student_id')
+    def student_code(self, obj):
+        return obj.student.student_id
+
+    @admin.display(description='Subject', ordering='subject__name')
+    def subject_name(self, obj):
+        return obj.subject.name
+
+    @admin.display(description='Letter', ordering='letter_grade')
+    def letter_grade(self, obj):
+        return obj.letter_grade
+
+    def delete_queryset(self, request, queryset):
+        # queryset.delete() would load every grade to send post_delete.
+        # Grades have no dependants, so issue one DELETE without signals and
+        # rebuild the affected forms' rollups instead of per-row deltas
+        forms = list(queryset.order_by().values_list('student__form', flat=True).distinct())
+        with serialized_writes():
+            queryset._raw_delete(queryset.db)
+            rebuild_rollups(forms=forms)
+
+    def get_search_results(self, request, queryset, search_term):
+        if not search_term:
+            return queryset, False
+        return queryset.filter(student_id__in=search_student_ids(search_term, ADMIN_SEARCH_LIMIT)), False
\ No newline at end of file
@@ -0,0 +1,162 @@
+# grades/archive.py
+"""Closing academic years: move their rows out of the live tables.
+
+Live rankings and results only read the current year (``Grade.objects.current()``),
+but old years still make every index and table scan bigger.  ``archive_year``
+writes a gzipped export of a closed year, copies its grades and published
+results into ArchivedGrade/ArchivedResult and deletes them from Grade and
+TermPublication, all in one transaction.  The current year is archived the
+same way once its results are final, before promotion moves the school on.  A closed year's transcript
+(``?year=`` on the transcript page and PDF) is built from the two archive
+tables; see grades/transcript.py.
+"""
+import csv
+import gzip
+import json
+import os
+
+from django.conf import settings
+from django.core.serializers.json import DjangoJSONEncoder
+from django.db import connection
+from django.db.models import F
+
+from .models import (
+    ArchivedGrade, ArchivedResult, Grade, ResultSnapshot, TermPublication, current_academic_year,
+)
+from .rollups import rebuild_rollups
+from .writer import serialized_writes
+
+GRADE_EXPORT_FIELDS = ['academic_year', 'term', 'student_id', 'first_name', 'last_name', 'form',
+                       'subject', 'score', 'created_at', 'updated_at']
+
+
+class ArchiveError(Exception):
+    pass
+
+
+def year_counts(year):
+    """{'grades': n, 'publications': n, 'results': n} still live for ``year``."""
+    return {
+        'grades': Grade.objects.filter(academic_year=year).count(),
+        'publications': TermPublication.objects.filter(academic_year=year).count(),
+        'results': ResultSnapshot.objects.filter(publication__academic_year=year).count(),
+    }
+
+
+def _year_forms(year):
+    """{student pk: form} from the year's last published results."""
+    rows = (ResultSnapshot.objects.filter(publication__academic_year=year)
+            .order_by('publication__term').values_list('student_id', 'form'))
+    return dict(rows.iterator())
+
+
+def _grade_rows(year, batch_size):
+    return (
+        Grade.objects.filter(academic_year=year).order_by('pk')
+        .values('student_id', 'subject_id', 'term', 'score', 'created_at', 'updated_at',
+                student_code=F('student__student_id'), first_name=F('student__first_name'),
+                last_name=F('student__last_name'), student_form=F('student__form'),
+                subject_name=F('subject__name'))
+        .iterator(chunk_size=batch_size)
+    )
+
+
+def _result_rows(year, batch_size):
+    return (
+        ResultSnapshot.objects.filter(publication__academic_year=year).order_by('pk')
+        .values('student_id', 'form', 'data', term=F('publication__term'),
+                published_at=F('publication__published_at'), student_code=F('student__student_id'))
+        .iterator(chunk_size=batch_size)
+    )
+
+
+def _write_gzip(path, write):
+    tmp = f'{path}.tmp'
+    with gzip.open(tmp, 'wt', encoding='utf-8', newline='') as fh:
+        write(fh)
+    os.replace(tmp, path)
+
+
+def export_year(year, export_dir=None, batch_size=2000):
+    """Write grades-<year>.csv.gz and results-<year>.jsonl.gz; return both paths."""
+    export_dir = export_dir or settings.ARCHIVE_EXPORT_DIR
+    os.makedirs(export_dir, exist_ok=True)
+    forms = _year_forms(year)
+
+    def write_grades(fh):
+        writer = csv.writer(fh)
+        writer.writerow(GRADE_EXPORT_FIELDS)
+        for row in _grade_rows(year, batch_size):
+            writer.writerow([year, row['term'], row['student_code'], row['first_name'], row['last_name'],
+                             forms.get(row['student_id'], row['student_form']), row['subject_name'],
+                             row['score'], row['created_at'].isoformat(), row['updated_at'].isoformat()])
+
+    def write_results(fh):
+        for row in _result_rows(year, batch_size):
+            fh.write(json.dumps({
+                'academic_year': year, 'term': row['term'], 'student_id': row['student_code'],
+                'form': row['form'], 'published_at': row['published_at'], 'result': row['data'],
+            }, cls=DjangoJSONEncoder) + '\n')
+
+    grades_path = os.path.join(export_dir, f'grades-{year}.csv.gz')
+    results_path = os.path.join(export_dir, f'results-{year}.jsonl.gz')
+    _write_gzip(grades_path, write_grades)
+    _write_gzip(results_path, write_results)
+    return grades_path, results_path
+
+
+def _copy_in_batches(rows, build, model, batch_size):
+    batch, copied = [], 0
+    for row in rows:
+        batch.append(build(row))
+        if len(batch) >= batch_size:
+            model.objects.bulk_create(batch)
+            copied += len(batch)
+            batch = []
+    if batch:
+        model.objects.bulk_create(batch)
+        copied += len(batch)
+    return copied
+
+
+def archive_year(year, export_dir=None, batch_size=2000):
+    """Export and archive a closed or the current year; return (counts, export paths)."""
+    current = current_academic_year()
+    if year > current:
+        raise ArchiveError(f'{year} has not started; the current academic year is {current}')
+
+    paths = export_year(year, export_dir, batch_size)
+    # Grades carry no form; use the one the year's results were published under
+    forms = _year_forms(year)
+    with serialized_writes():
+        grades = _copy_in_batches(_grade_rows(year, batch_size), lambda row: ArchivedGrade(
+            academic_year=year, term=row['term'], student_id=row['student_id'],
+            student_code=row['student_code'], form=forms.get(row['student_id'], row['student_form']),
+            subject_id=row['subject_id'], subject_name=row['subject_name'], score=row['score'],
+            created_at=row['created_at'], updated_at=row['updated_at'],
+        ), ArchivedGrade, batch_size)
+        results = _copy_in_batches(_result_rows(year, batch_size), lambda row: ArchivedResult(
+            academic_year=year, term=row['term'], student_id=row['student_id'],
+            student_code=row['student_code'], form=row['form'], published_at=row['published_at'],
+            data=row['data'],
+        ), ArchivedResult, batch_size)
+
+        # One statement instead of per-row delete signals; only the current
+        # year is in the rollups, and it is rebuilt (empty) in one go
+        with connection.cursor() as cursor:
+            cursor.execute(
+                f'DELETE FROM {connection.ops.quote_name(Grade._meta.db_table)} WHERE academic_year = %s',
+                [year],
+            )
+        _, deleted = TermPublication.objects.filter(academic_year=year).delete()
+        if year == current:
+            rebuild_rollups()
+    publications = deleted.get(TermPublication._meta.label, 0)
+    return {'grades': grades, 'results': results, 'publications': publications}, paths
+
+
+async def aarchived_years(student):
+    """Closed years with archived grades or results for ``student``, newest first (one UNION query)."""
+    grades = ArchivedGrade.objects.filter(student=student).order_by().values_list('academic_year', flat=True)
+    results = ArchivedResult.objects.filter(student=student).order_by().values_list('academic_year', flat=True)
+    return [year async for year in grades.union(results).order_by('-academic_year')]
@@ -0,0 +1,86 @@
+# grades/backends.py
+"""Authentication backend for student logins.
+
+Students sign in with their student ID or first name.  One indexed, joined
+query finds the student together with their linked user, and the password is
+checked against the user's stored hash, so a login costs at most one hash and
+writes nothing.  A first name only signs in when exactly one student has it;
+otherwise the student ID is needed, so a failed login never hashes against
+several accounts.
+
+Only the first sign-in (no linked user, no usable password yet) or a new
+teacher-assigned password does any writing: the entered initial password is
+hashed onto the linked user once and later logins take the path above.
+"""
+from django.contrib.auth import get_user_model
+from django.contrib.auth.backends import ModelBackend
+from django.db.models import Case, Q, When
+from django.db.models.functions import Lower
+from django.utils.crypto import constant_time_compare
+
+from .models import Student
+
+# Domain of the address new student accounts get until a real one is entered;
+# example.com is reserved and never delivers mail
+PLACEHOLDER_EMAIL_DOMAIN = 'example.com'
+
+
+def student_username(student):
+    return f"stu_{student.student_id}"
+
+
+def placeholder_email(student):
+    return f"{student.student_id}@{PLACEHOLDER_EMAIL_DOMAIN}"
+
+
+def initial_password(student):
+    """The password a new student account starts with."""
+    return student.assigned_password or student.student_id
+
+
+class StudentBackend(ModelBackend):
+    def authenticate(self, request, username=None, password=None, **kwargs):
+        if not username or not password:
+            return None
+        # The student ID match (unique) sorts first; two rows without one
+        # means the first name is shared
+        candidates = list(
+            Student.objects.select_related('user')
+            .alias(first_lower=Lower('first_name'))
+            .filter(Q(student_id=username) | Q(first_lower=username.lower()))
+            .order_by(Case(When(student_id=username, then=0), default=1))[:2]
+        )
+        if not candidates or (len(candidates) > 1 and candidates[0].student_id != username):
+            return None
+        student = candidates[0]
+
+        user = student.user
+        if (user is not None and user.has_usable_password()
+                and user.check_password(password) and self.user_can_authenticate(user)):
+            return user
+
+        # Not the stored password: accept a teacher-assigned password (e.g. after
+        # a reset), or the student ID while the account has no password yet
+        if student.assigned_password:
+            accepted = constant_time_compare(password, student.assigned_password)
+        else:
+            not_set_up = user is None or not user.has_usable_password()
+            accepted = not_set_up and constant_time_compare(password, student.student_id)
+        return self._set_up_account(student, password) if accepted else None
+
+    def _set_up_account(self, student, password):
+        """Link a user to the student and store the password hash (one-off)."""
+        user = student.user
+        if user is None:
+            User = get_user_model()
+            user, _ = User.objects.get_or_create(
+                username=student_username(student),
+                defaults={'email': placeholder_email(student)},
+            )
+            student.user = user
+            student.save(update_fields=['user'])
+        if not self.user_can_authenticate(user):
+            return None
+        user.set_password(password)
+        user.save(update_fields=['password'])
+        return user
@@ -0,0 +1,79 @@
+# grades/curriculum.py
+"""Which subjects each form takes, from a process-local curriculum map.
+
+``Subject.stream`` (all/science/humanities/junior/senior) and
+``Subject.form_level`` say where a subject is taught.  The Subject table is
+read once per process into {form code: subjects ordered by name}, so finding
+a form's subject columns is a dictionary lookup instead of a DISTINCT join
+over every grade.  Subject saves and deletes clear the map (see signals.py);
+``CURRICULUM_CACHE_SECONDS`` bounds how long other workers keep an old copy.
+"""
+import time
+
+from django.conf import settings
+
+from .models import SENIOR_FORMS, Student, Subject, stream_for_form
+
+# (loaded at, {form: tuple of Subject}, {form: {subject id: column index}})
+_curriculum = None
+
+
+def teaches(subject, form):
+    """True if ``subject`` is part of the curriculum for ``form`` (e.g. 'F3S')."""
+    if subject.form_level not in ('ALL', form[:2]):
+        return False
+    if subject.stream == 'JUNIOR':
+        return form not in SENIOR_FORMS
+    if subject.stream == 'SENIOR':
+        return form in SENIOR_FORMS
+    if subject.stream in ('SCIENCE', 'HUMANITIES'):
+        return stream_for_form(form) == subject.stream
+    return True
+
+
+def _build(subjects):
+    global _curriculum
+    subjects = sorted(subjects, key=lambda s: (s.name.lower(), s.pk))
+    by_form = {
+        form: tuple(s for s in subjects if teaches(s, form))
+        for form, _ in Student.FORM_CHOICES
+    }
+    order = {form: {s.pk: i for i, s in enumerate(row)} for form, row in by_form.items()}
+    _curriculum = (time.monotonic(), by_form, order)
+    return _curriculum
+
+
+def _cached():
+    cached = _curriculum
+    max_age = getattr(settings, 'CURRICULUM_CACHE_SECONDS', 300)
+    if cached is not None and time.monotonic() - cached[0] < max_age:
+        return cached
+    return None
+
+
+def _load():
+    return _cached() or _build(Subject.objects.all())
+
+
+async def _aload():
+    return _cached() or _build([s async for s in Subject.objects.all()])
+
+
+def invalidate():
+    """Drop this process's curriculum map; the next lookup re-reads Subject."""
+    global _curriculum
+    _curriculum = None
+
+
+def subjects_for_form(form):
+    """Subjects taught in ``form``, ordered by name (empty for unknown forms)."""
+    return _load()[1].get(form, ())
+
+
+def subject_order(form):
+    """{subject id: column index} for ``form``, for ordering a student's grades."""
+    return _load()[2].get(form, {})
+
+
+async def asubject_order(form):
+    return (await _aload())[2].get(form, {})
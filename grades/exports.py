@@ -0,0 +1,126 @@
+# grades/exports.py
+"""Class ranking sheets as CSV or XLSX, produced a form at a time.
+
+Each form costs one narrow grades query (student, subject, score tuples, no
+model instances), is ranked with the same rules as the report cards, and has
+its rows written before the next form is read, so memory is bounded by the
+largest form rather than the school.  CSV rows go straight to the client;
+XLSX uses openpyxl's write-only workbook, which spools rows to disk, and the
+finished file is sent in blocks.  Both are handed to the response as async
+iterators so an ASGI server streams them instead of buffering the body.
+"""
+import csv
+from itertools import islice
+
+from asgiref.sync import sync_to_async
+
+from .curriculum import subjects_for_form
+from .models import SENIOR_FORMS, Grade, Student, score_passes
+from .report_card import rank_form
+
+EXPORT_FORMATS = ('csv', 'xlsx')
+XLSX_CONTENT_TYPE = 'application/vnd.openxmlformats-officedocument.spreadsheetml.sheet'
+
+
+def subject_columns(forms):
+    """(subject_id, name) for every curriculum subject of ``forms``, in curriculum order."""
+    columns = {}
+    for form in forms:
+        for subject in subjects_for_form(form):
+            columns.setdefault(subject.pk, subject.name)
+    return list(columns.items())
+
+
+def header(subjects):
+    return [
+        'Position', 'Student ID', 'Name', 'Form',
+        *(name for _, name in subjects),
+        'Average', 'Points (best six)', 'Passed', 'Subjects taken',
+    ]
+
+
+def ranking_rows(form, term, subjects):
+    """Yield one row per student in ``form``, ranked students first by position.
+
+    Grades in subjects outside ``subjects`` still count towards the average,
+    points and pass count; they just have no column of their own.
+    """
+    is_senior = form in SENIOR_FORMS
+    rows = list(
+        Grade.objects.current().filter(student__form=form, term=term).order_by()
+        .values_list('student_id', 'subject_id', 'score')
+    )
+    ranking = rank_form(is_senior, rows)
+    scores = {}
+    for stu_id, subject_id, score in rows:
+        scores.setdefault(stu_id, {})[subject_id] = float(score)
+    del rows
+
+    students = Student.objects.filter(form=form).values_list('pk', 'student_id', 'first_name', 'last_name')
+    unranked = len(ranking.positions) + 1
+    for pk, code, first, last in sorted(
+        students, key=lambda s: (ranking.positions.get(s[0], unranked), s[3].lower(), s[2].lower())
+    ):
+        own = scores.get(pk, {})
+        values = list(own.values())
+        passed = sum(1 for v in values if score_passes(v, is_senior))
+        yield [
+            ranking.positions.get(pk, ''), code, f"{first} {last}", form,
+            *(own.get(subject_id, '') for subject_id, _ in subjects),
+            round(sum(values) / len(values), 1) if values else '',
+            ranking.metrics.get(pk, '') if is_senior else '',
+            passed, len(values),
+        ]
+
+
+class _Echo:
+    """File-like object whose write() hands the formatted line back."""
+
+    def write(self, value):
+        return value
+
+
+def csv_lines(forms, term):
+    """Yield the CSV text of the ranking sheet for ``forms``, one line at a time."""
+    subjects = subject_columns(forms)
+    writer = csv.writer(_Echo())
+    yield writer.writerow(header(subjects))
+    for form in forms:
+        for row in ranking_rows(form, term, subjects):
+            yield writer.writerow(row)
+
+
+def write_xlsx(forms, term, fileobj):
+    """Write a workbook with one ranking sheet per form to ``fileobj``."""
+    from openpyxl import Workbook
+
+    workbook = Workbook(write_only=True)
+    for form in forms:
+        subjects = subject_columns([form])
+        sheet = workbook.create_sheet(title=form)
+        sheet.append(header(subjects))
+        for row in ranking_rows(form, term, subjects):
+            sheet.append(row)
+    workbook.save(fileobj)
+
+
+def file_blocks(fileobj, block_size=64 * 1024):
+    """Yield ``fileobj`` in blocks from the start, closing it at the end."""
+    try:
+        fileobj.seek(0)
+        while block := fileobj.read(block_size):
+            yield block
+    finally:
+        fileobj.close()
+
+
+async def astream(iterator, batch=200):
+    """Drain a sync iterator in batches off the event loop.
+
+    Batches run on the sync thread, so the queries a generator makes share
+    the request's database connection.
+    """
+    iterator = iter(iterator)
+    next_batch = sync_to_async(lambda: list(islice(iterator, batch)))
+    while chunk := await next_batch():
+        yield b''.join(chunk) if isinstance(chunk[0], bytes) else ''.join(chunk)
@@ -0,0 +1,248 @@
+# grades/live.py
+"""Live class ranking updates for teachers watching marks come in.
+
+Each stream keeps one form/term ranking in memory.  It holds every student's
+term scores and the ranked students' sort keys in a sorted list.  Every
+``LIVE_RANKING_POLL_SECONDS`` it reads the (pk, updated_at) of the form's
+grades saved in the last ``LATE_COMMIT_SECONDS`` and compares them with the
+stamps it has already seen.  The max ``updated_at`` alone is not enough:
+``auto_now`` stamps a grade when it is saved, not when it commits, so a
+slow transaction can commit a grade older than one already seen.  Only the
+grades of students with new stamps are read.  Each of those students is
+recomputed and moved to its new slot with bisect, and only rows whose
+content or position changed are sent.  If the grade count then disagrees
+with the database (a delete, a student moving form, a bulk write that
+skipped updated_at), the form is re-read and diffed student by student.
+Even then, only the rows that changed go out.  Students who have left the
+form since the last poll are dropped and sent as removals.
+
+Polling the database, rather than listening to save signals, lets a grade
+saved by any worker process reach every stream, and works on SQLite.
+"""
+import asyncio
+import json
+import time
+from bisect import bisect_left
+from datetime import timedelta
+
+from django.conf import settings
+
+from .models import (
+    SENIOR_FORMS, Grade, Student, acurrent_academic_year, letter_for_score, score_passes, senior_point_for_score,
+)
+from .report_card import SUBJECTS_FOR_RESULT, aresults_version
+
+# Comment line sent on quiet streams so proxies keep the connection open
+KEEPALIVE_SECONDS = 15
+# How long after its updated_at a grade's transaction may still commit
+LATE_COMMIT_SECONDS = 60
+
+
+class LiveRanking:
+    """Incrementally maintained positions for one form and term.
+
+    Keys are the ones ``rank_form`` sorts by (best-six points for seniors,
+    average for juniors, ties by student), so positions match the report
+    cards.
+    """
+
+    def __init__(self, is_senior):
+        self.is_senior = is_senior
+        self.students = {}  # pk -> (student ID, name)
+        self.scores = {}  # pk -> [(subject_id, score)]
+        self.keys = []  # sorted keys of ranked students
+        self.key_of = {}  # pk -> key
+        self.sent = {}  # pk -> last row sent
+
+    @property
+    def grade_count(self):
+        return sum(len(scores) for scores in self.scores.values())
+
+    def _key(self, pk):
+        scores = [score for _, score in self.scores.get(pk, ())]
+        if self.is_senior:
+            points = sorted(senior_point_for_score(sc) for sc in scores)
+            if len(points) < SUBJECTS_FOR_RESULT:
+                return None
+            return (sum(points[:SUBJECTS_FOR_RESULT]), pk)
+        if not scores:
+            return None
+        return (-(float(sum(scores)) / len(scores)), pk)
+
+    def load(self, grouped):
+        """Set every student at once from {pk: (info, scores)}."""
+        for pk, (info, scores) in grouped.items():
+            self.students[pk] = info
+            self.scores[pk] = scores
+            key = self._key(pk)
+            if key is not None:
+                self.key_of[pk] = key
+        self.keys = sorted(self.key_of.values())
+
+    def update(self, pk, info, scores):
+        """Replace one student's scores; return the students whose position may have moved."""
+        if info is not None:
+            self.students[pk] = info
+        if scores:
+            self.scores[pk] = scores
+        else:
+            self.scores.pop(pk, None)
+
+        old, new = self.key_of.pop(pk, None), self._key(pk)
+        if old is not None:
+            i = bisect_left(self.keys, old)
+            del self.keys[i]
+        if new is not None:
+            j = bisect_left(self.keys, new)
+            self.keys.insert(j, new)
+            self.key_of[pk] = new
+
+        # Everyone between the old and the new slot shifts by one
+        if old is not None and new is not None:
+            span = range(min(i, j), max(i, j) + 1)
+        elif old is not None:
+            span = range(i, len(self.keys))
+        elif new is not None:
+            span = range(j, len(self.keys))
+        else:
+            span = range(0)
+        return {self.keys[k][1] for k in span} | {pk}
+
+    def _cell(self, score):
+        grade = str(senior_point_for_score(score)) if self.is_senior else letter_for_score(score)
+        return {'score': float(score), 'grade': grade, 'passed': score_passes(score, self.is_senior)}
+
+    def row(self, pk):
+        scores = self.scores.get(pk, [])
+        cells = {str(subject_id): self._cell(score) for subject_id, score in scores}
+        values = [float(score) for _, score in scores]
+        key = self.key_of.get(pk)
+        if self.is_senior:
+            metric = f"{key[0]} pts" if key else ("Incomplete" if values else "No grades")
+        else:
+            metric = f"{sum(values) / len(values):.1f}%" if values else "No grades"
+        student_id, name = self.students.get(pk, ('', ''))
+        return {
+            'id': pk,
+            'student_id': student_id,
+            'name': name,
+            'position': bisect_left(self.keys, key) + 1 if key else None,
+            'metric': metric,
+            'passed': sum(1 for _, score in scores if self._cell(score)['passed']),
+            'taken': len(scores),
+            'scores': cells,
+        }
+
+    def changed_rows(self, pks):
+        """Rows of ``pks`` that differ from what was last sent."""
+        rows = []
+        for pk in sorted(pks):
+            row = self.row(pk)
+            if self.sent.get(pk) != row:
+                self.sent[pk] = row
+                rows.append(row)
+        return rows
+
+
+def _group(rows):
+    """({pk: ((student ID, name), [(subject_id, score)])}, {grade pk: updated_at}) from grade rows."""
+    grouped, stamps = {}, {}
+    for grade_pk, updated_at, pk, subject_id, score, student_id, first, last in rows:
+        grouped.setdefault(pk, ((student_id, f"{first} {last}"), []))[1].append((subject_id, score))
+        stamps[grade_pk] = updated_at
+    return grouped, stamps
+
+
+async def _aform_students(form):
+    return {
+        pk: (student_id, f"{first} {last}")
+        async for pk, student_id, first, last in Student.objects.filter(form=form).values_list(
+            'pk', 'student_id', 'first_name', 'last_name')
+    }
+
+
+async def _aform_grades(form, term, student_ids=None):
+    year = await acurrent_academic_year()
+    grades = Grade.objects.current(year).filter(student__form=form, term=term).order_by('pk')
+    if student_ids is not None:
+        grades = grades.filter(student_id__in=student_ids)
+    return _group([
+        row async for row in grades.values_list(
+            'pk', 'updated_at', 'student_id', 'subject_id', 'score', 'student__student_id',
+            'student__first_name', 'student__last_name',
+        )
+    ])
+
+
+async def _achanged_students(form, term, stamps):
+    """Students with a grade whose (pk, updated_at) is not in ``stamps``.
+
+    Reads the grades stamped within ``LATE_COMMIT_SECONDS`` of the newest
+    one seen, so a transaction that commits late is still caught.
+    """
+    year = await acurrent_academic_year()
+    grades = Grade.objects.current(year).filter(student__form=form, term=term).order_by()
+    if stamps:
+        grades = grades.filter(updated_at__gte=max(stamps.values()) - timedelta(seconds=LATE_COMMIT_SECONDS))
+    return {
+        student_id
+        async for pk, student_id, updated_at in grades.values_list('pk', 'student_id', 'updated_at')
+        if stamps.get(pk) != updated_at
+    }
+
+
+def _event(name, data):
+    return f"event: {name}\ndata: {json.dumps(data)}\n\n"
+
+
+async def ranking_events(form, term, poll_seconds=None, max_seconds=None):
+    """Yield server-sent events: a snapshot of every row, then deltas as grades change.
+
+    The snapshot has a row for every student in the form, unranked ones with
+    no position.  A delta carries the changed rows and the pks of students
+    who have left the form.  The stream ends after ``max_seconds``; EventSource
+    reconnects and gets a fresh snapshot.
+    """
+    poll_seconds = poll_seconds or settings.LIVE_RANKING_POLL_SECONDS
+    max_seconds = max_seconds or settings.LIVE_RANKING_MAX_SECONDS
+    ranking = LiveRanking(form in SENIOR_FORMS)
+    ranking.students = await _aform_students(form)
+    grouped, stamps = await _aform_grades(form, term)
+    ranking.load(grouped)
+    yield 'retry: 2000\n\n'
+    yield _event('snapshot', {'rows': ranking.changed_rows(ranking.students)})
+
+    started = last_sent = time.monotonic()
+    while time.monotonic() - started < max_seconds:
+        await asyncio.sleep(poll_seconds)
+        changed = await _achanged_students(form, term, stamps)
+        _, count = await aresults_version(form, term)
+        students = await _aform_students(form)
+        removed = sorted(set(ranking.students) - set(students))
+        if changed or removed or count != ranking.grade_count:
+            moved = set()
+            for pk in removed:
+                moved |= ranking.update(pk, None, [])
+                del ranking.students[pk]
+                ranking.sent.pop(pk, None)
+            ranking.students.update(students)
+            if changed:
+                grouped, new_stamps = await _aform_grades(form, term, changed)
+                stamps.update(new_stamps)
+                for pk in changed:
+                    info, scores = grouped.get(pk, (None, []))
+                    moved |= ranking.update(pk, info, scores)
+            if ranking.grade_count != count:
+                # Something other than a save changed the form: diff it all
+                grouped, stamps = await _aform_grades(form, term)
+                for pk in set(ranking.scores) | set(grouped):
+                    info, scores = grouped.get(pk, (None, []))
+                    if ranking.scores.get(pk, []) != scores:
+                        moved |= ranking.update(pk, info, scores)
+            rows = ranking.changed_rows(moved - set(removed))
+            if rows or removed:
+                yield _event('delta', {'rows': rows, 'removed': removed, 'ranked': len(ranking.keys)})
+                last_sent = time.monotonic()
+        if time.monotonic() - last_sent >= KEEPALIVE_SECONDS:
+            yield ': keepalive\n\n'
+            last_sent = time.monotonic()
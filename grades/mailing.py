@@ -0,0 +1,149 @@
+# grades/mailing.py
+"""Emailing term report cards to a whole form.
+
+Cards come from one grades query per form, or from the published snapshots,
+whose pre-rendered PDFs are reused.  PDFs render on a thread pool, one batch
+ahead of sending.  Every batch goes out through the same open connection in
+one ``send_messages()`` call, and the sends are paced to a per-minute rate.
+Each delivered batch is recorded as ReportEmail rows, so a run that stops
+part way resumes with the students not yet emailed.  A batch that fails
+mid-send can be sent again on resume; delivery is at least once.  Accounts
+still on their placeholder address are skipped until a real one is entered.
+"""
+import time
+from concurrent.futures import ThreadPoolExecutor
+
+from django.conf import settings
+from django.core.mail import EmailMessage, get_connection
+from django.template.loader import render_to_string
+from django.utils import timezone
+
+from .backends import PLACEHOLDER_EMAIL_DOMAIN
+from .models import ReportEmail, ResultSnapshot, Student, current_academic_year
+from .pdf import render_pdf
+from .publishing import current_publications, snapshot_card
+from .report_card import TERM_DISPLAY, build_form_report_cards, report_pdf_context
+
+
+class MailingError(Exception):
+    def __init__(self, message, sent=0):
+        super().__init__(message)
+        self.sent = sent
+
+
+def pending_students(form, term):
+    """Students in ``form`` with a real email address who have not been sent ``term``."""
+    already_sent = ReportEmail.objects.filter(academic_year=current_academic_year(), term=term)
+    return (
+        Student.objects.filter(form=form, user__isnull=False).exclude(user__email='')
+        .exclude(user__email__iendswith=f'@{PLACEHOLDER_EMAIL_DOMAIN}')
+        .exclude(pk__in=already_sent.values('student_id'))
+        .select_related('user').order_by('last_name', 'first_name', 'pk')
+    )
+
+
+def _report_jobs(students, form, term):
+    """(student, card, pre-rendered PDF or None) for each student."""
+    publication = current_publications().filter(term=term).first()
+    if publication is None:
+        cards = build_form_report_cards(students, form, term)
+        return [(s, cards[s.pk], None) for s in students]
+    snapshots = {
+        s.student_id: s
+        for s in ResultSnapshot.objects.filter(publication=publication, form=form).defer('html')
+    }
+    missing = [s for s in students if s.pk not in snapshots]
+    if missing:
+        raise MailingError(f"{len(missing)} student(s) have no published {term} result, "
+                           f"e.g. {missing[0].student_id}; re-publish {term} first")
+    return [
+        (s, snapshot_card(snapshots[s.pk]), bytes(snapshots[s.pk].pdf) if snapshots[s.pk].pdf else None)
+        for s in students
+    ]
+
+
+def _render(job):
+    student, card, pdf_bytes = job
+    return pdf_bytes or render_pdf('grades/report_pdf.html', report_pdf_context(student, card))
+
+
+def _message(student, card, pdf_bytes, connection):
+    context = {'student': student, 'card': card, 'term_display': TERM_DISPLAY.get(card.term, card.term)}
+    message = EmailMessage(
+        subject=f"{context['term_display']} report card - {student.first_name} {student.last_name}",
+        body=render_to_string('grades/emails/report_card.txt', context),
+        from_email=settings.DEFAULT_FROM_EMAIL,
+        to=[student.user.email],
+        connection=connection,
+    )
+    message.attach(f"Report_{student.student_id}_{card.term}.pdf", pdf_bytes, 'application/pdf')
+    return message
+
+
+def _rendered_batches(pool, jobs, batch_size):
+    """Yield (jobs, PDFs) per batch, rendering the next batch while this one sends."""
+    batches = [jobs[i:i + batch_size] for i in range(0, len(jobs), batch_size)]
+    ahead = None
+    for i, batch in enumerate(batches):
+        current = ahead if ahead is not None else [pool.submit(_render, job) for job in batch]
+        ahead = [pool.submit(_render, job) for job in batches[i + 1]] if i + 1 < len(batches) else None
+        yield batch, [f.result() for f in current]
+
+
+def _send_with_retry(connection, messages, retries, backoff):
+    for attempt in range(retries + 1):
+        try:
+            return connection.send_messages(messages)
+        except Exception:
+            if attempt == retries:
+                raise
+            # A dropped SMTP session is reopened; the whole batch is resent
+            connection.close()
+            time.sleep(backoff * (attempt + 1))
+            connection.open()
+
+
+def email_reports(form, term, batch_size=None, rate_per_minute=None, workers=2, retries=2,
+                  backoff=5.0, progress=None):
+    """Email every pending student in ``form`` their ``term`` report; return the number sent.
+
+    Raises MailingError (carrying the count sent so far) if a batch still
+    fails after ``retries``; running again resumes from there.
+    """
+    batch_size = batch_size or settings.REPORT_EMAIL_BATCH_SIZE
+    if rate_per_minute is None:
+        rate_per_minute = settings.REPORT_EMAIL_RATE_PER_MINUTE
+    students = list(pending_students(form, term))
+    if not students:
+        return 0
+    jobs = _report_jobs(students, form, term)
+    year = current_academic_year()
+
+    sent = 0
+    started = time.monotonic()
+    connection = get_connection()
+    connection.open()
+    try:
+        with ThreadPoolExecutor(max_workers=workers) as pool:
+            for batch, pdfs in _rendered_batches(pool, jobs, batch_size):
+                messages = [_message(s, card, pdf, connection) for (s, card, _), pdf in zip(batch, pdfs)]
+                try:
+                    _send_with_retry(connection, messages, retries, backoff)
+                except Exception as e:
+                    raise MailingError(f"Sending stopped after {sent} report(s): {e}", sent) from e
+                now = timezone.now()
+                ReportEmail.objects.bulk_create(
+                    [ReportEmail(student=s, academic_year=year, term=term, email=s.user.email, sent_at=now)
+                     for s, _, _ in batch],
+                    ignore_conflicts=True,
+                )
+                sent += len(batch)
+                if progress:
+                    progress(sent, len(jobs))
+                if rate_per_minute and sent < len(jobs):
+                    # Stay under the rate: sleep until `sent` messages are due
+                    due = sent * 60.0 / rate_per_minute
+                    time.sleep(max(0.0, due - (time.monotonic() - started)))
+    finally:
+        connection.close()
+    return sent
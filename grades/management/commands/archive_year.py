@@ -0,0 +1,47 @@
+import time
+
+from django.core.management.base import BaseCommand, CommandError
+
+from grades.archive import ArchiveError, archive_year, export_year, year_counts
+from grades.models import academic_year_label
+
+
+class Command(BaseCommand):
+    help = ('Move an academic year\'s grades and published results into the archive '
+            'tables, after writing compressed exports of both; archive the current year '
+            'before promote_students')
+
+    def add_arguments(self, parser):
+        parser.add_argument('year', type=int, help='Academic year to archive, by its starting year')
+        parser.add_argument('--export-dir', help='Where to write the exports (default ARCHIVE_EXPORT_DIR)')
+        parser.add_argument('--export-only', action='store_true',
+                            help='Write the exports but leave the live tables alone')
+        parser.add_argument('--batch-size', type=int, default=2000, help='Rows per fetch and insert (default 2000)')
+        parser.add_argument('--dry-run', action='store_true', help='Show what would be archived')
+
+    def handle(self, *args, **options):
+        year = options['year']
+        label = academic_year_label(year)
+        counts = year_counts(year)
+        self.stdout.write(f"{label}: {counts['grades']} grade(s), {counts['publications']} publication(s), "
+                          f"{counts['results']} published result(s) live")
+        if options['dry_run']:
+            return
+        if not any(counts.values()):
+            raise CommandError(f'Nothing to archive for {label}')
+
+        start = time.perf_counter()
+        if options['export_only']:
+            paths = export_year(year, options['export_dir'], options['batch_size'])
+        else:
+            try:
+                counts, paths = archive_year(year, options['export_dir'], options['batch_size'])
+            except ArchiveError as e:
+                raise CommandError(str(e))
+        for path in paths:
+            self.stdout.write(f'Wrote {path}')
+        if not options['export_only']:
+            self.stdout.write(self.style.SUCCESS(
+                f"Archived {label}: {counts['grades']} grade(s) and {counts['results']} result(s) "
+                f"in {time.perf_counter() - start:.1f}s"
+            ))
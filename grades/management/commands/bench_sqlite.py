@@ -0,0 +1,163 @@
+import os
+import random
+import sqlite3
+import tempfile
+import threading
+import time
+
+from django.conf import settings
+from django.core.management.base import BaseCommand
+
+FORMS = ['F1', 'F2', 'F3S', 'F3H', 'F4S', 'F4H']
+TERMS = ['T1', 'T2', 'T3']
+
+# The query each report card starts from: every grade in one form for a term
+READ_SQL = '''
+    SELECT g.student_id, g.subject_id, g.score FROM grade g
+    JOIN student s ON s.id = g.student_id WHERE s.form = ? AND g.term = ?
+'''
+
+
+def _connect(path, profile):
+    """A connection configured like Django's stock SQLite backend or like settings.SQLITE_OPTIONS."""
+    if profile == 'default':
+        conn = sqlite3.connect(path, timeout=5, isolation_level=None, check_same_thread=False)
+        conn.execute('PRAGMA journal_mode=DELETE')
+        return conn, 'DEFERRED'
+    options = settings.SQLITE_OPTIONS
+    conn = sqlite3.connect(path, timeout=options['timeout'], isolation_level=None, check_same_thread=False)
+    for pragma in options['init_command'].split(';'):
+        if pragma.strip():
+            conn.execute(pragma)
+    return conn, options['transaction_mode']
+
+
+def build_scratch_db(path, students, subjects):
+    conn = sqlite3.connect(path)
+    conn.executescript('''
+        CREATE TABLE student (id INTEGER PRIMARY KEY, form TEXT NOT NULL);
+        CREATE TABLE grade (id INTEGER PRIMARY KEY, student_id INTEGER NOT NULL, subject_id INTEGER NOT NULL,
+                            term TEXT NOT NULL, score REAL NOT NULL);
+        CREATE INDEX student_form ON student (form);
+        CREATE INDEX grade_student_term ON grade (student_id, term);
+    ''')
+    rng = random.Random(0)
+    conn.executemany('INSERT INTO student VALUES (?, ?)',
+                     [(i, FORMS[i % len(FORMS)]) for i in range(1, students + 1)])
+    conn.executemany(
+        'INSERT INTO grade (student_id, subject_id, term, score) VALUES (?, ?, ?, ?)',
+        [(s, sub, term, rng.uniform(20, 100))
+         for s in range(1, students + 1) for sub in range(1, subjects + 1) for term in TERMS],
+    )
+    conn.commit()
+    grade_count = conn.execute('SELECT COUNT(*) FROM grade').fetchone()[0]
+    conn.close()
+    return grade_count
+
+
+def _percentile(values, pct):
+    if not values:
+        return 0.0
+    values = sorted(values)
+    return values[min(len(values) - 1, int(len(values) * pct))]
+
+
+def run_profile(profile, seconds=5.0, readers=8, writers=2, students=2000, subjects=10, rows_per_write=40):
+    """Run readers and writers against a fresh scratch database; return the measurements."""
+    with tempfile.TemporaryDirectory() as tmp:
+        path = os.path.join(tmp, 'bench.sqlite3')
+        grade_count = build_scratch_db(path, students, subjects)
+        stop = threading.Event()
+        lock = threading.Lock()
+        stats = {'read_ms': [], 'write_ms': [], 'read_errors': 0, 'write_errors': 0}
+
+        def reader(seed):
+            conn, _ = _connect(path, profile)
+            rng = random.Random(seed)
+            latencies, errors = [], 0
+            while not stop.is_set():
+                start = time.perf_counter()
+                try:
+                    conn.execute(READ_SQL, (rng.choice(FORMS), rng.choice(TERMS))).fetchall()
+                    latencies.append((time.perf_counter() - start) * 1000)
+                except sqlite3.OperationalError:
+                    errors += 1
+            conn.close()
+            with lock:
+                stats['read_ms'].extend(latencies)
+                stats['read_errors'] += errors
+
+        def writer(seed):
+            # A teacher saving a mark sheet: one short transaction of updates
+            conn, mode = _connect(path, profile)
+            rng = random.Random(seed)
+            latencies, errors = [], 0
+            while not stop.is_set():
+                start = time.perf_counter()
+                try:
+                    conn.execute(f'BEGIN {mode}')
+                    conn.executemany('UPDATE grade SET score = ? WHERE id = ?', [
+                        (rng.uniform(20, 100), rng.randint(1, grade_count)) for _ in range(rows_per_write)
+                    ])
+                    conn.execute('COMMIT')
+                    latencies.append((time.perf_counter() - start) * 1000)
+                except sqlite3.OperationalError:
+                    errors += 1
+                    if conn.in_transaction:
+                        conn.execute('ROLLBACK')
+            conn.close()
+            with lock:
+                stats['write_ms'].extend(latencies)
+                stats['write_errors'] += errors
+
+        threads = [threading.Thread(target=reader, args=(i,)) for i in range(readers)]
+        threads += [threading.Thread(target=writer, args=(1000 + i,)) for i in range(writers)]
+        for thread in threads:
+            thread.start()
+        time.sleep(seconds)
+        stop.set()
+        for thread in threads:
+            thread.join()
+
+    return {
+        'profile': profile,
+        'reads_per_s': len(stats['read_ms']) / seconds,
+        'read_p50_ms': _percentile(stats['read_ms'], 0.50),
+        'read_p95_ms': _percentile(stats['read_ms'], 0.95),
+        'read_errors': stats['read_errors'],
+        'writes_per_s': len(stats['write_ms']) / seconds,
+        'write_p95_ms': _percentile(stats['write_ms'], 0.95),
+        'write_errors': stats['write_errors'],
+    }
+
+
+class Command(BaseCommand):
+    help = ('Measure SQLite read throughput under simultaneous grade writes, for the '
+            'stock settings and the SQLITE_OPTIONS profile, on a scratch database')
+
+    def add_arguments(self, parser):
+        parser.add_argument('--seconds', type=float, default=5.0, help='Run time per profile (default 5)')
+        parser.add_argument('--readers', type=int, default=8)
+        parser.add_argument('--writers', type=int, default=2)
+        parser.add_argument('--students', type=int, default=2000)
+        parser.add_argument('--subjects', type=int, default=10)
+        parser.add_argument('--rows-per-write', type=int, default=40,
+                            help='Grades updated per write transaction (default 40)')
+        parser.add_argument('--profile', choices=['default', 'tuned', 'both'], default='both')
+
+    def handle(self, *args, **options):
+        profiles = ['default', 'tuned'] if options['profile'] == 'both' else [options['profile']]
+        self.stdout.write(
+            f"{options['readers']} reader(s), {options['writers']} writer(s), "
+            f"{options['students']} students x {options['subjects']} subjects x {len(TERMS)} terms, "
+            f"{options['seconds']:.0f}s per profile"
+        )
+        self.stdout.write(f"{'profile':<10}{'reads/s':>10}{'p50 ms':>9}{'p95 ms':>9}{'r.err':>7}"
+                          f"{'writes/s':>10}{'w.p95 ms':>10}{'w.err':>7}")
+        for profile in profiles:
+            r = run_profile(profile, options['seconds'], options['readers'], options['writers'],
+                            options['students'], options['subjects'], options['rows_per_write'])
+            self.stdout.write(
+                f"{profile:<10}{r['reads_per_s']:>10.0f}{r['read_p50_ms']:>9.1f}{r['read_p95_ms']:>9.1f}"
+                f"{r['read_errors']:>7}{r['writes_per_s']:>10.0f}{r['write_p95_ms']:>10.1f}{r['write_errors']:>7}"
+            )
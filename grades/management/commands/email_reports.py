@@ -0,0 +1,43 @@
+from django.core.management.base import BaseCommand, CommandError
+
+from grades.mailing import MailingError, email_reports, pending_students
+from grades.models import Grade, Student
+
+
+class Command(BaseCommand):
+    help = ('Email every student in a form their term report card PDF, in batches over one '
+            'connection; re-run to resume after a failure')
+
+    def add_arguments(self, parser):
+        parser.add_argument('term', choices=[code for code, _ in Grade.TERM_CHOICES])
+        parser.add_argument('--form', action='append', dest='forms',
+                            choices=[code for code, _ in Student.FORM_CHOICES],
+                            help='Form to email (repeatable; default all forms)')
+        parser.add_argument('--batch-size', type=int, help='Messages per send (default REPORT_EMAIL_BATCH_SIZE)')
+        parser.add_argument('--rate', type=int,
+                            help='Most messages per minute, 0 for no limit (default REPORT_EMAIL_RATE_PER_MINUTE)')
+        parser.add_argument('--workers', type=int, default=2, help='PDF render threads (default 2)')
+        parser.add_argument('--retries', type=int, default=2, help='Retries per failed batch (default 2)')
+        parser.add_argument('--dry-run', action='store_true', help='Only count who would be emailed')
+
+    def handle(self, *args, **options):
+        term = options['term']
+        forms = options['forms'] or [code for code, _ in Student.FORM_CHOICES]
+        total = 0
+        for form in forms:
+            pending = pending_students(form, term).count()
+            self.stdout.write(f'{form}: {pending} student(s) to email')
+            if options['dry_run'] or not pending:
+                continue
+            try:
+                sent = email_reports(
+                    form, term, batch_size=options['batch_size'], rate_per_minute=options['rate'],
+                    workers=options['workers'], retries=options['retries'],
+                    progress=lambda done, count: self.stdout.write(f'  {form}: {done}/{count} sent'),
+                )
+            except MailingError as e:
+                hint = ' Run the command again to resume.' if e.sent else ''
+                raise CommandError(f'{form}: {e}.{hint}')
+            total += sent
+        if not options['dry_run']:
+            self.stdout.write(self.style.SUCCESS(f'Emailed {total} {term} report card(s)'))
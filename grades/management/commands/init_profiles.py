@@ -1,46 +1,31 @@
 from django.core.management.base import BaseCommand
-from django.contrib.auth.models import User
-from grades.models import UserProfile
+
+from grades.accounts import count_by_role, create_missing_profiles, format_counts, role_fixes, users_without_profile
+
 
 class Command(BaseCommand):
     help = 'Initialize UserProfile for all existing users'
-    
+
+    def add_arguments(self, parser):
+        parser.add_argument('--dry-run', action='store_true', help='Report counts without writing')
+
     def handle(self, *args, **options):
-        users = User.objects.all()
-        created_count = 0
+        dry_run = options['dry_run']
+        missing = users_without_profile()
+
+        if dry_run:
+            created = count_by_role(missing)
+        else:
+            created = create_missing_profiles(missing)
+        self.stdout.write(f'{"Would create" if dry_run else "Created"} profiles: {format_counts(created)}')
+
         updated_count = 0
-        
-        for user in users:
-            # Check if user already has a profile
-            try:
-                profile = user.profile
-                # Profile exists, update if needed
-                if user.is_superuser and profile.role != 'admin':
-                    profile.role = 'admin'
-                    profile.save()
-                    updated_count += 1
-                    self.stdout.write(f'↻ Updated {user.username} to admin')
-                elif user.is_staff and profile.role != 'teacher':
-                    profile.role = 'teacher'
-                    profile.save()
-                    updated_count += 1
-                    self.stdout.write(f'↻ Updated {user.username} to teacher')
-            except UserProfile.DoesNotExist:
-                # Create new profile
-                if user.is_superuser:
-                    role = 'admin'
-                elif user.is_staff:
-                    role = 'teacher'
-                else:
-                    role = 'student'
-                
-                UserProfile.objects.create(user=user, role=role)
-                created_count += 1
-                self.stdout.write(f'✓ Created profile for {user.username} ({role})')
-        
-        self.stdout.write(self.style.SUCCESS(
-            f'\nSummary: Created {created_count} new profiles, Updated {updated_count} existing profiles'
-        ))
+        for label, profiles, role in role_fixes():
+            n = profiles.count() if dry_run else profiles.update(role=role)
+            updated_count += n
+            self.stdout.write(f'{"Would update" if dry_run else "Updated"} {n} profile(s): {label}')
+
         self.stdout.write(self.style.SUCCESS(
-            f'Total users processed: {users.count()}'
+            f'\nSummary: Created {sum(created.values())} new profiles, Updated {updated_count} existing profiles'
+            + (' (dry run)' if dry_run else '')
         ))
\ No newline at end of file
@@ -0,0 +1,86 @@
+import json
+import os
+import subprocess
+import sys
+import time
+
+from django.conf import settings
+from django.core.management.base import BaseCommand, CommandError
+
+# Runs in a fresh interpreter so nothing is already imported.
+PROBE = '''
+import json, time
+start = time.perf_counter()
+import django
+django.setup()
+from django.urls import get_resolver
+get_resolver().url_patterns
+from school_grades.asgi import application
+timings = {'app_ready': time.perf_counter() - start}
+if %(warmup)r:
+    from grades.warmup import warm_up
+    timings['warmup'] = warm_up(render=True)
+timings['worker_ready'] = time.perf_counter() - start
+print(json.dumps(timings))
+'''
+
+
+def parse_importtime(stderr):
+    """Parse ``python -X importtime`` output into (module, self_us, cumulative_us) rows."""
+    rows = []
+    for line in stderr.splitlines():
+        if not line.startswith('import time:') or 'imported package' in line:
+            continue
+        try:
+            self_part, cumulative_part, module = line.split('|', 2)
+            self_us = int(self_part.split(':', 1)[1])
+            cumulative_us = int(cumulative_part)
+        except ValueError:
+            continue
+        rows.append((module.strip(), self_us, cumulative_us))
+    return rows
+
+
+class Command(BaseCommand):
+    help = 'Report per-module import time and worker readiness time for a cold process'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--top', type=int, default=25,
+                            help='Number of slowest modules to list (default 25)')
+        parser.add_argument('--warmup', action='store_true',
+                            help='Include the WeasyPrint/template warm-up in readiness time')
+        parser.add_argument('--sort', choices=['cumulative', 'self'], default='cumulative')
+
+    def handle(self, *args, **options):
+        env = dict(os.environ)
+        env.setdefault('DJANGO_SETTINGS_MODULE', 'school_grades.settings')
+
+        started = time.perf_counter()
+        result = subprocess.run(
+            [sys.executable, '-X', 'importtime', '-c', PROBE % {'warmup': options['warmup']}],
+            cwd=settings.BASE_DIR, env=env, capture_output=True, text=True,
+        )
+        wall = time.perf_counter() - started
+
+        if result.returncode != 0:
+            tail = '\n'.join(l for l in result.stderr.splitlines() if not l.startswith('import time:'))
+            raise CommandError(f"Startup probe failed:\n{tail}")
+
+        timings = json.loads(result.stdout.strip().splitlines()[-1])
+        rows = parse_importtime(result.stderr)
+        key = 2 if options['sort'] == 'cumulative' else 1
+        rows.sort(key=lambda r: r[key], reverse=True)
+
+        self.stdout.write(f"{'self ms':>10} {'cumul ms':>10}  module")
+        for module, self_us, cumulative_us in rows[:options['top']]:
+            self.stdout.write(f"{self_us / 1000:10.1f} {cumulative_us / 1000:10.1f}  {module}")
+
+        total_us = sum(r[1] for r in rows)
+        self.stdout.write('')
+        self.stdout.write(f"Modules imported: {len(rows)} ({total_us / 1e6:.3f}s total import time)")
+        self.stdout.write(f"App ready (django.setup + URLconf + ASGI app): {timings['app_ready']:.3f}s")
+        for phase, seconds in (timings.get('warmup') or {}).items():
+            self.stdout.write(f"  warm-up {phase}: {seconds:.3f}s")
+        self.stdout.write(self.style.SUCCESS(
+            f"Worker ready: {timings['worker_ready']:.3f}s (process wall time {wall:.3f}s)"
+        ))
@@ -0,0 +1,52 @@
+import csv
+import time
+
+from django.core.management.base import BaseCommand, CommandError
+
+from grades.models import academic_year_label, current_academic_year
+from grades.promotion import PromotionError, normalise_stream, plan_promotion, promote_school
+
+
+class Command(BaseCommand):
+    help = ('Move every student up a year (F1->F2, F2->F3S/F3H, F3->F4, F4->graduated) '
+            'and start the next academic year, in one transaction')
+
+    def add_arguments(self, parser):
+        parser.add_argument('--streams', metavar='CSV',
+                            help='CSV of student_id,stream (S/Science or H/Humanities) for Form 2 students')
+        parser.add_argument('--default-stream', metavar='S|H',
+                            help='Stream for Form 2 students not listed in --streams')
+        parser.add_argument('--dry-run', action='store_true', help='Show what would move without changing anything')
+
+    def handle(self, *args, **options):
+        try:
+            stream_map = self._read_streams(options['streams']) if options['streams'] else {}
+            default = normalise_stream(options['default_stream']) if options['default_stream'] else None
+            if options['dry_run']:
+                plan = plan_promotion(stream_map, default)
+                for label, count in plan.items():
+                    self.stdout.write(f'{label}: {count}')
+                self.stdout.write('Dry run; nothing changed')
+                return
+            start = time.perf_counter()
+            moved = promote_school(stream_map, default)
+        except PromotionError as e:
+            raise CommandError(str(e))
+
+        for label, count in moved.items():
+            self.stdout.write(f'{label}: {count}')
+        self.stdout.write(self.style.SUCCESS(
+            f'Promoted {sum(moved.values())} student(s) in {time.perf_counter() - start:.2f}s; '
+            f'the academic year is now {academic_year_label(current_academic_year())}'
+        ))
+
+    def _read_streams(self, path):
+        stream_map = {}
+        with open(path, newline='', encoding='utf-8-sig') as fh:
+            for row in csv.reader(fh):
+                if not row or row[0].strip().lower() in ('', 'student_id'):
+                    continue
+                if len(row) < 2:
+                    raise CommandError(f'{path}: expected student_id,stream but got {row!r}')
+                stream_map[row[0].strip()] = normalise_stream(row[1])
+        return stream_map
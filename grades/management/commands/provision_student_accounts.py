@@ -0,0 +1,90 @@
+import os
+import time
+from concurrent.futures import ProcessPoolExecutor
+
+import django
+from django.contrib.auth import get_user_model
+from django.contrib.auth.hashers import make_password
+from django.core.management.base import BaseCommand
+
+from grades.backends import initial_password, placeholder_email, student_username
+from grades.models import Student, UserProfile
+from grades.writer import serialized_writes
+
+
+def _init_worker():
+    # Spawned (non-forked) workers must load settings before hashing
+    from django.apps import apps
+    if not apps.ready:
+        django.setup()
+
+
+def _hash_passwords(passwords):
+    return [make_password(p) for p in passwords]
+
+
+class Command(BaseCommand):
+    help = ('Create and link login accounts for every student without one, so first '
+            'logins do no hashing or writes (initial password: assigned password or student ID)')
+
+    def add_arguments(self, parser):
+        parser.add_argument('--workers', type=int, default=os.cpu_count() or 1,
+                            help='Processes used to hash passwords (default: CPU count)')
+        parser.add_argument('--batch-size', type=int, default=500,
+                            help='Rows per bulk insert/update and per hashing task (default 500)')
+        parser.add_argument('--dry-run', action='store_true', help='Report what would be done')
+
+    def handle(self, *args, **options):
+        batch_size = options['batch_size']
+        User = get_user_model()
+        students = list(Student.objects.filter(user__isnull=True).order_by('pk'))
+        if not students:
+            self.stdout.write('Every student already has an account')
+            return
+
+        # Accounts left over from earlier logins/imports are linked, not recreated
+        usernames = [student_username(s) for s in students]
+        existing = dict(User.objects.filter(username__in=usernames).values_list('username', 'pk'))
+        to_create = [s for s in students if student_username(s) not in existing]
+        self.stdout.write(f'{len(students)} student(s) without an account: '
+                          f'{len(to_create)} to create, {len(existing)} to link')
+        if options['dry_run']:
+            return
+
+        start = time.perf_counter()
+        hashes = self._hash([initial_password(s) for s in to_create], options['workers'], batch_size)
+        hashed_in = time.perf_counter() - start
+
+        with serialized_writes():
+            User.objects.bulk_create(
+                [User(username=student_username(s), email=placeholder_email(s), password=h)
+                 for s, h in zip(to_create, hashes)],
+                batch_size=batch_size,
+            )
+            user_ids = {}
+            for i in range(0, len(usernames), batch_size):
+                user_ids.update(User.objects.filter(username__in=usernames[i:i + batch_size])
+                                .values_list('username', 'pk'))
+            for student in students:
+                student.user_id = user_ids[student_username(student)]
+            Student.objects.bulk_update(students, ['user'], batch_size=batch_size)
+            # bulk_create skips post_save, so profiles are created here in bulk too
+            UserProfile.objects.bulk_create(
+                [UserProfile(user_id=user_ids[student_username(s)], role='student') for s in to_create],
+                batch_size=batch_size, ignore_conflicts=True,
+            )
+
+        self.stdout.write(self.style.SUCCESS(
+            f'Created {len(to_create)} and linked {len(students)} account(s) in '
+            f'{time.perf_counter() - start:.1f}s (hashing {hashed_in:.1f}s)'
+        ))
+
+    def _hash(self, passwords, workers, batch_size):
+        if workers <= 1 or len(passwords) < 2:
+            return _hash_passwords(passwords)
+        chunks = [passwords[i:i + batch_size] for i in range(0, len(passwords), batch_size)]
+        if len(chunks) < workers:
+            size = max(1, -(-len(passwords) // workers))
+            chunks = [passwords[i:i + size] for i in range(0, len(passwords), size)]
+        with ProcessPoolExecutor(max_workers=workers, initializer=_init_worker) as pool:
+            return [h for chunk in pool.map(_hash_passwords, chunks) for h in chunk]
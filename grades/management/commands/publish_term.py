@@ -0,0 +1,34 @@
+from django.contrib.auth import get_user_model
+from django.core.management.base import BaseCommand, CommandError
+
+from grades.models import Grade
+from grades.publishing import publish_term, unpublish_term
+
+
+class Command(BaseCommand):
+    help = 'Freeze every student\'s result for a term so student views serve snapshots'
+
+    def add_arguments(self, parser):
+        parser.add_argument('term', choices=[code for code, _ in Grade.TERM_CHOICES])
+        parser.add_argument('--unpublish', action='store_true',
+                            help='Withdraw the publication and return to live results')
+        parser.add_argument('--user', type=int, help='ID of the user recorded as the publisher')
+
+    def handle(self, *args, **options):
+        term = options['term']
+        if options['unpublish']:
+            if not unpublish_term(term):
+                raise CommandError(f'{term} is not published')
+            self.stdout.write(self.style.SUCCESS(f'Unpublished {term}'))
+            return
+
+        user = None
+        if options['user'] is not None:
+            user = get_user_model().objects.filter(pk=options['user']).first()
+            if user is None:
+                raise CommandError(f'No user with ID {options["user"]}')
+        publication = publish_term(term, user=user)
+        self.stdout.write(self.style.SUCCESS(
+            f'Published {term}: {publication.snapshots.count()} student result(s) frozen. '
+            f'Run "manage.py warm_results {term}" to pre-render pages and PDFs.'
+        ))
@@ -0,0 +1,15 @@
+from django.core.management.base import BaseCommand
+
+from grades.rollups import rebuild_rollups
+
+
+class Command(BaseCommand):
+    help = 'Recompute the GradeRollup analytics table from all grades (after bulk imports or updates)'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--form', action='append', dest='forms',
+                            help='Only rebuild this form (repeatable)')
+
+    def handle(self, *args, **options):
+        count = rebuild_rollups(forms=options['forms'])
+        self.stdout.write(self.style.SUCCESS(f'Rebuilt {count} rollup cell(s)'))
@@ -0,0 +1,30 @@
+import time
+
+from django.core.management.base import BaseCommand, CommandError
+
+from grades.models import Grade, TermPublication
+from grades.publishing import current_publications, prerender_snapshots
+
+
+class Command(BaseCommand):
+    help = 'Pre-render every student\'s results page and PDF for a published term'
+
+    def add_arguments(self, parser):
+        parser.add_argument('term', choices=[code for code, _ in Grade.TERM_CHOICES])
+        parser.add_argument('--form', action='append', dest='forms',
+                            help='Only render this form (repeatable)')
+        parser.add_argument('--no-pdf', action='store_true', help='Only render the results pages')
+        parser.add_argument('--workers', type=int, default=2, help='PDF render threads (default 2)')
+
+    def handle(self, *args, **options):
+        try:
+            publication = current_publications().get(term=options['term'])
+        except TermPublication.DoesNotExist:
+            raise CommandError(f"{options['term']} is not published; run publish_term first")
+
+        start = time.perf_counter()
+        count = prerender_snapshots(publication, forms=options['forms'],
+                                    pdf=not options['no_pdf'], workers=options['workers'])
+        self.stdout.write(self.style.SUCCESS(
+            f'Rendered {count} result(s) for {publication.term} in {time.perf_counter() - start:.1f}s'
+        ))
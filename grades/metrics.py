@@ -0,0 +1,378 @@
+# grades/metrics.py
+"""A small in-process metrics registry exported in Prometheus text format.
+
+Each worker process records counters, gauges and histograms in memory and
+periodically writes them to its own JSON file in ``METRICS_DIR``; the
+``/metrics`` endpoint merges every file on the node, so the numbers cover
+all gunicorn workers whichever one answers the scrape.  When a worker exits
+(gunicorn's ``child_exit`` hook, or the next scrape for one that died
+without it) its file is merged into one archive file and deleted, so
+counters never go backwards and the directory holds one file per live
+worker plus the archive.  ``METRICS_DIR`` must be local to the node: a
+worker counts as exited when its pid is no longer running here.
+
+Recorded: request latency per URL name, SQL time and queries per request,
+report-card cache hits/misses, PDF render phases (template, layout,
+write_pdf) and bulk report throughput.
+"""
+import json
+import os
+import tempfile
+import threading
+import time
+from bisect import bisect_left
+from contextlib import contextmanager
+from contextvars import ContextVar
+
+from asgiref.sync import iscoroutinefunction, markcoroutinefunction
+from django.conf import settings
+
+from .writer import file_lock
+
+ARCHIVE_FILE = 'metrics-archive.json'
+
+LATENCY_BUCKETS = (0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1, 2.5, 5, 10, 30, 60)
+PDF_BUCKETS = (0.01, 0.05, 0.1, 0.25, 0.5, 1, 2, 5, 10, 30)
+QUERY_COUNT_BUCKETS = (0, 1, 2, 5, 10, 20, 50, 100, 200, 500, 1000)
+
+# name -> (type, help, buckets)
+METRICS = {
+    'grades_request_duration_seconds': (
+        'histogram', 'Request latency by URL name.', LATENCY_BUCKETS),
+    'grades_db_queries_per_request': (
+        'histogram', 'SQL queries executed per request, by URL name.', QUERY_COUNT_BUCKETS),
+    'grades_db_query_seconds_total': (
+        'counter', 'Time spent executing SQL, by URL name.', None),
+    'grades_cache_requests_total': (
+        'counter', 'Cache lookups by cache and result (hit or miss).', None),
+    'grades_pdf_phase_seconds': (
+        'histogram', 'PDF render time by template and phase (template, layout, write).', PDF_BUCKETS),
+    'grades_bulk_reports_total': (
+        'counter', 'Reports rendered by bulk jobs.', None),
+    'grades_bulk_job_seconds': (
+        'histogram', 'Duration of bulk report jobs.', LATENCY_BUCKETS),
+    'grades_bulk_reports_per_second': (
+        'gauge', 'Throughput of the most recent bulk report job.', None),
+}
+
+# Per-request SQL accounting, shared with sync_to_async threads via the context
+_request_sql = ContextVar('grades_request_sql', default=None)
+
+
+def _key(labels):
+    return tuple(sorted(labels.items()))
+
+
+class Registry:
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._counters = {}
+        self._gauges = {}
+        self._histograms = {}
+        self._last_flush = 0.0
+        self._started = int(time.time())
+
+    def inc(self, name, value=1, **labels):
+        key = (name, _key(labels))
+        with self._lock:
+            self._counters[key] = self._counters.get(key, 0) + value
+
+    def set(self, name, value, **labels):
+        with self._lock:
+            self._gauges[(name, _key(labels))] = (value, time.time())
+
+    def observe(self, name, value, **labels):
+        buckets = METRICS[name][2]
+        key = (name, _key(labels))
+        with self._lock:
+            hist = self._histograms.get(key)
+            if hist is None:
+                hist = self._histograms[key] = [[0] * len(buckets), 0.0, 0]
+            index = bisect_left(buckets, value)
+            if index < len(buckets):
+                hist[0][index] += 1
+            hist[1] += value
+            hist[2] += 1
+
+    def snapshot(self):
+        with self._lock:
+            return {
+                'counters': [[n, list(l), v] for (n, l), v in self._counters.items()],
+                'gauges': [[n, list(l), v, ts] for (n, l), (v, ts) in self._gauges.items()],
+                'histograms': [[n, list(l), list(b), s, c] for (n, l), (b, s, c) in self._histograms.items()],
+            }
+
+    def flush(self, force=False):
+        """Write this process's metrics file (at most once per METRICS_FLUSH_INTERVAL)."""
+        now = time.monotonic()
+        if not force and now - self._last_flush < getattr(settings, 'METRICS_FLUSH_INTERVAL', 1.0):
+            return
+        self._last_flush = now
+        directory = metrics_dir()
+        os.makedirs(directory, exist_ok=True)
+        path = os.path.join(directory, f'metrics-{os.getpid()}-{self._started}.json')
+        tmp = path + '.tmp'
+        with open(tmp, 'w') as fh:
+            json.dump(self.snapshot(), fh)
+        os.replace(tmp, path)
+
+
+registry = Registry()
+
+
+def metrics_dir():
+    return getattr(settings, 'METRICS_DIR', None) or os.path.join(tempfile.gettempdir(), 'school-grades-metrics')
+
+
+@contextmanager
+def timed(name, **labels):
+    """Observe the duration of the block in histogram ``name``."""
+    started = time.perf_counter()
+    try:
+        yield
+    finally:
+        registry.observe(name, time.perf_counter() - started, **labels)
+
+
+def record_cache(cache_name, hit):
+    registry.inc('grades_cache_requests_total', cache=cache_name, result='hit' if hit else 'miss')
+
+
+def record_bulk_job(reports, seconds):
+    registry.inc('grades_bulk_reports_total', reports)
+    registry.observe('grades_bulk_job_seconds', seconds)
+    if seconds > 0:
+        registry.set('grades_bulk_reports_per_second', reports / seconds)
+
+
+# -- SQL instrumentation ------------------------------------------------------
+
+def _sql_wrapper(execute, sql, params, many, context):
+    stats = _request_sql.get()
+    if stats is None:
+        return execute(sql, params, many, context)
+    started = time.perf_counter()
+    try:
+        return execute(sql, params, many, context)
+    finally:
+        stats[0] += 1
+        stats[1] += time.perf_counter() - started
+
+
+def instrument_connection(connection):
+    """Attach the SQL timer to a database connection (once)."""
+    if _sql_wrapper not in connection.execute_wrappers:
+        connection.execute_wrappers.append(_sql_wrapper)
+
+
+# -- request middleware -------------------------------------------------------
+
+class MetricsMiddleware:
+    """Record latency and SQL use of every request, labelled by URL name."""
+    sync_capable = True
+    async_capable = True
+
+    def __init__(self, get_response):
+        self.get_response = get_response
+        if iscoroutinefunction(get_response):
+            markcoroutinefunction(self)
+
+    def __call__(self, request):
+        if iscoroutinefunction(self):
+            return self.__acall__(request)
+        stats, token, started = self._start()
+        try:
+            response = self.get_response(request)
+        finally:
+            _request_sql.reset(token)
+        self._finish(request, response, stats, started)
+        return response
+
+    async def __acall__(self, request):
+        stats, token, started = self._start()
+        try:
+            response = await self.get_response(request)
+        finally:
+            _request_sql.reset(token)
+        self._finish(request, response, stats, started)
+        return response
+
+    @staticmethod
+    def _start():
+        stats = [0, 0.0]
+        return stats, _request_sql.set(stats), time.perf_counter()
+
+    @staticmethod
+    def _finish(request, response, stats, started):
+        match = getattr(request, 'resolver_match', None)
+        view = match.view_name if match else 'unresolved'
+        registry.observe('grades_request_duration_seconds', time.perf_counter() - started,
+                         view=view, method=request.method, status=f'{response.status_code // 100}xx')
+        registry.observe('grades_db_queries_per_request', stats[0], view=view)
+        registry.inc('grades_db_query_seconds_total', stats[1], view=view)
+        registry.flush()
+
+
+# -- merging and compaction ---------------------------------------------------
+
+def _merge(data, counters, gauges, histograms):
+    """Add one metrics file's contents into the merged dicts."""
+    for name, labels, value in data['counters']:
+        key = (name, tuple(map(tuple, labels)))
+        counters[key] = counters.get(key, 0) + value
+    for name, labels, value, ts in data['gauges']:
+        key = (name, tuple(map(tuple, labels)))
+        if key not in gauges or ts > gauges[key][1]:
+            gauges[key] = (value, ts)
+    for name, labels, buckets, total, count in data['histograms']:
+        key = (name, tuple(map(tuple, labels)))
+        merged = histograms.setdefault(key, [[0] * len(buckets), 0.0, 0])
+        merged[0] = [a + b for a, b in zip(merged[0], buckets)]
+        merged[1] += total
+        merged[2] += count
+
+
+def _read(path):
+    try:
+        with open(path) as fh:
+            return json.load(fh)
+    except (OSError, ValueError):
+        return None
+
+
+def _worker_pid(filename):
+    """The pid in a worker's ``metrics-<pid>-<started>.json``, or None for other files."""
+    parts = filename[:-len('.json')].split('-') if filename.endswith('.json') else []
+    if len(parts) == 3 and parts[0] == 'metrics' and parts[1].isdigit():
+        return int(parts[1])
+    return None
+
+
+def _running(pid):
+    try:
+        os.kill(pid, 0)
+    except ProcessLookupError:
+        return False
+    except PermissionError:
+        pass
+    return True
+
+
+def compact(pids=None):
+    """Merge the files of exited workers into the archive file and delete them.
+
+    ``pids`` names workers known to have exited; by default every worker
+    file whose pid is no longer running is compacted.  Returns the number
+    of files merged.
+    """
+    directory = metrics_dir()
+    if not os.path.isdir(directory):
+        return 0
+    with file_lock(os.path.join(directory, 'metrics.lock')):
+        archive_path = os.path.join(directory, ARCHIVE_FILE)
+        archive = _read(archive_path) or {'counters': [], 'gauges': [], 'histograms': [], 'merged': []}
+        merged_before = set(archive['merged'])
+        exited = []
+        for filename in sorted(os.listdir(directory)):
+            pid = _worker_pid(filename)
+            if pid is None or pid == os.getpid():
+                continue
+            if (pid in pids) if pids is not None else not _running(pid):
+                exited.append(filename)
+
+        new = []
+        for filename in exited:
+            # Already listed: archived before a crash stopped its deletion
+            if filename in merged_before:
+                continue
+            data = _read(os.path.join(directory, filename))
+            if data is not None:
+                new.append((filename, data))
+        if new:
+            counters, gauges, histograms = {}, {}, {}
+            for data in [archive] + [data for _, data in new]:
+                _merge(data, counters, gauges, histograms)
+            present = set(os.listdir(directory))
+            archive = {
+                'counters': [[n, list(l), v] for (n, l), v in counters.items()],
+                'gauges': [[n, list(l), v, ts] for (n, l), (v, ts) in gauges.items()],
+                'histograms': [[n, list(l), b, s, c] for (n, l), (b, s, c) in histograms.items()],
+                # Names merged so far whose files still exist, so a retry never counts them twice
+                'merged': sorted(f for f in merged_before | {f for f, _ in new} if f in present),
+            }
+            tmp = archive_path + '.tmp'
+            with open(tmp, 'w') as fh:
+                json.dump(archive, fh)
+            os.replace(tmp, archive_path)
+        for filename in exited:
+            try:
+                os.remove(os.path.join(directory, filename))
+            except FileNotFoundError:
+                pass
+        return len(new)
+
+
+# -- exposition ---------------------------------------------------------------
+
+def collect():
+    """Merge the metrics files of every worker on this node, and the archive of exited ones."""
+    registry.flush(force=True)
+    compact()
+    counters, gauges, histograms = {}, {}, {}
+    directory = metrics_dir()
+    archive = _read(os.path.join(directory, ARCHIVE_FILE))
+    if archive is not None:
+        _merge(archive, counters, gauges, histograms)
+    # Files already in the archive are only counted there
+    skip = set(archive['merged']) if archive else set()
+    for filename in os.listdir(directory):
+        if _worker_pid(filename) is None or filename in skip:
+            continue
+        data = _read(os.path.join(directory, filename))
+        if data is not None:
+            _merge(data, counters, gauges, histograms)
+    return counters, gauges, histograms
+
+
+def _labels(pairs):
+    if not pairs:
+        return ''
+    escaped = (
+        (k, str(v).replace('\\', '\\\\').replace('"', '\\"').replace('\n', '\\n'))
+        for k, v in pairs
+    )
+    return '{' + ','.join(f'{k}="{v}"' for k, v in escaped) + '}'
+
+
+def _number(value):
+    return repr(float(value)) if isinstance(value, float) else str(value)
+
+
+def render_exposition():
+    """Return all metrics in the Prometheus text exposition format."""
+    counters, gauges, histograms = collect()
+    by_name = {}
+    for (name, labels), value in counters.items():
+        by_name.setdefault(name, []).append((labels, value))
+    for (name, labels), (value, _) in gauges.items():
+        by_name.setdefault(name, []).append((labels, value))
+    for (name, labels), hist in histograms.items():
+        by_name.setdefault(name, []).append((labels, hist))
+
+    lines = []
+    for name, (kind, help_text, buckets) in METRICS.items():
+        lines.append(f'# HELP {name} {help_text}')
+        lines.append(f'# TYPE {name} {kind}')
+        for labels, value in sorted(by_name.get(name, [])):
+            if kind != 'histogram':
+                lines.append(f'{name}{_labels(labels)} {_number(value)}')
+                continue
+            counts, total, count = value
+            cumulative = 0
+            for bound, n in zip(buckets, counts):
+                cumulative += n
+                lines.append(f'{name}_bucket{_labels(labels + (("le", _number(float(bound))),))} {cumulative}')
+            lines.append(f'{name}_bucket{_labels(labels + (("le", "+Inf"),))} {count}')
+            lines.append(f'{name}_sum{_labels(labels)} {_number(float(total))}')
+            lines.append(f'{name}_count{_labels(labels)} {count}')
+    return '\n'.join(lines) + '\n'
@@ -0,0 +1,20 @@
+# Generated by Django 6.0 on 2025-12-30 09:12
+
+import django.utils.timezone
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('grades', '0002_student_stream_subject_form_level_subject_stream_and_more'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='grade',
+            name='updated_at',
+            field=models.DateTimeField(auto_now=True, default=django.utils.timezone.now),
+            preserve_default=False,
+        ),
+    ]
@@ -0,0 +1,77 @@
+# Generated by Django 6.0 on 2026-01-08 10:41
+
+import django.db.models.deletion
+from django.db import migrations, models
+from django.db.models import Count, DecimalField, F, Q, Sum
+
+# (field, lower bound, upper bound) of each score bracket
+BRACKETS = [
+    ('n_lt40', None, 40), ('n_40', 40, 45), ('n_45', 45, 50), ('n_50', 50, 55), ('n_55', 55, 60),
+    ('n_60', 60, 65), ('n_65', 65, 70), ('n_70', 70, 80), ('n_80', 80, None),
+]
+STREAMS = {'F3S': 'SCIENCE', 'F4S': 'SCIENCE', 'F3H': 'HUMANITIES', 'F4H': 'HUMANITIES'}
+
+
+def populate_rollups(apps, schema_editor):
+    # One GROUP BY over the existing grades, all of which count at this point
+    Grade = apps.get_model('grades', 'Grade')
+    GradeRollup = apps.get_model('grades', 'GradeRollup')
+    aggregates = {
+        'count': Count('id'),
+        'score_sum': Sum('score'),
+        'score_sq_sum': Sum(F('score') * F('score'), output_field=DecimalField(max_digits=20, decimal_places=4)),
+        'pass_count': Count('id', filter=Q(score__gte=40)),
+    }
+    for field, lower, upper in BRACKETS:
+        condition = Q()
+        if lower is not None:
+            condition &= Q(score__gte=lower)
+        if upper is not None:
+            condition &= Q(score__lt=upper)
+        aggregates[field] = Count('id', filter=condition)
+
+    rows = Grade.objects.order_by().values('student__form', 'subject_id', 'term').annotate(**aggregates)
+    cells = []
+    for row in rows:
+        form = row.pop('student__form')
+        cells.append(GradeRollup(form=form, stream=STREAMS.get(form, 'NONE'),
+                                 **{k: (v or 0) for k, v in row.items()}))
+    GradeRollup.objects.bulk_create(cells, batch_size=500)
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('grades', '0003_grade_updated_at'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='GradeRollup',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('form', models.CharField(choices=[('F1', 'Form 1'), ('F2', 'Form 2'), ('F3S', 'Form 3 Science'), ('F3H', 'Form 3 Humanities'), ('F4S', 'Form 4 Science'), ('F4H', 'Form 4 Humanities')], max_length=3)),
+                ('stream', models.CharField(choices=[('SCIENCE', 'Science'), ('HUMANITIES', 'Humanities'), ('NONE', 'None')], default='NONE', max_length=15)),
+                ('term', models.CharField(choices=[('T1', 'Term 1'), ('T2', 'Term 2'), ('T3', 'Term 3')], max_length=2)),
+                ('count', models.PositiveIntegerField(default=0)),
+                ('score_sum', models.DecimalField(decimal_places=2, default=0, max_digits=14)),
+                ('score_sq_sum', models.DecimalField(decimal_places=4, default=0, max_digits=20)),
+                ('pass_count', models.PositiveIntegerField(default=0)),
+                ('n_lt40', models.PositiveIntegerField(default=0)),
+                ('n_40', models.PositiveIntegerField(default=0)),
+                ('n_45', models.PositiveIntegerField(default=0)),
+                ('n_50', models.PositiveIntegerField(default=0)),
+                ('n_55', models.PositiveIntegerField(default=0)),
+                ('n_60', models.PositiveIntegerField(default=0)),
+                ('n_65', models.PositiveIntegerField(default=0)),
+                ('n_70', models.PositiveIntegerField(default=0)),
+                ('n_80', models.PositiveIntegerField(default=0)),
+                ('subject', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='rollups', to='grades.subject')),
+            ],
+            options={
+                'indexes': [models.Index(fields=['term', 'form'], name='grades_grad_term_307e90_idx'), models.Index(fields=['stream', 'term'], name='grades_grad_stream_cdb7ab_idx')],
+                'constraints': [models.UniqueConstraint(fields=('form', 'subject', 'term'), name='unique_grade_rollup_cell')],
+            },
+        ),
+        migrations.RunPython(populate_rollups, migrations.RunPython.noop),
+    ]
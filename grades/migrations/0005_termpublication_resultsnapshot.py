@@ -0,0 +1,44 @@
+# Generated by Django 6.0 on 2026-01-15 14:22
+
+import django.db.models.deletion
+from django.conf import settings
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('grades', '0004_graderollup'),
+        migrations.swappable_dependency(settings.AUTH_USER_MODEL),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='TermPublication',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('term', models.CharField(choices=[('T1', 'Term 1'), ('T2', 'Term 2'), ('T3', 'Term 3')], max_length=2, unique=True)),
+                ('published_at', models.DateTimeField()),
+                ('published_by', models.ForeignKey(blank=True, null=True, on_delete=django.db.models.deletion.SET_NULL, to=settings.AUTH_USER_MODEL)),
+            ],
+            options={
+                'ordering': ['term'],
+            },
+        ),
+        migrations.CreateModel(
+            name='ResultSnapshot',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('form', models.CharField(choices=[('F1', 'Form 1'), ('F2', 'Form 2'), ('F3S', 'Form 3 Science'), ('F3H', 'Form 3 Humanities'), ('F4S', 'Form 4 Science'), ('F4H', 'Form 4 Humanities')], max_length=3)),
+                ('data', models.JSONField(help_text='ReportCard.as_dict() at publication time')),
+                ('html', models.TextField(blank=True, default='')),
+                ('pdf', models.BinaryField(blank=True, null=True)),
+                ('rendered_at', models.DateTimeField(blank=True, null=True)),
+                ('student', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='result_snapshots', to='grades.student')),
+                ('publication', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='snapshots', to='grades.termpublication')),
+            ],
+            options={
+                'constraints': [models.UniqueConstraint(fields=('publication', 'student'), name='unique_result_snapshot')],
+            },
+        ),
+    ]
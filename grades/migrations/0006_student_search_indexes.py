@@ -0,0 +1,90 @@
+# Generated by Django 6.0 on 2026-01-19 09:05
+
+import django.db.models.functions.text
+from django.conf import settings
+from django.db import migrations, models
+
+
+# PostgreSQL: pg_trgm indexes for prefix and similarity matches
+POSTGRES_INDEX_SQL = [
+    "CREATE EXTENSION IF NOT EXISTS pg_trgm",
+    "CREATE INDEX IF NOT EXISTS student_first_name_trgm ON grades_student USING gin (lower(first_name) gin_trgm_ops)",
+    "CREATE INDEX IF NOT EXISTS student_last_name_trgm ON grades_student USING gin (lower(last_name) gin_trgm_ops)",
+    "CREATE INDEX IF NOT EXISTS student_student_id_trgm ON grades_student USING gin (lower(student_id) gin_trgm_ops)",
+]
+POSTGRES_DROP_SQL = [
+    "DROP INDEX IF EXISTS student_first_name_trgm",
+    "DROP INDEX IF EXISTS student_last_name_trgm",
+    "DROP INDEX IF EXISTS student_student_id_trgm",
+]
+# SQLite: an external-content FTS5 table kept in sync by triggers
+SQLITE_FTS_SQL = [
+    """CREATE VIRTUAL TABLE IF NOT EXISTS grades_student_fts USING fts5(
+        student_id, first_name, last_name,
+        content='grades_student', content_rowid='id',
+        tokenize='unicode61 remove_diacritics 2', prefix='1 2 3'
+    )""",
+    """CREATE TRIGGER IF NOT EXISTS grades_student_fts_insert AFTER INSERT ON grades_student BEGIN
+        INSERT INTO grades_student_fts(rowid, student_id, first_name, last_name)
+        VALUES (new.id, new.student_id, new.first_name, new.last_name);
+    END""",
+    """CREATE TRIGGER IF NOT EXISTS grades_student_fts_delete AFTER DELETE ON grades_student BEGIN
+        INSERT INTO grades_student_fts(grades_student_fts, rowid, student_id, first_name, last_name)
+        VALUES ('delete', old.id, old.student_id, old.first_name, old.last_name);
+    END""",
+    """CREATE TRIGGER IF NOT EXISTS grades_student_fts_update AFTER UPDATE ON grades_student BEGIN
+        INSERT INTO grades_student_fts(grades_student_fts, rowid, student_id, first_name, last_name)
+        VALUES ('delete', old.id, old.student_id, old.first_name, old.last_name);
+        INSERT INTO grades_student_fts(rowid, student_id, first_name, last_name)
+        VALUES (new.id, new.student_id, new.first_name, new.last_name);
+    END""",
+    "INSERT INTO grades_student_fts(grades_student_fts) VALUES ('rebuild')",
+]
+SQLITE_DROP_SQL = [
+    "DROP TRIGGER IF EXISTS grades_student_fts_insert",
+    "DROP TRIGGER IF EXISTS grades_student_fts_delete",
+    "DROP TRIGGER IF EXISTS grades_student_fts_update",
+    "DROP TABLE IF EXISTS grades_student_fts",
+]
+
+
+def _execute(schema_editor, statements):
+    for sql in statements:
+        schema_editor.execute(sql)
+
+
+def create_search_indexes(apps, schema_editor):
+    conn = schema_editor.connection
+    if conn.vendor == 'postgresql':
+        _execute(schema_editor, POSTGRES_INDEX_SQL)
+    elif conn.vendor == 'sqlite':
+        with conn.cursor() as cursor:
+            cursor.execute("PRAGMA compile_options")
+            has_fts5 = any('FTS5' in row[0] for row in cursor.fetchall())
+        if has_fts5:
+            _execute(schema_editor, SQLITE_FTS_SQL)
+
+
+def drop_search_indexes(apps, schema_editor):
+    vendor = schema_editor.connection.vendor
+    _execute(schema_editor, {'postgresql': POSTGRES_DROP_SQL, 'sqlite': SQLITE_DROP_SQL}.get(vendor, []))
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('grades', '0005_termpublication_resultsnapshot'),
+        migrations.swappable_dependency(settings.AUTH_USER_MODEL),
+    ]
+
+    operations = [
+        migrations.AddIndex(
+            model_name='student',
+            index=models.Index(django.db.models.functions.text.Lower('first_name'), name='student_first_name_lower'),
+        ),
+        migrations.AddIndex(
+            model_name='student',
+            index=models.Index(django.db.models.functions.text.Lower('last_name'), name='student_last_name_lower'),
+        ),
+        migrations.RunPython(create_search_indexes, drop_search_indexes),
+    ]
@@ -0,0 +1,18 @@
+# Generated by Django 6.0 on 2026-01-22 11:37
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('grades', '0006_student_search_indexes'),
+    ]
+
+    operations = [
+        migrations.AlterField(
+            model_name='student',
+            name='form',
+            field=models.CharField(choices=[('F1', 'Form 1'), ('F2', 'Form 2'), ('F3S', 'Form 3 Science'), ('F3H', 'Form 3 Humanities'), ('F4S', 'Form 4 Science'), ('F4H', 'Form 4 Humanities'), ('GRD', 'Graduated')], default='F1', max_length=3),
+        ),
+    ]
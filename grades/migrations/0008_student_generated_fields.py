@@ -0,0 +1,47 @@
+# Generated by Django 6.0 on 2026-01-26 10:12
+
+from django.conf import settings
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('grades', '0007_student_graduated_form'),
+        migrations.swappable_dependency(settings.AUTH_USER_MODEL),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='student',
+            name='base_form',
+            field=models.GeneratedField(db_persist=True, expression=models.Case(models.When(form__in=('F3S', 'F3H'), then=models.Value('F3')), models.When(form__in=('F4S', 'F4H'), then=models.Value('F4')), default=models.F('form')), output_field=models.CharField(max_length=3)),
+        ),
+        migrations.AddField(
+            model_name='student',
+            name='is_senior',
+            field=models.GeneratedField(db_persist=True, expression=models.Q(('form__in', ('F3S', 'F3H', 'F4S', 'F4H'))), output_field=models.BooleanField()),
+        ),
+        # A stored column cannot be altered into a generated one
+        migrations.RemoveField(
+            model_name='student',
+            name='stream',
+        ),
+        migrations.AddField(
+            model_name='student',
+            name='stream',
+            field=models.GeneratedField(db_persist=True, expression=models.Case(models.When(form__in=('F3S', 'F4S'), then=models.Value('SCIENCE')), models.When(form__in=('F3H', 'F4H'), then=models.Value('HUMANITIES')), default=models.Value('NONE')), output_field=models.CharField(choices=[('SCIENCE', 'Science'), ('HUMANITIES', 'Humanities'), ('NONE', 'None')], max_length=15)),
+        ),
+        migrations.AddIndex(
+            model_name='student',
+            index=models.Index(fields=['is_senior', 'form'], name='student_level_form'),
+        ),
+        migrations.AddIndex(
+            model_name='student',
+            index=models.Index(fields=['base_form'], name='student_base_form'),
+        ),
+        migrations.AddIndex(
+            model_name='student',
+            index=models.Index(fields=['stream', 'form'], name='student_stream_form'),
+        ),
+    ]
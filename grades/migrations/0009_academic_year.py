@@ -0,0 +1,116 @@
+# Generated by Django 6.0 on 2026-01-27 09:40
+
+import django.db.models.deletion
+import grades.models
+from datetime import date
+
+from django.conf import settings
+from django.db import migrations, models
+
+
+def year_under_way():
+    # Fills existing rows.  The model default reads AcademicCalendar, which
+    # does not exist until 0012
+    if getattr(settings, 'ACADEMIC_YEAR', None):
+        return int(settings.ACADEMIC_YEAR)
+    today = date.today()
+    start_month = getattr(settings, 'ACADEMIC_YEAR_START_MONTH', 1)
+    return today.year if today.month >= start_month else today.year - 1
+
+
+def add_academic_year(model_name):
+    return migrations.SeparateDatabaseAndState(
+        database_operations=[migrations.AddField(
+            model_name=model_name,
+            name='academic_year',
+            field=models.PositiveSmallIntegerField(default=year_under_way),
+        )],
+        state_operations=[migrations.AddField(
+            model_name=model_name,
+            name='academic_year',
+            field=models.PositiveSmallIntegerField(default=grades.models.current_academic_year),
+        )],
+    )
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('grades', '0008_student_generated_fields'),
+        migrations.swappable_dependency(settings.AUTH_USER_MODEL),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='ArchivedGrade',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('academic_year', models.PositiveSmallIntegerField()),
+                ('term', models.CharField(choices=[('T1', 'Term 1'), ('T2', 'Term 2'), ('T3', 'Term 3')], max_length=2)),
+                ('student_code', models.CharField(max_length=20)),
+                ('form', models.CharField(max_length=3)),
+                ('subject_name', models.CharField(max_length=100)),
+                ('score', models.DecimalField(decimal_places=2, max_digits=5)),
+                ('created_at', models.DateTimeField()),
+                ('updated_at', models.DateTimeField()),
+            ],
+        ),
+        migrations.CreateModel(
+            name='ArchivedResult',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('academic_year', models.PositiveSmallIntegerField()),
+                ('term', models.CharField(choices=[('T1', 'Term 1'), ('T2', 'Term 2'), ('T3', 'Term 3')], max_length=2)),
+                ('student_code', models.CharField(max_length=20)),
+                ('form', models.CharField(max_length=3)),
+                ('published_at', models.DateTimeField()),
+                ('data', models.JSONField(help_text='ReportCard.as_dict() at publication time')),
+            ],
+        ),
+        migrations.AlterModelOptions(
+            name='termpublication',
+            options={'ordering': ['academic_year', 'term']},
+        ),
+        add_academic_year('grade'),
+        add_academic_year('termpublication'),
+        migrations.AlterField(
+            model_name='termpublication',
+            name='term',
+            field=models.CharField(choices=[('T1', 'Term 1'), ('T2', 'Term 2'), ('T3', 'Term 3')], max_length=2),
+        ),
+        migrations.AddIndex(
+            model_name='grade',
+            index=models.Index(fields=['academic_year', 'term'], name='grade_year_term'),
+        ),
+        migrations.AddConstraint(
+            model_name='termpublication',
+            constraint=models.UniqueConstraint(fields=('academic_year', 'term'), name='unique_term_publication'),
+        ),
+        migrations.AddField(
+            model_name='archivedgrade',
+            name='student',
+            field=models.ForeignKey(null=True, on_delete=django.db.models.deletion.SET_NULL, related_name='archived_grades', to='grades.student'),
+        ),
+        migrations.AddField(
+            model_name='archivedgrade',
+            name='subject',
+            field=models.ForeignKey(null=True, on_delete=django.db.models.deletion.SET_NULL, related_name='+', to='grades.subject'),
+        ),
+        migrations.AddField(
+            model_name='archivedresult',
+            name='student',
+            field=models.ForeignKey(null=True, on_delete=django.db.models.deletion.SET_NULL, related_name='archived_results', to='grades.student'),
+        ),
+        migrations.AddIndex(
+            model_name='archivedgrade',
+            index=models.Index(fields=['student', 'academic_year', 'term'], name='archived_grade_student'),
+        ),
+        migrations.AddIndex(
+            model_name='archivedgrade',
+            index=models.Index(fields=['academic_year', 'form', 'term'], name='archived_grade_year_form'),
+        ),
+        migrations.AddIndex(
+            model_name='archivedresult',
+            index=models.Index(fields=['student', 'academic_year', 'term'], name='archived_result_student'),
+        ),
+    ]
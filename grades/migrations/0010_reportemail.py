@@ -0,0 +1,29 @@
+# Generated by Django 6.0 on 2026-01-28 14:05
+
+import django.db.models.deletion
+import grades.models
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('grades', '0009_academic_year'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='ReportEmail',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('academic_year', models.PositiveSmallIntegerField(default=grades.models.current_academic_year)),
+                ('term', models.CharField(choices=[('T1', 'Term 1'), ('T2', 'Term 2'), ('T3', 'Term 3')], max_length=2)),
+                ('email', models.EmailField(max_length=254)),
+                ('sent_at', models.DateTimeField()),
+                ('student', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='report_emails', to='grades.student')),
+            ],
+            options={
+                'constraints': [models.UniqueConstraint(fields=('student', 'academic_year', 'term'), name='unique_report_email')],
+            },
+        ),
+    ]
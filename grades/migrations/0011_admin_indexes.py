@@ -0,0 +1,23 @@
+# Generated by Django 6.0 on 2026-02-02 09:40
+
+from django.conf import settings
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('grades', '0010_reportemail'),
+        migrations.swappable_dependency(settings.AUTH_USER_MODEL),
+    ]
+
+    operations = [
+        migrations.AddIndex(
+            model_name='grade',
+            index=models.Index(fields=['-created_at'], name='grade_created_desc'),
+        ),
+        migrations.AddIndex(
+            model_name='student',
+            index=models.Index(fields=['form'], name='student_form'),
+        ),
+    ]
@@ -0,0 +1,40 @@
+# Generated by Django 6.0 on 2026-02-09 09:40
+
+from datetime import date
+
+from django.conf import settings
+from django.db import migrations, models
+from django.db.models import Max
+
+
+def seed_calendar(apps, schema_editor):
+    # Keep whichever year the live grades already belong to
+    Grade = apps.get_model('grades', 'Grade')
+    TermPublication = apps.get_model('grades', 'TermPublication')
+    year = getattr(settings, 'ACADEMIC_YEAR', None) or max(
+        Grade.objects.aggregate(year=Max('academic_year'))['year'] or 0,
+        TermPublication.objects.aggregate(year=Max('academic_year'))['year'] or 0,
+    )
+    if not year:
+        today = date.today()
+        start_month = getattr(settings, 'ACADEMIC_YEAR_START_MONTH', 1)
+        year = today.year if today.month >= start_month else today.year - 1
+    apps.get_model('grades', 'AcademicCalendar').objects.create(pk=1, current_year=year)
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('grades', '0011_admin_indexes'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='AcademicCalendar',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('current_year', models.PositiveSmallIntegerField()),
+            ],
+        ),
+        migrations.RunPython(seed_calendar, migrations.RunPython.noop),
+    ]
@@ -1,9 +1,81 @@
+import time
+from datetime import date
+
 from django.db import models
+from django.db.models.functions import Lower
 from django.conf import settings
 from django.db.models.signals import post_save
 from django.dispatch import receiver
 
 
+SENIOR_FORMS = ('F3S', 'F3H', 'F4S', 'F4H')
+
+
+# (loaded at, year) for this process; see current_academic_year()
+_live_year = None
+
+
+def _initial_academic_year():
+    """The year a new database starts in: ``ACADEMIC_YEAR``, else the one under way."""
+    if getattr(settings, 'ACADEMIC_YEAR', None):
+        return int(settings.ACADEMIC_YEAR)
+    today = date.today()
+    start_month = getattr(settings, 'ACADEMIC_YEAR_START_MONTH', 1)
+    return today.year if today.month >= start_month else today.year - 1
+
+
+def _cached_year():
+    cached = _live_year
+    max_age = getattr(settings, 'ACADEMIC_YEAR_CACHE_SECONDS', 60)
+    if cached is not None and time.monotonic() - cached[0] < max_age:
+        return cached[1]
+    return None
+
+
+def _remember_year(calendar):
+    global _live_year
+    _live_year = (time.monotonic(), calendar.current_year)
+    return calendar.current_year
+
+
+def current_academic_year():
+    """The academic year live results belong to, named by its starting year.
+
+    It is kept in the AcademicCalendar row and only year-end promotion moves
+    it on, so live results and the grade rollups change year together rather
+    than on a date.  Each process re-reads it after
+    ``ACADEMIC_YEAR_CACHE_SECONDS``.
+    """
+    year = _cached_year()
+    if year is None:
+        calendar, _ = AcademicCalendar.objects.get_or_create(
+            pk=1, defaults={'current_year': _initial_academic_year()})
+        year = _remember_year(calendar)
+    return year
+
+
+async def acurrent_academic_year():
+    year = _cached_year()
+    if year is None:
+        calendar, _ = await AcademicCalendar.objects.aget_or_create(
+            pk=1, defaults={'current_year': _initial_academic_year()})
+        year = _remember_year(calendar)
+    return year
+
+
+def invalidate_academic_year():
+    """Drop this process's copy; the next lookup re-reads AcademicCalendar."""
+    global _live_year
+    _live_year = None
+
+
+def academic_year_label(year):
+    """'2025' for calendar-year schools, '2025/26' when the year spans two."""
+    if getattr(settings, 'ACADEMIC_YEAR_START_MONTH', 1) == 1:
+        return str(year)
+    return f"{year}/{(year + 1) % 100:02d}"
+
+
 class Student(models.Model):
     first_name = models.CharField(max_length=50)
     last_name = models.CharField(max_length=50)
@@ -18,7 +90,10 @@ class Student(models.Model):
         ('F4S', 'Form 4 Science'),
         ('F4H', 'Form 4 Humanities'),
     ]
-    form = models.CharField(max_length=3, choices=FORM_CHOICES, default='F1')
+    # Students who have finished Form 4 keep their records under this code,
+    # outside FORM_CHOICES so per-form pages and rankings leave them out
+    GRADUATED = 'GRD'
+    form = models.CharField(max_length=3, choices=FORM_CHOICES + [(GRADUATED, 'Graduated')], default='F1')
     
     # Add a stream field for easier filtering
     STREAM_CHOICES = [
@@ -26,47 +101,84 @@ class Student(models.Model):
         ('HUMANITIES', 'Humanities'),
         ('NONE', 'None'),  # For F1, F2
     ]
-    stream = models.CharField(max_length=15, choices=STREAM_CHOICES, default='NONE')
+
+    # Derived from form by the database, so bulk updates can never leave them
+    # stale and queries can filter on level/base form/stream directly
+    is_senior = models.GeneratedField(
+        expression=models.Q(form__in=SENIOR_FORMS),
+        output_field=models.BooleanField(),
+        db_persist=True,
+    )
+    base_form = models.GeneratedField(
+        expression=models.Case(
+            models.When(form__in=('F3S', 'F3H'), then=models.Value('F3')),
+            models.When(form__in=('F4S', 'F4H'), then=models.Value('F4')),
+            default=models.F('form'),
+        ),
+        output_field=models.CharField(max_length=3),
+        db_persist=True,
+    )
+    stream = models.GeneratedField(
+        expression=models.Case(
+            models.When(form__in=('F3S', 'F4S'), then=models.Value('SCIENCE')),
+            models.When(form__in=('F3H', 'F4H'), then=models.Value('HUMANITIES')),
+            default=models.Value('NONE'),
+        ),
+        output_field=models.CharField(max_length=15, choices=STREAM_CHOICES),
+        db_persist=True,
+    )
     
     user = models.OneToOneField(settings.AUTH_USER_MODEL, null=True, blank=True, on_delete=models.SET_NULL)
     assigned_password = models.CharField(max_length=50, null=True, blank=True,
                                          help_text='Password assigned by form teacher for initial login (plaintext)')
 
+    class Meta:
+        indexes = [
+            # Case-insensitive name lookups (login, search); Postgres also gets
+            # pg_trgm and SQLite an FTS5 table, see grades/search.py
+            models.Index(Lower('first_name'), name='student_first_name_lower'),
+            models.Index(Lower('last_name'), name='student_last_name_lower'),
+            models.Index(fields=['is_senior', 'form'], name='student_level_form'),
+            models.Index(fields=['base_form'], name='student_base_form'),
+            models.Index(fields=['stream', 'form'], name='student_stream_form'),
+            models.Index(fields=['form'], name='student_form'),
+        ]
+
     def __str__(self):
         stream_display = f" ({self.get_stream_display()})" if self.stream != 'NONE' else ''
         return f"{self.first_name} {self.last_name} ({self.student_id}) - {self.get_form_display()}{stream_display}"
 
-    @property
-    def is_senior(self):
-        return self.form in ('F3S', 'F3H', 'F4S', 'F4H')
-
     @property
     def level(self):
         return 'Senior' if self.is_senior else 'Junior'
     
-    @property
-    def base_form(self):
-        """Return the base form without stream (F1, F2, F3, F4)"""
-        if self.form in ('F3S', 'F3H'):
-            return 'F3'
-        elif self.form in ('F4S', 'F4H'):
-            return 'F4'
-        return self.form
-    
+    def save(self, *args, **kwargs):
+        adding = self._state.adding
+        super().save(*args, **kwargs)
+        if not adding:
+            # Generated values may be stale after an UPDATE; defer them so the
+            # next access reads what the database computed
+            for field in self._meta.concrete_fields:
+                if field.generated:
+                    self.__dict__.pop(field.attname, None)
+
+    def get_stream_display(self):
+        # GeneratedField does not add get_FOO_display() for its output choices
+        return dict(self.STREAM_CHOICES).get(self.stream, self.stream)
+
     @property
     def stream_code(self):
         """Return S or H for stream"""
-        return self.form[-1] if self.form in ('F3S', 'F3H', 'F4S', 'F4H') else ''
-    
-    def save(self, *args, **kwargs):
-        # Automatically set stream based on form
-        if self.form in ('F3S', 'F4S'):
-            self.stream = 'SCIENCE'
-        elif self.form in ('F3H', 'F4H'):
-            self.stream = 'HUMANITIES'
-        else:
-            self.stream = 'NONE'
-        super().save(*args, **kwargs)
+        return self.form[-1] if self.form in SENIOR_FORMS else ''
+
+
+def stream_for_form(form):
+    """Return the Student.stream value implied by a form code."""
+    if form in ('F3S', 'F4S'):
+        return 'SCIENCE'
+    if form in ('F3H', 'F4H'):
+        return 'HUMANITIES'
+    return 'NONE'
 
 
 class Subject(models.Model):
@@ -97,6 +209,58 @@ class Subject(models.Model):
         return f"{self.name}{stream_info}"
 
 
+def letter_for_score(score):
+    """Return the junior letter grade A-F for a raw score."""
+    s = float(score)
+    if s >= 80:
+        return 'A'
+    if s >= 70:
+        return 'B'
+    if s >= 60:
+        return 'C'
+    if s >= 40:
+        return 'D'
+    return 'F'
+
+
+def senior_point_for_score(score):
+    """Return the senior (MSCE) point 1-9 for a raw score."""
+    s = float(score)
+    if s >= 80:
+        return 1
+    if s >= 70:
+        return 2
+    if s >= 65:
+        return 3
+    if s >= 60:
+        return 4
+    if s >= 55:
+        return 5
+    if s >= 50:
+        return 6
+    if s >= 45:
+        return 7
+    if s >= 40:
+        return 8
+    return 9
+
+
+def score_passes(score, is_senior):
+    """Whether a raw score passes: point 8 or better for seniors, 40% for juniors."""
+    if is_senior:
+        return senior_point_for_score(score) <= 8
+    return float(score) >= 40
+
+
+class GradeQuerySet(models.QuerySet):
+    def current(self, year=None):
+        """Grades of the current academic year, which live results are built from.
+
+        Async callers pass ``year=await acurrent_academic_year()``.
+        """
+        return self.filter(academic_year=year or current_academic_year())
+
+
 class Grade(models.Model):
     student = models.ForeignKey(Student, on_delete=models.CASCADE, related_name='grades')
     subject = models.ForeignKey(Subject, on_delete=models.CASCADE)
@@ -108,26 +272,27 @@ class Grade(models.Model):
         ('T3', 'Term 3'),
     ]
     term = models.CharField(max_length=2, choices=TERM_CHOICES, default='T1')
+    # Closed years are moved to ArchivedGrade by ``manage.py archive_year``
+    academic_year = models.PositiveSmallIntegerField(default=current_academic_year)
     created_at = models.DateTimeField(auto_now_add=True)
+    updated_at = models.DateTimeField(auto_now=True)
+
+    objects = GradeQuerySet.as_manager()
 
     class Meta:
         ordering = ['-created_at']
+        indexes = [
+            models.Index(fields=['academic_year', 'term'], name='grade_year_term'),
+            # Default changelist order; lets the admin read one page without sorting the table
+            models.Index(fields=['-created_at'], name='grade_created_desc'),
+        ]
 
     def __str__(self):
         return f"{self.student} - {self.subject}: {self.score}"
 
     @property
     def letter(self):
-        s = float(self.score)
-        if s >= 80:
-            return 'A'
-        if s >= 70:
-            return 'B'
-        if s >= 60:
-            return 'C'
-        if s >= 40:
-            return 'D'
-        return 'F'
+        return letter_for_score(self.score)
 
     def grade_label(self):
         s = float(self.score)
@@ -164,29 +329,163 @@ class Grade(models.Model):
     def senior_point(self):
         if not self.student or not self.student.is_senior:
             return None
-        s = float(self.score)
-        if s >= 80:
-            return 1
-        if s >= 70:
-            return 2
-        if s >= 65:
-            return 3
-        if s >= 60:
-            return 4
-        if s >= 55:
-            return 5
-        if s >= 50:
-            return 6
-        if s >= 45:
-            return 7
-        if s >= 40:
-            return 8
-        return 9
+        return senior_point_for_score(self.score)
 
     def is_pass(self):
-        if not self.student or not self.student.is_senior:
-            return float(self.score) >= 40
-        return self.senior_point() is not None and self.senior_point() <= 8
+        return score_passes(self.score, bool(self.student and self.student.is_senior))
+
+
+class GradeRollup(models.Model):
+    """Pre-aggregated grades per form, subject and term for analytics.
+
+    Covers the current academic year only.  Kept current incrementally by
+    the signals in grades/signals.py; run ``manage.py rebuild_grade_rollups``
+    after bulk writes that bypass them.  Promotion rebuilds them when it moves
+    the academic year on.
+    """
+    form = models.CharField(max_length=3, choices=Student.FORM_CHOICES)
+    stream = models.CharField(max_length=15, choices=Student.STREAM_CHOICES, default='NONE')
+    subject = models.ForeignKey(Subject, on_delete=models.CASCADE, related_name='rollups')
+    term = models.CharField(max_length=2, choices=Grade.TERM_CHOICES)
+
+    count = models.PositiveIntegerField(default=0)
+    score_sum = models.DecimalField(max_digits=14, decimal_places=2, default=0)
+    score_sq_sum = models.DecimalField(max_digits=20, decimal_places=4, default=0)
+    pass_count = models.PositiveIntegerField(default=0)
+
+    # Score brackets [lower bound, next bound). Together they give both the
+    # junior letter bands and the senior 1-9 points.
+    n_lt40 = models.PositiveIntegerField(default=0)
+    n_40 = models.PositiveIntegerField(default=0)
+    n_45 = models.PositiveIntegerField(default=0)
+    n_50 = models.PositiveIntegerField(default=0)
+    n_55 = models.PositiveIntegerField(default=0)
+    n_60 = models.PositiveIntegerField(default=0)
+    n_65 = models.PositiveIntegerField(default=0)
+    n_70 = models.PositiveIntegerField(default=0)
+    n_80 = models.PositiveIntegerField(default=0)
+
+    class Meta:
+        constraints = [
+            models.UniqueConstraint(fields=['form', 'subject', 'term'], name='unique_grade_rollup_cell'),
+        ]
+        indexes = [
+            models.Index(fields=['term', 'form']),
+            models.Index(fields=['stream', 'term']),
+        ]
+
+    def __str__(self):
+        return f"{self.form} {self.subject_id} {self.term}: {self.count} grades"
+
+
+class TermPublication(models.Model):
+    """A released term: student-facing views read frozen snapshots from here."""
+    academic_year = models.PositiveSmallIntegerField(default=current_academic_year)
+    term = models.CharField(max_length=2, choices=Grade.TERM_CHOICES)
+    published_at = models.DateTimeField()
+    published_by = models.ForeignKey(settings.AUTH_USER_MODEL, null=True, blank=True, on_delete=models.SET_NULL)
+
+    class Meta:
+        ordering = ['academic_year', 'term']
+        constraints = [
+            models.UniqueConstraint(fields=['academic_year', 'term'], name='unique_term_publication'),
+        ]
+
+    def __str__(self):
+        return f"{self.get_term_display()} published {self.published_at:%Y-%m-%d %H:%M}"
+
+
+class ResultSnapshot(models.Model):
+    """One student's frozen term result, optionally with pre-rendered page and PDF."""
+    publication = models.ForeignKey(TermPublication, on_delete=models.CASCADE, related_name='snapshots')
+    student = models.ForeignKey(Student, on_delete=models.CASCADE, related_name='result_snapshots')
+    form = models.CharField(max_length=3, choices=Student.FORM_CHOICES)
+    data = models.JSONField(help_text='ReportCard.as_dict() at publication time')
+    html = models.TextField(blank=True, default='')
+    pdf = models.BinaryField(null=True, blank=True)
+    rendered_at = models.DateTimeField(null=True, blank=True)
+
+    class Meta:
+        constraints = [
+            models.UniqueConstraint(fields=['publication', 'student'], name='unique_result_snapshot'),
+        ]
+
+    def __str__(self):
+        return f"{self.student_id} {self.publication.term}"
+
+
+class ReportEmail(models.Model):
+    """A term report card emailed to a student; ``email_reports`` skips these on resume."""
+    student = models.ForeignKey(Student, on_delete=models.CASCADE, related_name='report_emails')
+    academic_year = models.PositiveSmallIntegerField(default=current_academic_year)
+    term = models.CharField(max_length=2, choices=Grade.TERM_CHOICES)
+    email = models.EmailField()
+    sent_at = models.DateTimeField()
+
+    class Meta:
+        constraints = [
+            models.UniqueConstraint(fields=['student', 'academic_year', 'term'], name='unique_report_email'),
+        ]
+
+    def __str__(self):
+        return f"{self.student_id} {self.academic_year} {self.term} -> {self.email}"
+
+
+class AcademicCalendar(models.Model):
+    """The single row holding the academic year live results belong to.
+
+    Read it with current_academic_year(); promote_school moves it on.
+    """
+    current_year = models.PositiveSmallIntegerField()
+
+    def __str__(self):
+        return academic_year_label(self.current_year)
+
+
+class ArchivedGrade(models.Model):
+    """A grade from a closed academic year, moved out of the live Grade table.
+
+    Student and subject details are copied so transcripts survive students
+    leaving and subjects being renamed or removed.
+    """
+    academic_year = models.PositiveSmallIntegerField()
+    term = models.CharField(max_length=2, choices=Grade.TERM_CHOICES)
+    student = models.ForeignKey(Student, null=True, on_delete=models.SET_NULL, related_name='archived_grades')
+    student_code = models.CharField(max_length=20)
+    form = models.CharField(max_length=3)
+    subject = models.ForeignKey(Subject, null=True, on_delete=models.SET_NULL, related_name='+')
+    subject_name = models.CharField(max_length=100)
+    score = models.DecimalField(max_digits=5, decimal_places=2)
+    created_at = models.DateTimeField()
+    updated_at = models.DateTimeField()
+
+    class Meta:
+        indexes = [
+            models.Index(fields=['student', 'academic_year', 'term'], name='archived_grade_student'),
+            models.Index(fields=['academic_year', 'form', 'term'], name='archived_grade_year_form'),
+        ]
+
+    def __str__(self):
+        return f"{self.student_code} {self.academic_year} {self.term} {self.subject_name}: {self.score}"
+
+
+class ArchivedResult(models.Model):
+    """A published term result (ReportCard data) from a closed academic year."""
+    academic_year = models.PositiveSmallIntegerField()
+    term = models.CharField(max_length=2, choices=Grade.TERM_CHOICES)
+    student = models.ForeignKey(Student, null=True, on_delete=models.SET_NULL, related_name='archived_results')
+    student_code = models.CharField(max_length=20)
+    form = models.CharField(max_length=3)
+    published_at = models.DateTimeField()
+    data = models.JSONField(help_text='ReportCard.as_dict() at publication time')
+
+    class Meta:
+        indexes = [
+            models.Index(fields=['student', 'academic_year', 'term'], name='archived_result_student'),
+        ]
+
+    def __str__(self):
+        return f"{self.student_code} {self.academic_year} {self.term}"
 
 
 class UserProfile(models.Model):
@@ -0,0 +1,56 @@
+# grades/pdf.py
+"""WeasyPrint rendering helpers shared by the report views.
+
+Rendering a report is CPU-bound and can take seconds, so async views hand it
+to a small dedicated thread pool instead of running it on the event loop.
+"""
+import asyncio
+import os
+import sys
+from concurrent.futures import ThreadPoolExecutor
+
+from django.conf import settings
+from django.template.loader import render_to_string
+
+from .metrics import timed
+
+# Local Windows development uses the GTK3 runtime installer for Pango/Cairo.
+if sys.platform == 'win32':
+    os.environ.setdefault('WEASYPRINT_DLL_DIRECTORIES', r'C:\Program Files\GTK3-Runtime Win64\bin')
+
+_executor = None
+
+
+def _get_executor():
+    """Return the process-wide PDF render pool, creating it on first use."""
+    global _executor
+    if _executor is None:
+        _executor = ThreadPoolExecutor(
+            max_workers=getattr(settings, 'PDF_RENDER_THREADS', 2),
+            thread_name_prefix='pdf-render',
+        )
+    return _executor
+
+
+def render_pdf(template_name, context):
+    """Render a template to PDF bytes (blocking).
+
+    The three phases (Django template, WeasyPrint layout, PDF serialisation)
+    are timed separately in the ``grades_pdf_phase_seconds`` metric.
+    """
+    from weasyprint import HTML
+    from weasyprint.text.fonts import FontConfiguration
+
+    with timed('grades_pdf_phase_seconds', template=template_name, phase='template'):
+        html_string = render_to_string(template_name, context)
+    with timed('grades_pdf_phase_seconds', template=template_name, phase='layout'):
+        font_config = FontConfiguration()
+        document = HTML(string=html_string).render(font_config=font_config)
+    with timed('grades_pdf_phase_seconds', template=template_name, phase='write'):
+        return document.write_pdf()
+
+
+async def arender_pdf(template_name, context):
+    """Render a template to PDF bytes on the render pool without blocking the loop."""
+    loop = asyncio.get_running_loop()
+    return await loop.run_in_executor(_get_executor(), render_pdf, template_name, context)
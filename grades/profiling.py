@@ -0,0 +1,178 @@
+# grades/profiling.py
+"""On-demand profiling of individual requests, for administrators only.
+
+Add ``?_profile=1`` (or send ``X-Profile: 1``) to any URL to run that view
+under cProfile; use ``mem`` instead of ``1`` to also trace allocations with
+tracemalloc.  Each capture is written to ``PROFILE_DIR`` as a ``.prof`` file
+(load it with ``python -m pstats`` or snakeviz) plus a ``.txt`` summary of
+the slowest functions and top allocation sites, and can be listed and
+downloaded from the Profiles page of the admin dashboard.  The response
+carries the capture's name in an ``X-Profile-Id`` header.
+"""
+import cProfile
+import io
+import os
+import pstats
+import re
+import threading
+import time
+import tracemalloc
+from datetime import datetime, timezone
+
+from asgiref.sync import iscoroutinefunction, markcoroutinefunction, sync_to_async
+from django.conf import settings
+
+TOP_FUNCTIONS = 40
+TOP_ALLOCATIONS = 25
+_NAME_RE = re.compile(r'^[\w.-]+$')
+
+# Only one profiler may be active per process (sys.monitoring on 3.12+);
+# a second concurrent request asking for a profile just runs normally.
+_capture_lock = threading.Lock()
+
+
+def profile_dir():
+    return getattr(settings, 'PROFILE_DIR', None) or os.path.join(settings.BASE_DIR, 'profiles')
+
+
+def requested_mode(request):
+    """Return None, 'cpu' or 'mem' depending on the query flag / header."""
+    flag = request.GET.get('_profile') or request.headers.get('X-Profile')
+    if not flag or flag in ('0', 'false'):
+        return None
+    return 'mem' if flag.lower() in ('mem', 'memory') else 'cpu'
+
+
+def can_profile(user):
+    if not user.is_authenticated:
+        return False
+    if user.is_superuser:
+        return True
+    try:
+        return user.profile.is_admin
+    except:
+        return False
+
+
+def list_captures():
+    """Saved captures, newest first, as dicts for the profiles page."""
+    directory = profile_dir()
+    if not os.path.isdir(directory):
+        return []
+    captures = []
+    for filename in os.listdir(directory):
+        stem, ext = os.path.splitext(filename)
+        if ext != '.prof':
+            continue
+        path = os.path.join(directory, filename)
+        captures.append({
+            'name': stem,
+            'size': os.path.getsize(path),
+            'created': datetime.fromtimestamp(os.path.getmtime(path), tz=timezone.utc),
+            'has_report': os.path.exists(os.path.join(directory, stem + '.txt')),
+        })
+    return sorted(captures, key=lambda c: c['created'], reverse=True)
+
+
+def capture_path(name, ext):
+    """Path of a saved capture file, or None if the name is not a valid capture."""
+    if ext not in ('.prof', '.txt') or not _NAME_RE.match(name):
+        return None
+    path = os.path.join(profile_dir(), name + ext)
+    return path if os.path.isfile(path) else None
+
+
+def _save(request, url_name, profiler, elapsed, snapshot):
+    directory = profile_dir()
+    os.makedirs(directory, exist_ok=True)
+    name = f"{time.strftime('%Y%m%d-%H%M%S')}-{url_name}-{os.getpid()}"
+    profiler.dump_stats(os.path.join(directory, name + '.prof'))
+
+    out = io.StringIO()
+    out.write(f"{request.method} {request.get_full_path()}\n")
+    out.write(f"user: {request.user.get_username()}  wall time: {elapsed:.3f}s\n\n")
+    stats = pstats.Stats(profiler, stream=out)
+    stats.sort_stats('cumulative').print_stats(TOP_FUNCTIONS)
+    if snapshot is not None:
+        out.write(f"\nTop {TOP_ALLOCATIONS} allocation sites (live at end of request)\n")
+        for stat in snapshot.statistics('lineno')[:TOP_ALLOCATIONS]:
+            out.write(f"{stat}\n")
+    with open(os.path.join(directory, name + '.txt'), 'w', encoding='utf-8') as fh:
+        fh.write(out.getvalue())
+    return name
+
+
+def _start(mode):
+    tracing = mode == 'mem' and not tracemalloc.is_tracing()
+    if tracing:
+        tracemalloc.start(10)
+    profiler = cProfile.Profile()
+    profiler.enable()
+    return profiler, tracing, time.perf_counter()
+
+
+def _stop(profiler, tracing, started):
+    profiler.disable()
+    elapsed = time.perf_counter() - started
+    snapshot = None
+    if tracing:
+        snapshot = tracemalloc.take_snapshot()
+        tracemalloc.stop()
+    return elapsed, snapshot
+
+
+def _run_sync(request, mode, url_name, view_func, view_args, view_kwargs):
+    # Runs in the same thread as the view so cProfile sees all of its work
+    profiler, tracing, started = _start(mode)
+    try:
+        response = view_func(request, *view_args, **view_kwargs)
+    finally:
+        elapsed, snapshot = _stop(profiler, tracing, started)
+        request.profile_id = _save(request, url_name, profiler, elapsed, snapshot)
+    return response
+
+
+class ProfilingMiddleware:
+    """Run a view under cProfile when an administrator asks for it.
+
+    The view is called here, in its own thread for sync views, so the
+    profile covers the view rather than the event loop.  For async views the
+    profile also includes whatever else the loop ran meanwhile.
+    """
+    sync_capable = False
+    async_capable = True
+
+    def __init__(self, get_response):
+        self.get_response = get_response
+        markcoroutinefunction(self)
+
+    async def __call__(self, request):
+        response = await self.get_response(request)
+        if getattr(request, 'profile_id', None):
+            response['X-Profile-Id'] = request.profile_id
+        return response
+
+    async def process_view(self, request, view_func, view_args, view_kwargs):
+        mode = requested_mode(request)
+        if mode is None:
+            return None
+        user = await request.auser()
+        if not await sync_to_async(can_profile)(user):
+            return None
+
+        if not _capture_lock.acquire(blocking=False):
+            return None
+        try:
+            url_name = getattr(request.resolver_match, 'url_name', None) or 'view'
+            if not iscoroutinefunction(view_func):
+                return await sync_to_async(_run_sync)(request, mode, url_name, view_func, view_args, view_kwargs)
+
+            profiler, tracing, started = _start(mode)
+            try:
+                response = await view_func(request, *view_args, **view_kwargs)
+            finally:
+                elapsed, snapshot = _stop(profiler, tracing, started)
+                request.profile_id = await sync_to_async(_save)(request, url_name, profiler, elapsed, snapshot)
+            return response
+        finally:
+            _capture_lock.release()
@@ -0,0 +1,118 @@
+# grades/promotion.py
+"""End-of-year promotion of the whole school in a few UPDATE statements.
+
+F1 -> F2, F2 -> F3S/F3H (from a stream assignment), F3S/F3H -> F4S/F4H and
+F4 -> graduated.  Forms are moved top-down so nobody moves twice; ``stream``,
+``is_senior`` and ``base_form`` are generated columns, so the database
+re-derives them as part of each UPDATE.  The same transaction moves the
+live academic year on, so the promoted school starts the new year with no
+live grades, and rebuilds the grade rollups for it (the per-student
+form-change signals do not fire for bulk updates anyway).
+
+The year being closed must be archived first (``manage.py archive_year``):
+its grades carry no form, so once students move up they would be ranked
+with their new form.
+"""
+from django.db.models import Case, F, Value, When
+
+from .models import (
+    AcademicCalendar, Grade, Student, academic_year_label, current_academic_year, invalidate_academic_year,
+)
+from .rollups import rebuild_rollups
+from .writer import serialized_writes
+
+# Applied in this order; (label, {old form: new form})
+YEAR_END_MOVES = [
+    ('F4 -> graduated', {'F4S': Student.GRADUATED, 'F4H': Student.GRADUATED}),
+    ('F3 -> F4', {'F3S': 'F4S', 'F3H': 'F4H'}),
+]
+JUNIOR_MOVE = ('F1 -> F2', {'F1': 'F2'})
+STREAM_FORMS = {'S': 'F3S', 'H': 'F3H'}
+STREAM_ALIASES = {'S': 'S', 'SCIENCE': 'S', 'H': 'H', 'HUMANITIES': 'H'}
+
+IN_BATCH = 500
+
+
+class PromotionError(Exception):
+    pass
+
+
+def _move(students, moves):
+    """UPDATE form for every old -> new form pair in ``moves``."""
+    if len(moves) == 1:
+        (new_form,) = moves.values()
+        return students.update(form=new_form)
+    return students.update(form=Case(*[When(form=old, then=Value(new)) for old, new in moves.items()]))
+
+
+def normalise_stream(value):
+    try:
+        return STREAM_ALIASES[value.strip().upper()]
+    except KeyError:
+        raise PromotionError(f"Unknown stream {value!r}; use S/Science or H/Humanities")
+
+
+def plan_promotion(stream_map, default_stream=None):
+    """Validate the F2 stream assignment; return {label: student count}.
+
+    ``stream_map`` maps student_id -> 'S' or 'H'.  F2 students missing from
+    it get ``default_stream``, or the promotion is refused.  So is a year
+    that still has live grades.
+    """
+    live = Grade.objects.current().count()
+    if live:
+        year = current_academic_year()
+        raise PromotionError(f"{academic_year_label(year)} still has {live} live grade(s); "
+                             f"run archive_year {year} first")
+    f2_ids = set(Student.objects.filter(form='F2').values_list('student_id', flat=True))
+    unknown = sorted(set(stream_map) - f2_ids)
+    if unknown:
+        raise PromotionError(f"Not in Form 2: {', '.join(unknown[:10])}{' ...' if len(unknown) > 10 else ''}")
+    unassigned = f2_ids - set(stream_map)
+    if unassigned and not default_stream:
+        raise PromotionError(
+            f"{len(unassigned)} Form 2 student(s) have no stream, e.g. {', '.join(sorted(unassigned)[:5])}; "
+            "add them to the mapping or pass a default stream"
+        )
+
+    counts = {}
+    for label, moves in YEAR_END_MOVES + [JUNIOR_MOVE]:
+        counts[label] = Student.objects.filter(form__in=moves).count()
+    for code, form in STREAM_FORMS.items():
+        counts[f'F2 -> {form}'] = (
+            sum(1 for s in stream_map.values() if s == code)
+            + (len(unassigned) if default_stream == code else 0)
+        )
+    return counts
+
+
+def promote_school(stream_map, default_stream=None):
+    """Apply the year-end rollover atomically and start the next academic year.
+
+    Returns {label: students moved}.
+    """
+    plan_promotion(stream_map, default_stream)
+    moved = {}
+    with serialized_writes():
+        for label, moves in YEAR_END_MOVES:
+            moved[label] = _move(Student.objects.filter(form__in=moves), moves)
+
+        by_stream = {code: [sid for sid, s in stream_map.items() if s == code] for code in STREAM_FORMS}
+        for code, form in STREAM_FORMS.items():
+            ids = by_stream[code]
+            moved[f'F2 -> {form}'] = sum(
+                _move(Student.objects.filter(form='F2', student_id__in=ids[i:i + IN_BATCH]), {'F2': form})
+                for i in range(0, len(ids), IN_BATCH)
+            )
+        if default_stream:
+            form = STREAM_FORMS[default_stream]
+            moved[f'F2 -> {form}'] += _move(Student.objects.filter(form='F2'), {'F2': form})
+
+        label, moves = JUNIOR_MOVE
+        moved[label] = _move(Student.objects.filter(form__in=moves), moves)
+
+        current_academic_year()  # creates the calendar row on first use
+        AcademicCalendar.objects.filter(pk=1).update(current_year=F('current_year') + 1)
+        invalidate_academic_year()
+        rebuild_rollups()
+    return moved
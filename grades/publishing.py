@@ -0,0 +1,167 @@
+# grades/publishing.py
+"""Results release: freeze a term's results and serve them from snapshots.
+
+Publishing a term computes every student's ReportCard (one grades query per
+form) and stores it as a ResultSnapshot.  ``manage.py warm_results`` then
+pre-renders each snapshot's results page and PDF, so on results day the
+student-facing views serve a stored row instead of ranking the class live.
+
+Publishing reads every grade of the term, so the admin dashboard does not
+publish in the web request: ``start_publish_term`` runs ``manage.py
+publish_term`` in a process of its own and the request returns at once.
+"""
+import subprocess
+import sys
+from concurrent.futures import ThreadPoolExecutor
+from itertools import islice
+
+from django.conf import settings
+from django.template.loader import render_to_string
+from django.test import RequestFactory
+from django.urls import reverse
+from django.utils import timezone
+
+from .models import ResultSnapshot, Student, TermPublication, acurrent_academic_year, current_academic_year
+from .pdf import render_pdf
+from .report_card import ReportCard, build_form_report_cards, report_pdf_context, results_page_context
+from .writer import consistent_reads, serialized_writes
+
+
+def current_publications(year=None):
+    """Publications of the current academic year (async callers pass ``year``)."""
+    return TermPublication.objects.filter(academic_year=year or current_academic_year())
+
+
+def _form_snapshots(form, term):
+    students = list(Student.objects.filter(form=form))
+    if not students:
+        return []
+    cards = build_form_report_cards(students, form, term)
+    return [ResultSnapshot(student=student, form=form, data=cards[student.pk].as_dict()) for student in students]
+
+
+def publish_term(term, user=None):
+    """Freeze every student's result for ``term``, replacing any earlier publication."""
+    forms = [form for form, _ in Student.FORM_CHOICES]
+    # Cards are computed from one read snapshot, before the write lock is taken
+    with consistent_reads():
+        snapshots = [snapshot for form in forms for snapshot in _form_snapshots(form, term)]
+    with serialized_writes():
+        # Forms whose students were added, moved or deleted since are computed again
+        current = dict(Student.objects.filter(form__in=forms).values_list('pk', 'form'))
+        computed = {snapshot.student_id: snapshot.form for snapshot in snapshots}
+        stale = {form for pk, form in current.items() if computed.get(pk) != form}
+        stale |= {form for pk, form in computed.items() if current.get(pk) != form}
+        if stale:
+            snapshots = [snapshot for snapshot in snapshots if snapshot.form not in stale]
+            snapshots += [snapshot for form in forms if form in stale for snapshot in _form_snapshots(form, term)]
+
+        current_publications().filter(term=term).delete()
+        publication = TermPublication.objects.create(
+            academic_year=current_academic_year(), term=term, published_at=timezone.now(), published_by=user,
+        )
+        for snapshot in snapshots:
+            snapshot.publication = publication
+        ResultSnapshot.objects.bulk_create(snapshots, batch_size=500)
+    return publication
+
+
+def unpublish_term(term):
+    """Withdraw a publication; student views go back to live results."""
+    deleted, _ = current_publications().filter(term=term).delete()
+    return bool(deleted)
+
+
+def start_publish_term(term, unpublish=False, user=None):
+    """Run ``manage.py publish_term`` for ``term`` in the background; returns the process.
+
+    The process gets its own session, so it finishes even if the web worker
+    that started it is recycled; its output goes to the server's log.
+    """
+    args = [sys.executable, str(settings.BASE_DIR / 'manage.py'), 'publish_term', term]
+    if unpublish:
+        args.append('--unpublish')
+    elif user is not None:
+        args += ['--user', str(user.pk)]
+    return subprocess.Popen(args, stdin=subprocess.DEVNULL, start_new_session=True)
+
+
+async def apublication_for(term):
+    return await current_publications(await acurrent_academic_year()).filter(term=term).afirst()
+
+
+async def asnapshot_for(publication, student, with_pdf=False):
+    qs = ResultSnapshot.objects.filter(publication=publication, student=student)
+    if not with_pdf:
+        qs = qs.defer('pdf')
+    return await qs.afirst()
+
+
+async def apublished_results(student):
+    """{term: (publication, snapshot or None)} for the current year's published terms."""
+    publications = {p.pk: p async for p in current_publications(await acurrent_academic_year())}
+    snapshots = {
+        s.publication_id: s
+        async for s in ResultSnapshot.objects.filter(publication__in=publications, student=student).defer('html', 'pdf')
+    }
+    return {p.term: (p, snapshots.get(pk)) for pk, p in publications.items()}
+
+
+def snapshot_card(snapshot):
+    return ReportCard.from_dict(snapshot.data)
+
+
+PRERENDER_CHUNK = 200
+
+
+def _page_request(student, term):
+    """A request that renders the results page as the student would see it."""
+    request = RequestFactory().get(reverse('grades:student_grades'), {'term': term})
+    request.user = student.user
+    return request
+
+
+def prerender_snapshots(publication, forms=None, pdf=True, workers=2):
+    """Render and store the results page (and PDF) for every snapshot of a publication.
+
+    Only students with a login get a stored page, since nobody else can
+    open it.  Snapshots are rendered and saved ``PRERENDER_CHUNK`` at a time
+    so memory stays flat however many students there are.  Pages render in
+    this thread; PDFs render on ``workers`` threads since the report context
+    needs no database access.  Returns the number rendered.
+    """
+    snapshots = publication.snapshots.select_related('student', 'student__user').defer('pdf').order_by('pk')
+    if forms:
+        snapshots = snapshots.filter(form__in=forms)
+
+    fields = ['html', 'pdf', 'rendered_at'] if pdf else ['html', 'rendered_at']
+    count = 0
+    with ThreadPoolExecutor(max_workers=workers) as pool:
+        for chunk in _chunks(snapshots.iterator(chunk_size=PRERENDER_CHUNK), PRERENDER_CHUNK):
+            for snapshot in chunk:
+                if snapshot.student.user_id is None:
+                    snapshot.html = ''
+                    continue
+                snapshot.html = render_to_string(
+                    'grades/student_grades.html',
+                    results_page_context(snapshot.student, snapshot_card(snapshot)),
+                    request=_page_request(snapshot.student, publication.term),
+                )
+            if pdf:
+                contexts = [report_pdf_context(s.student, snapshot_card(s)) for s in chunk]
+                rendered = pool.map(lambda ctx: render_pdf('grades/report_pdf.html', ctx), contexts)
+                for snapshot, pdf_bytes in zip(chunk, rendered):
+                    snapshot.pdf = pdf_bytes
+
+            now = timezone.now()
+            for snapshot in chunk:
+                snapshot.rendered_at = now
+            ResultSnapshot.objects.bulk_update(chunk, fields)
+            count += len(chunk)
+    return count
+
+
+def _chunks(iterable, size):
+    iterator = iter(iterable)
+    while chunk := list(islice(iterator, size)):
+        yield chunk
@@ -0,0 +1,327 @@
+# grades/report_card.py
+"""A student's term result, computed once and shared by every output.
+
+The results page, the PDF report and the JSON API all render from the same
+immutable ``ReportCard``.  Building one costs two queries (the student's own
+grades and one flat fetch of every grade in the form for the term, from which
+all positions are ranked in Python).  Cards are memoised on the request and,
+when ``REPORT_CARD_CACHE_SECONDS`` is set, in the Django cache under a key
+that changes whenever any grade in the form/term changes.
+"""
+from dataclasses import asdict, dataclass, field
+
+from django.conf import settings
+from django.core.cache import cache
+from django.db.models import Count, Max
+from django.utils import timezone
+
+from .curriculum import asubject_order, subject_order
+from .metrics import record_cache
+from .models import SENIOR_FORMS, Grade, acurrent_academic_year, current_academic_year, senior_point_for_score
+
+TERM_DISPLAY = {'T1': 'Term 1', 'T2': 'Term 2', 'T3': 'Term 3'}
+SUBJECTS_FOR_RESULT = 6
+
+
+@dataclass(frozen=True)
+class SubjectResult:
+    subject_id: int
+    subject_name: str
+    score: float
+    short_grade: str
+    comment: str
+    grade_label: str
+    senior_point: int | None
+    is_pass: bool
+    position: int | None
+
+
+@dataclass(frozen=True)
+class ReportCard:
+    student_id: int
+    term: str
+    is_senior: bool
+    subjects: tuple
+    passed_count: int
+    total_points: int | None
+    overall_position: int | None
+    ranked_students: int
+    overall_result: str
+    missing_english: bool
+
+    @property
+    def term_display(self):
+        return TERM_DISPLAY.get(self.term, self.term)
+
+    @property
+    def total_subjects(self):
+        return len(self.subjects)
+
+    def as_dict(self):
+        data = asdict(self)
+        data['subjects'] = [asdict(s) for s in self.subjects]
+        data['term_display'] = self.term_display
+        return data
+
+    @classmethod
+    def from_dict(cls, data):
+        data = dict(data)
+        data.pop('term_display', None)
+        data['subjects'] = tuple(SubjectResult(**s) for s in data['subjects'])
+        return cls(**data)
+
+
+def _form_grades(form, term, year=None):
+    return Grade.objects.current(year).filter(student__form=form, term=term).order_by()
+
+
+def results_version(form, term):
+    """Return (last_modified, grade_count) for a form/term; changes on any edit."""
+    stats = _form_grades(form, term).aggregate(last_modified=Max('updated_at'), count=Count('id'))
+    return stats['last_modified'], stats['count']
+
+
+async def aresults_version(form, term):
+    stats = await _form_grades(form, term, await acurrent_academic_year()).aaggregate(last_modified=Max('updated_at'), count=Count('id'))
+    return stats['last_modified'], stats['count']
+
+
+@dataclass(frozen=True)
+class FormRanking:
+    """Positions for one form and term, shared by every card in the form."""
+    subject_scores: dict  # subject_id -> distinct scores, best first
+    positions: dict  # student_id -> overall position
+    ranked_students: int
+    metrics: dict = field(default_factory=dict)  # student_id -> best-six points or average
+
+    def subject_position(self, subject_id, score):
+        scores = self.subject_scores.get(subject_id, [])
+        return scores.index(score) + 1 if score in scores else None
+
+
+def rank_form(is_senior, form_rows):
+    """Rank a form from (student_id, subject_id, score) rows.
+
+    Subject positions are dense ranks over distinct scores; overall position
+    uses best-six points for seniors (lower is better) and average score for
+    juniors.  Students without enough grades are not ranked.
+    """
+    subject_scores = {}
+    student_scores = {}
+    for stu_id, subject_id, score in form_rows:
+        subject_scores.setdefault(subject_id, set()).add(float(score))
+        student_scores.setdefault(stu_id, []).append(score)
+
+    student_metrics = {}
+    for stu_id in sorted(student_scores):
+        scores = student_scores[stu_id]
+        if is_senior:
+            points = sorted(senior_point_for_score(sc) for sc in scores)
+            if len(points) >= SUBJECTS_FOR_RESULT:
+                student_metrics[stu_id] = sum(points[:SUBJECTS_FOR_RESULT])
+        else:
+            student_metrics[stu_id] = float(sum(scores)) / len(scores)
+
+    # Seniors: fewer points is better; juniors: higher average is better
+    ranked = sorted(student_metrics.items(), key=lambda x: x[1], reverse=not is_senior)
+    return FormRanking(
+        subject_scores={sid: sorted(sc, reverse=True) for sid, sc in subject_scores.items()},
+        positions={stu_id: idx for idx, (stu_id, _) in enumerate(ranked, 1)},
+        ranked_students=len(ranked),
+        metrics=student_metrics,
+    )
+
+
+def _subject_result(student, grade, ranking):
+    grade.student = student  # grade_label()/is_pass() need it; avoid a lazy fetch
+    label = grade.grade_label()
+    senior_point = grade.senior_point()
+    score = float(grade.score)
+    return SubjectResult(
+        subject_id=grade.subject_id,
+        subject_name=grade.subject.name,
+        score=score,
+        short_grade=str(senior_point) if student.is_senior else grade.letter,
+        comment=label.split('(')[-1].rstrip(')') if '(' in label else '',
+        grade_label=label,
+        senior_point=senior_point,
+        is_pass=grade.is_pass(),
+        position=ranking.subject_position(grade.subject_id, score),
+    )
+
+
+def _assemble(student, term, own_grades, ranking, order=None):
+    # Curriculum column order (as in the class ranking), then anything else by name
+    order = order or {}
+    subjects = tuple(
+        _subject_result(student, g, ranking)
+        for g in sorted(own_grades, key=lambda g: (order.get(g.subject_id, len(order)), g.subject.name.lower()))
+    )
+    passed_count = sum(1 for s in subjects if s.is_pass)
+    english = next((s for s in subjects if s.subject_name.lower() == 'english'), None)
+
+    total_points = None
+    if student.is_senior and english is not None:
+        # MSCE aggregate: English plus the best five other subjects
+        others = sorted(s.senior_point for s in subjects if s is not english)
+        total_points = english.senior_point + sum(others[:SUBJECTS_FOR_RESULT - 1])
+
+    passed = passed_count >= SUBJECTS_FOR_RESULT and english is not None and english.is_pass
+    return ReportCard(
+        student_id=student.pk,
+        term=term,
+        is_senior=student.is_senior,
+        subjects=subjects,
+        passed_count=passed_count,
+        total_points=total_points,
+        overall_position=ranking.positions.get(student.pk),
+        ranked_students=ranking.ranked_students,
+        overall_result='PASS' if passed else 'FAIL',
+        missing_english=english is None,
+    )
+
+
+def empty_report_card(student, term):
+    """A card with no grades, e.g. for a student added after results were published."""
+    return _assemble(student, term, [], FormRanking({}, {}, 0))
+
+
+def build_report_card(student, term):
+    """Compute a student's ReportCard for a term (two queries)."""
+    own_grades = list(student.grades.current().select_related('subject').filter(term=term))
+    form_rows = list(_form_grades(student.form, term).values_list('student_id', 'subject_id', 'score'))
+    return _assemble(student, term, own_grades, rank_form(student.is_senior, form_rows),
+                     subject_order(student.form))
+
+
+async def abuild_report_card(student, term):
+    year = await acurrent_academic_year()
+    own_grades = [g async for g in student.grades.current(year).select_related('subject').filter(term=term)]
+    form_rows = [
+        row async for row in _form_grades(student.form, term, year).values_list('student_id', 'subject_id', 'score')
+    ]
+    return _assemble(student, term, own_grades, rank_form(student.is_senior, form_rows),
+                     await asubject_order(student.form))
+
+
+def card_from_form_grades(student, term, form_grades, order=None):
+    """A student's card from every Grade in their form for ``term`` (no queries)."""
+    ranking = rank_form(student.is_senior, [(g.student_id, g.subject_id, g.score) for g in form_grades])
+    own = [g for g in form_grades if g.student_id == student.pk]
+    return _assemble(student, term, own, ranking, order)
+
+
+def build_form_report_cards(students, form, term):
+    """Compute cards for ``students`` (all in ``form``) from one grades query.
+
+    Returns {student pk: ReportCard}; the form is ranked once for all of them.
+    """
+    grades = list(_form_grades(form, term).select_related('subject'))
+    ranking = rank_form(form in SENIOR_FORMS,
+                        [(g.student_id, g.subject_id, g.score) for g in grades])
+    by_student = {}
+    for g in grades:
+        by_student.setdefault(g.student_id, []).append(g)
+    order = subject_order(form)
+    return {
+        student.pk: _assemble(student, term, by_student.get(student.pk, []), ranking, order)
+        for student in students
+    }
+
+
+def results_page_context(student, card):
+    """Template context for grades/student_grades.html."""
+    return {
+        'student': student,
+        'card': card,
+        'grades': card.subjects,
+        'passed_count': card.passed_count,
+        'total_points': card.total_points,
+        'overall_result': card.overall_result,
+        'term': card.term,
+        'overall_position': card.overall_position,
+        'term_display': card.term_display,
+    }
+
+
+def report_pdf_context(student, card):
+    """Template context for the grades/report_pdf.html report card."""
+    return {
+        'student': student,
+        'card': card,
+        'grades': card.subjects,
+        'passed_count': card.passed_count,
+        'total_subjects': card.total_subjects,
+        'overall_position': card.overall_position,
+        'overall_result': card.overall_result,
+        'term': card.term,
+        'term_display': card.term_display,
+        'current_date': timezone.now().strftime("%B %d, %Y"),
+    }
+
+
+def _cache_key(student, term, version, year):
+    last_modified, count = version
+    stamp = last_modified.timestamp() if last_modified else 0
+    return f"report_card:{student.pk}:{student.form}:{year}:{term}:{stamp}:{count}"
+
+
+def prime_report_cards(request, cards):
+    """Seed the request memo with precomputed cards ({student pk: card})."""
+    memo = _request_memo(request)
+    for card in cards.values():
+        memo[(card.student_id, card.term)] = card
+
+
+def _request_memo(request):
+    if request is None:
+        return {}
+    if not hasattr(request, '_report_cards'):
+        request._report_cards = {}
+    return request._report_cards
+
+
+def get_report_card(student, term, request=None, version=None):
+    """Return the student's ReportCard, reusing the request memo and cache.
+
+    ``version`` is a precomputed ``results_version()`` for the student's form
+    and term; it is only needed (and only queried) when caching is enabled.
+    """
+    memo = _request_memo(request)
+    if (student.pk, term) in memo:
+        return memo[(student.pk, term)]
+
+    timeout = getattr(settings, 'REPORT_CARD_CACHE_SECONDS', 0)
+    if timeout:
+        key = _cache_key(student, term, version or results_version(student.form, term), current_academic_year())
+        card = cache.get(key)
+        record_cache('report_card', card is not None)
+        if card is None:
+            card = build_report_card(student, term)
+            cache.set(key, card, timeout)
+    else:
+        card = build_report_card(student, term)
+
+    memo[(student.pk, term)] = card
+    return card
+
+
+async def aget_report_card(student, term, request=None, version=None):
+    memo = _request_memo(request)
+    if (student.pk, term) in memo:
+        return memo[(student.pk, term)]
+
+    timeout = getattr(settings, 'REPORT_CARD_CACHE_SECONDS', 0)
+    if timeout:
+        key = _cache_key(student, term, version or await aresults_version(student.form, term),
+                         await acurrent_academic_year())
+        card = await cache.aget(key)
+        record_cache('report_card', card is not None)
+        if card is None:
+            card = await abuild_report_card(student, term)
+            await cache.aset(key, card, timeout)
+    else:
+        card = await abuild_report_card(student, term)
+
+    memo[(student.pk, term)] = card
+    return card
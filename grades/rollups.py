@@ -0,0 +1,168 @@
+# grades/rollups.py
+"""Maintenance and queries for the GradeRollup analytics table.
+
+Each Grade contributes to exactly one (form, subject, term) cell.  Saves and
+deletes apply +1/-1 deltas to that cell with F() expressions, so the table
+stays current without ever re-scanning the grades table; dashboard queries
+then aggregate a few hundred rollup rows instead of every grade.
+"""
+import math
+from decimal import Decimal
+
+from django.db.models import Count, DecimalField, F, Q, Sum
+
+from .models import Grade, GradeRollup, stream_for_form
+from .writer import serialized_writes
+
+PASS_MARK = 40
+
+# (field, lower bound) for each score bracket, lowest first
+BRACKETS = [
+    ('n_lt40', None),
+    ('n_40', 40),
+    ('n_45', 45),
+    ('n_50', 50),
+    ('n_55', 55),
+    ('n_60', 60),
+    ('n_65', 65),
+    ('n_70', 70),
+    ('n_80', 80),
+]
+BRACKET_FIELDS = [field for field, _ in BRACKETS]
+
+# Junior letter bands as groups of brackets; senior points map 1:1 (9 = n_lt40)
+JUNIOR_BANDS = [
+    ('A', ['n_80']),
+    ('B', ['n_70']),
+    ('C', ['n_60', 'n_65']),
+    ('D', ['n_40', 'n_45', 'n_50', 'n_55']),
+    ('F', ['n_lt40']),
+]
+
+GROUP_FIELDS = {
+    'form': 'form',
+    'stream': 'stream',
+    'subject': 'subject__name',
+    'term': 'term',
+}
+
+
+def bracket_field(score):
+    """Return the rollup bracket field a score falls into."""
+    score = float(score)
+    field = BRACKETS[0][0]
+    for name, lower in BRACKETS[1:]:
+        if score >= lower:
+            field = name
+    return field
+
+
+def apply_grade_delta(form, subject_id, term, score, sign):
+    """Add (sign=1) or remove (sign=-1) one grade from its rollup cell."""
+    score = Decimal(score)
+    bracket = bracket_field(score)
+    updates = {
+        'count': F('count') + sign,
+        'score_sum': F('score_sum') + sign * score,
+        'score_sq_sum': F('score_sq_sum') + sign * score * score,
+        bracket: F(bracket) + sign,
+    }
+    if score >= PASS_MARK:
+        updates['pass_count'] = F('pass_count') + sign
+
+    cell = GradeRollup.objects.filter(form=form, subject_id=subject_id, term=term)
+    if not cell.update(**updates) and sign > 0:
+        GradeRollup.objects.get_or_create(
+            form=form, subject_id=subject_id, term=term,
+            defaults={'stream': stream_for_form(form)},
+        )
+        cell.update(**updates)
+
+
+def _rollup_aggregates():
+    aggregates = {
+        'count': Count('id'),
+        'score_sum': Sum('score'),
+        'score_sq_sum': Sum(F('score') * F('score'),
+                            output_field=DecimalField(max_digits=20, decimal_places=4)),
+        'pass_count': Count('id', filter=Q(score__gte=PASS_MARK)),
+    }
+    bounds = [lower for _, lower in BRACKETS[1:]] + [None]
+    for (field, lower), upper in zip(BRACKETS, bounds):
+        condition = Q()
+        if lower is not None:
+            condition &= Q(score__gte=lower)
+        if upper is not None:
+            condition &= Q(score__lt=upper)
+        aggregates[field] = Count('id', filter=condition)
+    return aggregates
+
+
+def rebuild_rollups(forms=None):
+    """Recompute rollup cells from current-year grades with one GROUP BY query.
+
+    Rebuilds every cell, or only those of ``forms``.  Returns the number of
+    cells written.
+    """
+    grades = Grade.objects.current().order_by()
+    cells = GradeRollup.objects.all()
+    if forms is not None:
+        grades = grades.filter(student__form__in=forms)
+        cells = cells.filter(form__in=forms)
+
+    rows = grades.values('student__form', 'subject_id', 'term').annotate(**_rollup_aggregates())
+    new_cells = []
+    for row in rows:
+        form = row.pop('student__form')
+        new_cells.append(GradeRollup(
+            form=form,
+            stream=stream_for_form(form),
+            **{k: (v or 0) for k, v in row.items()},
+        ))
+    with serialized_writes():
+        cells.delete()
+        GradeRollup.objects.bulk_create(new_cells, batch_size=500)
+    return len(new_cells)
+
+
+def rollup_summary(group_by=('form', 'term'), **filters):
+    """Aggregate rollup cells by any of form/stream/subject/term.
+
+    Returns one dict per group with count, mean, population std, pass rate
+    and the score brackets.  ``filters`` are passed to ``filter()`` on
+    GradeRollup (e.g. ``term='T1'``, ``form__in=[...]``).
+    """
+    columns = [GROUP_FIELDS[g] for g in group_by]
+    qs = (
+        GradeRollup.objects.filter(**filters)
+        .values(*columns)
+        .annotate(
+            total=Sum('count'),
+            total_score=Sum('score_sum'),
+            total_sq=Sum('score_sq_sum'),
+            passed=Sum('pass_count'),
+            **{f'sum_{field}': Sum(field) for field in BRACKET_FIELDS},
+        )
+        .order_by(*columns)
+    )
+
+    summary = []
+    for row in qs:
+        n = row['total'] or 0
+        if not n:
+            continue
+        mean = float(row['total_score']) / n
+        variance = max(float(row['total_sq']) / n - mean * mean, 0.0)
+        brackets = {field: row[f'sum_{field}'] for field in BRACKET_FIELDS}
+        entry = {g: row[GROUP_FIELDS[g]] for g in group_by}
+        entry.update({
+            'count': n,
+            'mean': round(mean, 2),
+            'std': round(math.sqrt(variance), 2),
+            'passed': row['passed'],
+            'pass_rate': round(100.0 * row['passed'] / n, 1),
+            'junior_bands': {label: sum(brackets[f] for f in fields) for label, fields in JUNIOR_BANDS},
+            'senior_points': {str(9 - i): brackets[field] for i, field in enumerate(BRACKET_FIELDS)},
+        })
+        summary.append(entry)
+    return summary
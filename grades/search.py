@@ -0,0 +1,222 @@
+# grades/search.py
+"""Indexed student search for the autocomplete endpoint and the admin.
+
+Queries match student IDs and first/last names by prefix, and names
+fuzzily (typos), without scanning the students table:
+
+* PostgreSQL: pg_trgm GIN indexes on ``lower(first_name)``,
+  ``lower(last_name)`` and ``lower(student_id)`` serve both the prefix
+  ``LIKE`` and the ``%`` similarity operator.
+* SQLite: an external-content FTS5 table, ``grades_student_fts``, kept in
+  sync by triggers, answers prefix queries; fuzzy matches re-rank the
+  candidates sharing each term's first letter, and a name length that
+  could reach ``FUZZY_RATIO``, with difflib.
+* Anything else falls back to ``istartswith`` lookups.
+"""
+import difflib
+import math
+import re
+
+from django.db import connection
+from django.db.models import Q
+
+from .models import Student
+
+MAX_RESULTS = 20
+# difflib ratio a name must reach to count as a fuzzy match on SQLite (on
+# Postgres the ``%`` operator uses pg_trgm's similarity_threshold, 0.3)
+FUZZY_RATIO = 0.75
+FUZZY_CANDIDATES = 500
+
+SQLITE_FTS_TABLE = 'grades_student_fts'
+SQLITE_FTS_SQL = [
+    f"""CREATE VIRTUAL TABLE IF NOT EXISTS {SQLITE_FTS_TABLE} USING fts5(
+        student_id, first_name, last_name,
+        content='grades_student', content_rowid='id',
+        tokenize='unicode61 remove_diacritics 2', prefix='1 2 3'
+    )""",
+    f"""CREATE TRIGGER IF NOT EXISTS grades_student_fts_insert AFTER INSERT ON grades_student BEGIN
+        INSERT INTO {SQLITE_FTS_TABLE}(rowid, student_id, first_name, last_name)
+        VALUES (new.id, new.student_id, new.first_name, new.last_name);
+    END""",
+    f"""CREATE TRIGGER IF NOT EXISTS grades_student_fts_delete AFTER DELETE ON grades_student BEGIN
+        INSERT INTO {SQLITE_FTS_TABLE}({SQLITE_FTS_TABLE}, rowid, student_id, first_name, last_name)
+        VALUES ('delete', old.id, old.student_id, old.first_name, old.last_name);
+    END""",
+    f"""CREATE TRIGGER IF NOT EXISTS grades_student_fts_update AFTER UPDATE ON grades_student BEGIN
+        INSERT INTO {SQLITE_FTS_TABLE}({SQLITE_FTS_TABLE}, rowid, student_id, first_name, last_name)
+        VALUES ('delete', old.id, old.student_id, old.first_name, old.last_name);
+        INSERT INTO {SQLITE_FTS_TABLE}(rowid, student_id, first_name, last_name)
+        VALUES (new.id, new.student_id, new.first_name, new.last_name);
+    END""",
+    f"INSERT INTO {SQLITE_FTS_TABLE}({SQLITE_FTS_TABLE}) VALUES ('rebuild')",
+]
+POSTGRES_INDEX_SQL = [
+    "CREATE EXTENSION IF NOT EXISTS pg_trgm",
+    "CREATE INDEX IF NOT EXISTS student_first_name_trgm ON grades_student USING gin (lower(first_name) gin_trgm_ops)",
+    "CREATE INDEX IF NOT EXISTS student_last_name_trgm ON grades_student USING gin (lower(last_name) gin_trgm_ops)",
+    "CREATE INDEX IF NOT EXISTS student_student_id_trgm ON grades_student USING gin (lower(student_id) gin_trgm_ops)",
+]
+
+
+def sqlite_has_fts5(conn):
+    with conn.cursor() as cursor:
+        cursor.execute("PRAGMA compile_options")
+        return any('FTS5' in row[0] for row in cursor.fetchall())
+
+
+def create_search_index(conn):
+    """Create the backend's search indexes (idempotent).
+
+    On SQLite this also restores the sync triggers, which are dropped
+    whenever a migration rebuilds grades_student; it runs after every migrate.
+    """
+    if conn.vendor == 'postgresql':
+        statements = POSTGRES_INDEX_SQL
+    elif conn.vendor == 'sqlite' and sqlite_has_fts5(conn):
+        statements = SQLITE_FTS_SQL
+    else:
+        return
+    with conn.cursor() as cursor:
+        for sql in statements:
+            cursor.execute(sql)
+
+
+def _terms(query):
+    return [t for t in re.split(r'[\s,]+', query.lower().strip()) if t][:4]
+
+
+def _like_escape(term):
+    return term.replace('\\', '\\\\').replace('%', '\\%').replace('_', '\\_')
+
+
+def _search_postgres(terms, limit, forms):
+    params = []
+    where = []
+    rank = []
+    for term in terms:
+        prefix = _like_escape(term) + '%'
+        where.append(
+            "(lower(student_id) LIKE %s OR lower(first_name) LIKE %s OR lower(last_name) LIKE %s"
+            " OR lower(first_name) %% %s OR lower(last_name) %% %s)"
+        )
+        params += [prefix, prefix, prefix, term, term]
+    for term in terms:
+        prefix = _like_escape(term) + '%'
+        rank.append(
+            "(CASE WHEN lower(student_id) = %s THEN 3"
+            " WHEN lower(student_id) LIKE %s OR lower(first_name) LIKE %s OR lower(last_name) LIKE %s THEN 2"
+            " ELSE greatest(similarity(lower(first_name), %s), similarity(lower(last_name), %s)) END)"
+        )
+        params += [term, prefix, prefix, prefix, term, term]
+    if forms is not None:
+        where.append("form = ANY(%s)")
+        params.append(list(forms))
+    sql = (
+        f"SELECT id FROM grades_student WHERE {' AND '.join(where)} "
+        f"ORDER BY {' + '.join(rank)} DESC, last_name, first_name LIMIT %s"
+    )
+    with connection.cursor() as cursor:
+        cursor.execute(sql, params + [limit])
+        return [row[0] for row in cursor.fetchall()]
+
+
+def _fts_query(terms, chars=None):
+    """FTS5 MATCH expression: every term as a (quoted) prefix."""
+    return ' '.join('"{}"*'.format((t[:chars] if chars else t).replace('"', '""')) for t in terms)
+
+
+def _length_bounds(term):
+    """Shortest and longest word that can reach FUZZY_RATIO against ``term``.
+
+    difflib's ratio is 2*matches / (len(a) + len(b)), and matches cannot
+    exceed the shorter length, so longer or shorter words can never pass.
+    """
+    n = len(term)
+    return (math.ceil(n * FUZZY_RATIO / (2 - FUZZY_RATIO) - 1e-9),
+            math.floor(n * (2 - FUZZY_RATIO) / FUZZY_RATIO + 1e-9))
+
+
+def _search_sqlite(terms, limit, forms):
+    form_sql = ''
+    form_params = []
+    if forms is not None:
+        form_sql = f" AND s.form IN ({', '.join(['%s'] * len(forms))})"
+        form_params = list(forms)
+    base = (
+        f"SELECT s.id, s.first_name, s.last_name FROM {SQLITE_FTS_TABLE} f "
+        f"JOIN grades_student s ON s.id = f.rowid WHERE {SQLITE_FTS_TABLE} MATCH %s{form_sql} "
+    )
+    with connection.cursor() as cursor:
+        cursor.execute(base + "ORDER BY (lower(s.student_id) = %s) DESC, f.rank LIMIT %s",
+                       [_fts_query(terms)] + form_params + [' '.join(terms), limit])
+        ids = [row[0] for row in cursor.fetchall()]
+        if len(ids) >= limit:
+            return ids
+
+        # Fuzzy: candidates sharing each term's first letter with a name of a
+        # length that can match, closest lengths first, ranked by similarity
+        length_sql, length_params, distance_sql, distance_params = [], [], [], []
+        for term in terms:
+            length_sql.append("(length(s.first_name) BETWEEN %s AND %s OR length(s.last_name) BETWEEN %s AND %s)")
+            length_params += [*_length_bounds(term), *_length_bounds(term)]
+            distance_sql.append("min(abs(length(s.first_name) - %s), abs(length(s.last_name) - %s))")
+            distance_params += [len(term), len(term)]
+        cursor.execute(
+            base + f"AND {' AND '.join(length_sql)} "
+            f"ORDER BY {' + '.join(distance_sql)}, s.last_name, s.first_name, s.id LIMIT %s",
+            [_fts_query(terms, chars=1)] + form_params + length_params + distance_params + [FUZZY_CANDIDATES],
+        )
+        scored = []
+        for pk, first_name, last_name in cursor.fetchall():
+            if pk in ids:
+                continue
+            words = [first_name.lower(), last_name.lower()]  # IDs only match exactly/by prefix
+            ratios = [max(difflib.SequenceMatcher(None, t, w).ratio() for w in words) for t in terms]
+            if min(ratios) >= FUZZY_RATIO:
+                scored.append((-sum(ratios), last_name, first_name, pk))
+        return ids + [pk for *_, pk in sorted(scored)][:limit - len(ids)]
+
+
+def _search_fallback(terms, limit, forms):
+    qs = Student.objects.all()
+    for term in terms:
+        qs = qs.filter(Q(student_id__istartswith=term) | Q(first_name__istartswith=term)
+                       | Q(last_name__istartswith=term))
+    if forms is not None:
+        qs = qs.filter(form__in=forms)
+    return list(qs.order_by('last_name', 'first_name').values_list('id', flat=True)[:limit])
+
+
+_sqlite_fts = None
+
+
+def _sqlite_fts_ready():
+    global _sqlite_fts
+    if _sqlite_fts is None:
+        with connection.cursor() as cursor:
+            cursor.execute("SELECT 1 FROM sqlite_master WHERE name = %s", [SQLITE_FTS_TABLE])
+            _sqlite_fts = cursor.fetchone() is not None
+    return _sqlite_fts
+
+
+def search_student_ids(query, limit=MAX_RESULTS, forms=None):
+    """Return ids of students matching ``query``, best matches first.
+
+    ``forms`` optionally restricts results to those forms (e.g. a teacher's).
+    """
+    terms = _terms(query)
+    if not terms or (forms is not None and not forms):
+        return []
+    if connection.vendor == 'postgresql':
+        return _search_postgres(terms, limit, forms)
+    if connection.vendor == 'sqlite' and _sqlite_fts_ready():
+        return _search_sqlite(terms, limit, forms)
+    return _search_fallback(terms, limit, forms)
+
+
+def search_students(query, limit=MAX_RESULTS, forms=None):
+    """Students matching ``query``, in ranking order."""
+    ids = search_student_ids(query, limit, forms)
+    students = Student.objects.in_bulk(ids)
+    return [students[pk] for pk in ids if pk in students]
@@ -1,7 +1,13 @@
-from django.db.models.signals import post_save
+from django.db.backends.signals import connection_created
+from django.db import connections
+from django.db.models.signals import post_migrate, post_save, pre_save, post_delete
 from django.dispatch import receiver
 from django.conf import settings
-from .models import UserProfile
+from .models import UserProfile, Grade, Student, Subject, current_academic_year
+from .curriculum import invalidate as invalidate_curriculum
+from .metrics import instrument_connection
+from .rollups import apply_grade_delta
+from .search import create_search_index
 
 @receiver(post_save, sender=settings.AUTH_USER_MODEL)
 def create_user_profile(sender, instance, created, **kwargs):
@@ -15,4 +21,81 @@ def save_user_profile(sender, instance, **kwargs):
     try:
         instance.profile.save()
     except UserProfile.DoesNotExist:
-        UserProfile.objects.create(user=instance)
\ No newline at end of file
+        UserProfile.objects.create(user=instance)
+
+
+# Grade rollups: keep GradeRollup cells current with +1/-1 deltas.
+
+@receiver(pre_save, sender=Grade)
+def remember_rollup_cell(sender, instance, raw=False, **kwargs):
+    """Record which rollup cell an existing grade counted towards before it changes."""
+    instance._rollup_old = None
+    if raw or instance.pk is None:
+        return
+    # Only current-year grades count towards rollups
+    instance._rollup_old = (
+        Grade.objects.current().filter(pk=instance.pk)
+        .values_list('student__form', 'subject_id', 'term', 'score')
+        .first()
+    )
+
+@receiver(post_save, sender=Grade)
+def update_rollup_on_save(sender, instance, raw=False, **kwargs):
+    if raw:
+        return
+    new = None
+    if instance.academic_year == current_academic_year():
+        new = (instance.student.form, instance.subject_id, instance.term, instance.score)
+    old = getattr(instance, '_rollup_old', None)
+    if old is not None and new is not None and tuple(old[:3]) == new[:3] and float(old[3]) == float(new[3]):
+        return
+    if old is not None:
+        apply_grade_delta(*old, sign=-1)
+    if new is not None:
+        apply_grade_delta(*new, sign=1)
+
+@receiver(post_delete, sender=Grade)
+def update_rollup_on_delete(sender, instance, **kwargs):
+    if instance.academic_year != current_academic_year():
+        return
+    form = Student.objects.filter(pk=instance.student_id).values_list('form', flat=True).first()
+    if form is not None:
+        apply_grade_delta(form, instance.subject_id, instance.term, instance.score, sign=-1)
+
+@receiver(pre_save, sender=Student)
+def remember_student_form(sender, instance, raw=False, **kwargs):
+    instance._rollup_old_form = None
+    if not raw and instance.pk is not None:
+        instance._rollup_old_form = (
+            Student.objects.filter(pk=instance.pk).values_list('form', flat=True).first()
+        )
+
+@receiver(post_save, sender=Student)
+def update_rollup_on_form_change(sender, instance, raw=False, **kwargs):
+    """A student changing form moves all of their grades to other cells."""
+    old_form = getattr(instance, '_rollup_old_form', None)
+    if raw or old_form is None or old_form == instance.form:
+        return
+    for subject_id, term, score in instance.grades.current().values_list('subject_id', 'term', 'score'):
+        apply_grade_delta(old_form, subject_id, term, score, sign=-1)
+        apply_grade_delta(instance.form, subject_id, term, score, sign=1)
+
+
+@receiver(post_save, sender=Subject)
+@receiver(post_delete, sender=Subject)
+def clear_curriculum(sender, **kwargs):
+    """Subject stream/form level drive the curriculum map; rebuild it on change."""
+    invalidate_curriculum()
+
+
+@receiver(connection_created)
+def time_sql_queries(sender, connection, **kwargs):
+    """Count and time every query for the request metrics."""
+    instrument_connection(connection)
+
+
+@receiver(post_migrate)
+def restore_search_index(sender, using='default', **kwargs):
+    """Re-create search triggers dropped when SQLite rebuilt grades_student."""
+    if sender.name == 'grades' and connections[using].vendor == 'sqlite':
+        create_search_index(connections[using])
\ No newline at end of file
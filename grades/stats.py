@@ -0,0 +1,115 @@
+# grades/stats.py
+"""Per-subject score distributions for a form and term.
+
+Scores are fetched once as flat arrays and every statistic is computed with
+NumPy over all subjects together (grouped by sorting on subject), so the cost
+is one query plus a handful of array operations regardless of class size.
+"""
+import numpy as np
+from django.db.models import FloatField
+from django.db.models.functions import Cast
+
+from .curriculum import subjects_for_form
+from .models import SENIOR_FORMS, Grade, Subject
+
+PASS_MARK = 40
+PERCENTILES = (10, 25, 75, 90)
+
+# (labels, lower score bound of every band after the first), worst band first
+JUNIOR_BANDS = (['F', 'D', 'C', 'B', 'A'], [40, 60, 70, 80])
+SENIOR_BANDS = (['9', '8', '7', '6', '5', '4', '3', '2', '1'], [40, 45, 50, 55, 60, 65, 70, 80])
+
+
+def form_score_arrays(form, term):
+    """Return (subject_ids, scores) arrays for every grade in a form/term."""
+    rows = (
+        Grade.objects.current().filter(student__form=form, term=term)
+        .order_by()
+        .annotate(score_f=Cast('score', FloatField()))
+        .values_list('subject_id', 'score_f')
+    )
+    rows = list(rows)
+    subject_ids = np.fromiter((r[0] for r in rows), dtype=np.int64, count=len(rows))
+    scores = np.fromiter((r[1] for r in rows), dtype=np.float64, count=len(rows))
+    return subject_ids, scores
+
+
+def _group_percentiles(sorted_scores, starts, counts, q):
+    """Linear-interpolated percentile ``q`` of each contiguous sorted group."""
+    pos = starts + (counts - 1) * (q / 100.0)
+    lo = np.floor(pos).astype(np.int64)
+    hi = np.minimum(lo + 1, starts + counts - 1)
+    frac = pos - lo
+    return sorted_scores[lo] + (sorted_scores[hi] - sorted_scores[lo]) * frac
+
+
+def compute_subject_stats(subject_ids, scores, is_senior=False):
+    """Compute per-subject statistics from flat arrays.
+
+    Returns a dict keyed by subject id.  Standard deviation is the population
+    value (the whole class, not a sample).
+    """
+    if scores.size == 0:
+        return {}
+
+    # Sort by subject, then score, so each subject is a contiguous sorted run
+    order = np.lexsort((scores, subject_ids))
+    subject_ids = subject_ids[order]
+    scores = scores[order]
+    uniq, starts, counts = np.unique(subject_ids, return_index=True, return_counts=True)
+
+    sums = np.add.reduceat(scores, starts)
+    means = sums / counts
+    sq_means = np.add.reduceat(scores * scores, starts) / counts
+    stds = np.sqrt(np.maximum(sq_means - means * means, 0.0))
+    mins = scores[starts]
+    maxs = scores[starts + counts - 1]
+    medians = _group_percentiles(scores, starts, counts, 50)
+    pcts = {q: _group_percentiles(scores, starts, counts, q) for q in PERCENTILES}
+    passed = np.add.reduceat((scores >= PASS_MARK).astype(np.int64), starts)
+
+    labels, edges = SENIOR_BANDS if is_senior else JUNIOR_BANDS
+    nbands = len(labels)
+    band = np.searchsorted(np.asarray(edges, dtype=np.float64), scores, side='right')
+    group = np.repeat(np.arange(uniq.size), counts)
+    histogram = np.bincount(group * nbands + band, minlength=uniq.size * nbands).reshape(uniq.size, nbands)
+
+    result = {}
+    for i, subject_id in enumerate(uniq.tolist()):
+        n = int(counts[i])
+        result[subject_id] = {
+            'count': n,
+            'mean': round(float(means[i]), 2),
+            'median': round(float(medians[i]), 2),
+            'std': round(float(stds[i]), 2),
+            'min': float(mins[i]),
+            'max': float(maxs[i]),
+            'percentiles': {f'p{q}': round(float(pcts[q][i]), 2) for q in PERCENTILES},
+            'passed': int(passed[i]),
+            'pass_rate': round(100.0 * int(passed[i]) / n, 1),
+            # Best band first, as shown on report cards
+            'bands': [
+                {'band': labels[b], 'count': int(histogram[i, b])}
+                for b in reversed(range(nbands))
+            ],
+        }
+    return result
+
+
+def subject_statistics(form, term):
+    """Return per-subject statistics for a form and term, in curriculum order."""
+    is_senior = form in SENIOR_FORMS
+    subject_ids, scores = form_score_arrays(form, term)
+    stats = compute_subject_stats(subject_ids, scores, is_senior=is_senior)
+    if not stats:
+        return []
+
+    # Curriculum order; only grades in subjects outside it cost a query
+    subjects = [(s.pk, s.name) for s in subjects_for_form(form) if s.pk in stats]
+    extra = stats.keys() - {pk for pk, _ in subjects}
+    if extra:
+        subjects += Subject.objects.filter(id__in=extra).order_by('name').values_list('id', 'name')
+    return [
+        {'subject_id': subject_id, 'subject': name, **stats[subject_id]}
+        for subject_id, name in subjects
+    ]
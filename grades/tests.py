@@ -1,3 +1,5 @@
+import io
+
 from django.test import TestCase
 from django.urls import reverse
 from .models import Student, Subject, Grade
@@ -10,7 +12,7 @@ class GradesSmokeTests(TestCase):
         Grade.objects.create(student=s, subject=sub, score=95)
 
     def test_index_loads(self):
-        resp = self.client.get(reverse('grades:index'))
+        resp = self.client.get(reverse('grades:home'))
         self.assertEqual(resp.status_code, 200)
 
     def test_student_detail(self):
@@ -24,3 +26,1091 @@ class GradesSmokeTests(TestCase):
         data = resp.json()
         self.assertIn('grades', data)
         self.assertGreaterEqual(len(data['grades']), 1)
+
+
+class StudentPortalTests(TestCase):
+    def setUp(self):
+        from django.contrib.auth import get_user_model
+        User = get_user_model()
+        self.math = Subject.objects.create(name='Mathematics')
+        self.english = Subject.objects.create(name='English')
+        self.user = User.objects.create_user(username='stu_A001', password='pw')
+        self.student = Student.objects.create(first_name='Ann', last_name='A', student_id='A001',
+                                              form='F1', user=self.user)
+        other = Student.objects.create(first_name='Ben', last_name='B', student_id='B001', form='F1')
+        Grade.objects.create(student=self.student, subject=self.math, score=70, term='T1')
+        Grade.objects.create(student=self.student, subject=self.english, score=65, term='T1')
+        Grade.objects.create(student=other, subject=self.math, score=90, term='T1')
+        Grade.objects.create(student=other, subject=self.english, score=60, term='T1')
+        self.client.force_login(self.user)
+
+    def test_student_grades_positions(self):
+        resp = self.client.get(reverse('grades:student_grades'), {'term': 'T1'})
+        self.assertEqual(resp.status_code, 200)
+        positions = {g.subject_name: g.position for g in resp.context['grades']}
+        self.assertEqual(positions, {'Mathematics': 2, 'English': 1})
+        # Averages: Ben 75.0, Ann 67.5
+        self.assertEqual(resp.context['overall_position'], 2)
+
+    def test_report_card_shared_across_outputs(self):
+        from .report_card import get_report_card
+        from .report_card import report_pdf_context
+        resp = self.client.get(reverse('grades:api_report_card'), {'term': 'T1'})
+        self.assertEqual(resp.status_code, 200)
+        card = resp.json()['report_card']
+        self.assertEqual(card['overall_position'], 2)
+        self.assertEqual(card['overall_result'], 'FAIL')  # fewer than six subjects
+        self.assertEqual([s['subject_name'] for s in card['subjects']], ['English', 'Mathematics'])
+
+        # The PDF context renders from the same card, memoised per request
+        request = type('Request', (), {})()
+        with self.assertNumQueries(2):
+            first = get_report_card(self.student, 'T1', request)
+        with self.assertNumQueries(0):
+            context = report_pdf_context(self.student, get_report_card(self.student, 'T1', request))
+        self.assertIs(context['card'], first)
+        self.assertEqual(first.as_dict()['subjects'], card['subjects'])
+
+    def test_report_card_cache_follows_grade_changes(self):
+        from django.core.cache import cache
+        from django.test import override_settings
+        from .report_card import get_report_card
+        cache.clear()
+        with override_settings(REPORT_CARD_CACHE_SECONDS=60):
+            get_report_card(self.student, 'T1')
+            with self.assertNumQueries(1):  # version check only
+                get_report_card(self.student, 'T1')
+            Grade.objects.filter(student=self.student, subject=self.math).first().delete()
+            card = get_report_card(self.student, 'T1')
+        self.assertEqual([s.subject_name for s in card.subjects], ['English'])
+
+    def test_transcript_covers_all_terms(self):
+        from .curriculum import subjects_for_form
+        from .publishing import publish_term
+        from asgiref.sync import async_to_sync
+        from django.core.cache import cache
+        from .transcript import aget_transcript, atranscript_state
+        cache.clear()
+        Grade.objects.create(student=self.student, subject=self.math, score=80, term='T2')
+        Grade.objects.create(student=self.student, subject=self.english, score=55, term='T2')
+        Grade.objects.create(student=Student.objects.get(student_id='B001'), subject=self.math,
+                             score=60, term='T2')
+        subjects_for_form('F1')
+        form, published, version = async_to_sync(atranscript_state)(self.student)
+        with self.assertNumQueries(1):
+            transcript = async_to_sync(aget_transcript)(self.student, published, version)
+        with self.assertNumQueries(0):  # cached by default, under the version
+            self.assertEqual(async_to_sync(aget_transcript)(self.student, published, version), transcript)
+        self.assertEqual([c.overall_position for c in transcript.cards], [2, 1, None])
+        maths = next(r for r in transcript.rows if r.subject_name == 'Mathematics')
+        self.assertEqual(([r and r.position for r in maths.results], maths.trend), ([2, 1, None], 'up'))
+
+        url = reverse('grades:student_transcript')
+        resp = self.client.get(url)
+        self.assertContains(resp, 'Mathematics')
+        self.assertEqual(resp.context['averages'], (67.5, 67.5, None))
+        self.assertEqual(self.client.get(url, HTTP_IF_NONE_MATCH=resp['ETag']).status_code, 304)
+
+        # Publishing a term changes the version and freezes that column
+        publish_term('T1')
+        Grade.objects.filter(student=self.student, subject=self.math, term='T1').update(score=20)
+        resp = self.client.get(url, HTTP_IF_NONE_MATCH=resp['ETag'])
+        self.assertEqual(resp.status_code, 200)
+        self.assertEqual(resp.context['cards'][0].overall_position, 2)
+        self.assertEqual(resp.context['rows'][1].results[0].score, 70.0)
+
+    def test_published_term_serves_frozen_snapshot(self):
+        from django.core.management import call_command
+        from .publishing import publish_term
+        url = reverse('grades:student_grades')
+        publish_term('T1')
+
+        # Later grade edits do not leak into published results
+        Grade.objects.filter(student=self.student, subject=self.math).update(score=99)
+        resp = self.client.get(url, {'term': 'T1'})
+        scores = {g.subject_name: g.score for g in resp.context['grades']}
+        self.assertEqual(scores['Mathematics'], 70.0)
+
+        # Pre-rendered pages are served straight from the snapshot row
+        call_command('warm_results', 'T1', '--no-pdf', stdout=io.StringIO())
+        with self.assertNumQueries(5):  # session, user, student, publication, snapshot
+            resp = self.client.get(url, {'term': 'T1'})
+        self.assertContains(resp, 'Mathematics')
+        etag = resp['ETag']
+        self.assertEqual(self.client.get(url, {'term': 'T1'}, HTTP_IF_NONE_MATCH=etag).status_code, 304)
+
+        # Students without a login get no stored page
+        from .models import ResultSnapshot
+        stored = dict(ResultSnapshot.objects.values_list('student__student_id', 'html'))
+        self.assertTrue(stored['A001'])
+        self.assertEqual(stored['B001'], '')
+
+        call_command('publish_term', 'T1', '--unpublish', stdout=io.StringIO())
+        resp = self.client.get(url, {'term': 'T1'})
+        scores = {g.subject_name: g.score for g in resp.context['grades']}
+        self.assertEqual(scores['Mathematics'], 99.0)
+
+    def test_publish_rechecks_students_changed_after_the_read(self):
+        from contextlib import contextmanager
+        from unittest import mock
+        from .models import ResultSnapshot
+        from .publishing import publish_term
+
+        @contextmanager
+        def read_then_edit():
+            yield
+            # Lands between the read snapshot and the write lock
+            Student.objects.filter(student_id='B001').delete()
+            Student.objects.create(first_name='Cy', last_name='C', student_id='C001', form='F1')
+
+        with mock.patch('grades.publishing.consistent_reads', read_then_edit):
+            publication = publish_term('T1')
+        self.assertEqual(
+            sorted(ResultSnapshot.objects.filter(publication=publication).values_list('student__student_id', flat=True)),
+            ['A001', 'C001'],
+        )
+
+    def test_publish_view_starts_command_in_background(self):
+        from unittest import mock
+        from django.contrib.auth import get_user_model
+        from django.core.management import call_command
+        from .models import TermPublication
+        admin = get_user_model().objects.create_superuser(username='head', password='pw')
+        admin.profile.role = 'admin'
+        admin.profile.save()
+        self.client.force_login(admin)
+
+        with mock.patch('grades.publishing.subprocess.Popen') as popen:
+            resp = self.client.post(reverse('grades:publish_term'), {'term': 'T1', 'action': 'publish'})
+        self.assertEqual(resp.status_code, 202)
+        self.assertEqual((resp.json()['status'], resp.json()['published_at']), ('started', None))
+        self.assertFalse(TermPublication.objects.exists())  # nothing published in the request
+        args = popen.call_args.args[0]
+        self.assertEqual(args[2:], ['publish_term', 'T1', '--user', str(admin.pk)])
+
+        # What the background process runs
+        call_command(*args[2:], stdout=io.StringIO())
+        self.assertEqual(TermPublication.objects.get().published_by, admin)
+
+    def test_dashboard_and_profile(self):
+        self.assertEqual(self.client.get(reverse('grades:dashboard')).status_code, 200)
+        self.assertEqual(self.client.get(reverse('grades:student_profile')).status_code, 200)
+
+    def test_anonymous_redirected(self):
+        self.client.logout()
+        resp = self.client.get(reverse('grades:student_grades'))
+        self.assertEqual(resp.status_code, 302)
+
+    def test_student_grades_conditional_get(self):
+        url = reverse('grades:student_grades')
+        resp = self.client.get(url, {'term': 'T1'})
+        etag = resp['ETag']
+        self.assertIn('private', resp['Cache-Control'])
+        # A delete leaves Max(updated_at) alone, so only the ETag validates
+        self.assertNotIn('Last-Modified', resp)
+
+        # Unchanged results: 304 from the validator query alone
+        with self.assertNumQueries(5):  # session, user, student, publication, validator aggregate
+            resp = self.client.get(url, {'term': 'T1'}, HTTP_IF_NONE_MATCH=etag)
+        self.assertEqual(resp.status_code, 304)
+
+        # Any grade change in the form invalidates the page
+        grade = Grade.objects.exclude(student=self.student).first()
+        grade.score = 10
+        grade.save()
+        resp = self.client.get(url, {'term': 'T1'}, HTTP_IF_NONE_MATCH=etag)
+        self.assertEqual(resp.status_code, 200)
+        self.assertNotEqual(resp['ETag'], etag)
+
+
+class StartupTests(TestCase):
+    def test_warm_up_loads_templates(self):
+        from .warmup import warm_up
+        timings = warm_up(render=False)
+        self.assertIn('templates', timings)
+        self.assertNotIn('weasyprint_render', timings)
+
+    def test_parse_importtime(self):
+        from .management.commands.profile_startup import parse_importtime
+        rows = parse_importtime(
+            "import time: self [us] | cumulative | imported package\n"
+            "import time:       120 |        450 |   django.db\n"
+        )
+        self.assertEqual(rows, [('django.db', 120, 450)])
+
+
+class SubjectStatsTests(TestCase):
+    def test_matches_per_subject_numpy(self):
+        import numpy as np
+        from .stats import compute_subject_stats
+        rng = np.random.default_rng(0)
+        subject_ids = rng.integers(1, 5, size=200)
+        scores = rng.uniform(0, 100, size=200).round(2)
+        stats = compute_subject_stats(subject_ids, scores)
+        for sid, st in stats.items():
+            group = scores[subject_ids == sid]
+            self.assertEqual(st['count'], group.size)
+            self.assertAlmostEqual(st['mean'], round(group.mean(), 2))
+            self.assertAlmostEqual(st['median'], round(float(np.median(group)), 2))
+            self.assertAlmostEqual(st['std'], round(group.std(), 2))
+            self.assertAlmostEqual(st['percentiles']['p90'], round(float(np.percentile(group, 90)), 2))
+            self.assertEqual(st['passed'], int((group >= 40).sum()))
+            self.assertEqual(sum(b['count'] for b in st['bands']), group.size)
+
+    def test_endpoint(self):
+        from django.contrib.auth import get_user_model
+        admin_user = get_user_model().objects.create_user(username='head', password='pw')
+        admin_user.profile.role = 'admin'
+        admin_user.profile.save()
+        math = Subject.objects.create(name='Mathematics')
+        for i, score in enumerate([35, 55, 75, 85]):
+            s = Student.objects.create(first_name=f'S{i}', last_name='X', student_id=f'X{i}', form='F1')
+            Grade.objects.create(student=s, subject=math, score=score, term='T1')
+        self.client.force_login(admin_user)
+        resp = self.client.get(reverse('grades:subject_stats'), {'form': 'F1', 'term': 'T1'})
+        self.assertEqual(resp.status_code, 200)
+        [row] = resp.json()['subjects']
+        self.assertEqual(row['subject'], 'Mathematics')
+        self.assertEqual(row['mean'], 62.5)
+        self.assertEqual(row['pass_rate'], 75.0)
+        self.assertEqual({b['band']: b['count'] for b in row['bands']},
+                         {'A': 1, 'B': 1, 'C': 0, 'D': 1, 'F': 1})
+        resp = self.client.get(reverse('grades:class_ranking'), {'form': 'F1', 'term': 'T1'})
+        self.assertEqual(resp.status_code, 200)
+        self.assertEqual(len(resp.context['subject_stats']), 1)
+
+
+class GradeRollupTests(TestCase):
+    def _cells(self):
+        from .models import GradeRollup
+        fields = ['form', 'subject_id', 'term', 'count', 'pass_count', 'n_lt40', 'n_40', 'n_80']
+        rows = GradeRollup.objects.filter(count__gt=0).order_by('form', 'subject_id', 'term')
+        return [(*[getattr(r, f) for f in fields], float(r.score_sum), float(r.score_sq_sum)) for r in rows]
+
+    def test_incremental_matches_rebuild(self):
+        from .rollups import rebuild_rollups
+        math = Subject.objects.create(name='Mathematics')
+        english = Subject.objects.create(name='English')
+        a = Student.objects.create(first_name='A', last_name='A', student_id='R1', form='F1')
+        b = Student.objects.create(first_name='B', last_name='B', student_id='R2', form='F3S')
+        g1 = Grade.objects.create(student=a, subject=math, score=35, term='T1')
+        Grade.objects.create(student=a, subject=english, score=82, term='T1')
+        g3 = Grade.objects.create(student=b, subject=math, score=44.5, term='T1')
+        g1.score = 91
+        g1.save()
+        g3.term = 'T2'
+        g3.save()
+        Grade.objects.create(student=b, subject=english, score=50, term='T2').delete()
+        a.form = 'F2'
+        a.save()
+
+        incremental = self._cells()
+        rebuild_rollups()
+        self.assertEqual(incremental, self._cells())
+
+    def test_dashboard_and_analytics(self):
+        from django.contrib.auth import get_user_model
+        user = get_user_model().objects.create_user(username='head', password='pw')
+        user.profile.role = 'admin'
+        user.profile.save()
+        math = Subject.objects.create(name='Mathematics')
+        s = Student.objects.create(first_name='A', last_name='A', student_id='R1', form='F1')
+        Grade.objects.create(student=s, subject=math, score=30, term='T1')
+        Grade.objects.create(student=s, subject=math, score=70, term='T1')
+        self.client.force_login(user)
+
+        resp = self.client.get(reverse('grades:admin_dashboard'))
+        self.assertEqual(resp.status_code, 200)
+        [row] = resp.context['performance_by_form']
+        self.assertEqual(row['terms'][0]['mean'], 50.0)
+
+        resp = self.client.get(reverse('grades:analytics'), {'group_by': 'subject', 'term': 'T1'})
+        [group] = resp.json()['groups']
+        self.assertEqual((group['subject'], group['count'], group['pass_rate'], group['std']),
+                         ('Mathematics', 2, 50.0, 20.0))
+        self.assertEqual(group['junior_bands']['B'], 1)
+        self.assertEqual(self.client.get(reverse('grades:analytics'), {'group_by': 'bogus'}).status_code, 400)
+
+
+class PdfThrottleTests(TestCase):
+    def test_slots_queue_and_busy_response(self):
+        import tempfile
+        from unittest import mock
+        from .throttle import RenderBusy, RenderSlots
+
+        with tempfile.TemporaryDirectory() as lock_dir:
+            limiter = RenderSlots('test', slots=1, queue_size=1, timeout=0.1, lock_dir=lock_dir)
+            with limiter.acquire():
+                # One request may queue; it times out while the slot is held
+                with self.assertRaises(RenderBusy):
+                    with limiter.acquire():
+                        pass
+                # With the queue place taken too, the next is refused at once
+                place = limiter._enter_queue()
+                with self.assertRaises(RenderBusy):
+                    with limiter.acquire():
+                        pass
+                limiter._leave_queue(place)
+            with limiter.acquire():
+                pass  # released
+
+        busy = RenderSlots('busy', slots=1, queue_size=0, timeout=1)
+        student = Student.objects.create(first_name='A', last_name='A', student_id='P1', form='F1')
+        from django.contrib.auth import get_user_model
+        student.user = get_user_model().objects.create_user(username='P1', password='pw')
+        student.save()
+        self.client.force_login(student.user)
+        with mock.patch('grades.views.pdf_slots', return_value=busy), \
+                mock.patch.object(busy, '_enter_queue', side_effect=RenderBusy(1)):
+            resp = self.client.get(reverse('grades:download_report_pdf'), {'term': 'T1'})
+        self.assertEqual(resp.status_code, 429)
+        self.assertEqual(resp['Retry-After'], '1')
+
+
+class ProfilingTests(TestCase):
+    def test_admin_capture_listed_and_downloadable(self):
+        import tempfile
+        from django.contrib.auth import get_user_model
+        user = get_user_model().objects.create_user(username='head', password='pw')
+        user.profile.role = 'admin'
+        user.profile.save()
+        self.client.force_login(user)
+
+        with tempfile.TemporaryDirectory() as directory, self.settings(PROFILE_DIR=directory):
+            resp = self.client.get(reverse('grades:class_ranking'), {'form': 'F1', '_profile': 'mem'})
+            self.assertEqual(resp.status_code, 200)
+            name = resp['X-Profile-Id']
+            self.assertIn('class_ranking', name)
+
+            resp = self.client.get(reverse('grades:profiles'))
+            self.assertContains(resp, name)
+            resp = self.client.get(reverse('grades:download_profile', args=[name + '.txt']))
+            report = b''.join(resp.streaming_content).decode()
+            self.assertIn('allocation sites', report)
+            resp = self.client.get(reverse('grades:download_profile', args=['..%2Fsettings.py']))
+            self.assertEqual(resp.status_code, 404)
+
+    def test_non_admin_not_profiled(self):
+        student = Student.objects.create(first_name='A', last_name='A', student_id='P1', form='F1')
+        from django.contrib.auth import get_user_model
+        student.user = get_user_model().objects.create_user(username='P1', password='pw')
+        student.save()
+        self.client.force_login(student.user)
+        resp = self.client.get(reverse('grades:dashboard'), {'_profile': '1'})
+        self.assertNotIn('X-Profile-Id', resp)
+        self.assertEqual(self.client.get(reverse('grades:profiles')).status_code, 302)
+
+
+class MetricsTests(TestCase):
+    def test_registry_merges_worker_files(self):
+        import json
+        import os
+        import tempfile
+        from .metrics import Registry, collect, compact, record_cache, registry, render_exposition
+
+        with tempfile.TemporaryDirectory() as directory, self.settings(METRICS_DIR=directory):
+            other = Registry()  # stands in for a second worker process
+            other.inc('grades_bulk_reports_total', 30)
+            other.observe('grades_pdf_phase_seconds', 0.3, template='t.html', phase='layout')
+            with open(os.path.join(directory, 'metrics-99999-1.json'), 'w') as fh:
+                json.dump(other.snapshot(), fh)
+            before = dict(registry.snapshot())
+            registry.observe('grades_pdf_phase_seconds', 2.0, template='t.html', phase='layout')
+            record_cache('report_card', True)
+
+            text = render_exposition()
+            self.assertIn('# TYPE grades_pdf_phase_seconds histogram', text)
+            self.assertIn('grades_pdf_phase_seconds_bucket{phase="layout",template="t.html",le="0.5"} ', text)
+            self.assertIn('grades_pdf_phase_seconds_bucket{phase="layout",template="t.html",le="+Inf"} ', text)
+            line = next(l for l in text.splitlines()
+                        if l.startswith('grades_bulk_reports_total'))
+            total = sum(v for n, _, v in before['counters'] if n == 'grades_bulk_reports_total')
+            self.assertEqual(float(line.split()[-1]), 30 + total)
+            self.assertIn('grades_cache_requests_total{cache="report_card",result="hit"}', text)
+
+            # The exited worker's file was folded into the archive and removed
+            self.assertEqual(sorted(f for f in os.listdir(directory) if not f.startswith(f'metrics-{os.getpid()}-')),
+                             ['metrics-archive.json', 'metrics.lock'])
+            # child_exit names the worker; a second exit adds to the archive
+            with open(os.path.join(directory, 'metrics-1-2.json'), 'w') as fh:
+                json.dump(other.snapshot(), fh)
+            self.assertEqual((compact([1]), compact([1])), (1, 0))
+            counters, _, _ = collect()
+            self.assertEqual(counters[('grades_bulk_reports_total', ())], 60 + total)
+
+    def test_endpoint_records_requests(self):
+        import tempfile
+        with tempfile.TemporaryDirectory() as directory, \
+                self.settings(METRICS_DIR=directory, METRICS_TOKEN='s3cret'):
+            self.client.get(reverse('grades:student_login'))
+            self.assertEqual(self.client.get(reverse('grades:metrics')).status_code, 403)
+            resp = self.client.get(reverse('grades:metrics'), HTTP_AUTHORIZATION='Bearer s3cret')
+            self.assertEqual(resp.status_code, 200)
+            text = resp.content.decode()
+            self.assertIn('grades_request_duration_seconds_count{method="GET",status="2xx",view="grades:student_login"}', text)
+            self.assertIn('grades_db_queries_per_request_bucket{view="grades:student_login"', text)
+
+            from django.contrib.auth import get_user_model
+            self.client.force_login(get_user_model().objects.create_user(username='u', password='pw'))
+            self.client.get(reverse('grades:dashboard'))
+            text = self.client.get(reverse('grades:metrics'), HTTP_AUTHORIZATION='Bearer s3cret').content.decode()
+            queries = next(l for l in text.splitlines()
+                           if l.startswith('grades_db_queries_per_request_sum{view="grades:dashboard"}'))
+            self.assertGreater(float(queries.split()[-1]), 0)
+
+
+class StudentSearchTests(TestCase):
+    def setUp(self):
+        for sid, first, last, form in [('FS001', 'John', 'Banda', 'F1'), ('FS002', 'Joana', 'Phiri', 'F2'),
+                                       ('FS003', 'Mary', 'Johnson', 'F3S'), ('XY004', 'Peter', 'Mwale', 'F1')]:
+            Student.objects.create(student_id=sid, first_name=first, last_name=last, form=form)
+
+    def _names(self, query, **kwargs):
+        from .search import search_students
+        return [s.first_name for s in search_students(query, **kwargs)]
+
+    def test_prefix_fuzzy_and_forms(self):
+        self.assertEqual(sorted(self._names('jo')), ['Joana', 'John', 'Mary'])
+        self.assertEqual(self._names('fs002'), ['Joana'])
+        self.assertEqual(self._names('john banda'), ['John'])
+        self.assertEqual(self._names('mwlae'), ['Peter'])  # typo
+        self.assertEqual(self._names('jo', forms=['F1']), ['John'])
+        self.assertEqual(self._names(''), [])
+
+        # Triggers keep the search table in sync with edits
+        Student.objects.filter(student_id='XY004').update(first_name='Chisomo')
+        self.assertEqual(self._names('chis'), ['Chisomo'])
+        Student.objects.get(student_id='FS003').delete()
+        self.assertEqual(sorted(self._names('jo')), ['Joana', 'John'])
+
+    def test_fuzzy_candidates_narrowed_before_the_limit(self):
+        from unittest import mock
+        # More same-letter students than candidates, all named too long to match
+        Student.objects.bulk_create([
+            Student(student_id=f'BK{i:03d}', first_name=f'Bartholomew{i:03d}', last_name='Kamwendo', form='F1')
+            for i in range(30)
+        ])
+        Student.objects.create(student_id='ZZ999', first_name='Bruce', last_name='Zulu', form='F1')
+        with mock.patch('grades.search.FUZZY_CANDIDATES', 10):
+            self.assertEqual(self._names('bruec'), ['Bruce'])
+
+    def test_endpoint_limits_teacher_to_forms(self):
+        from django.contrib.auth import get_user_model
+        user = get_user_model().objects.create_user(username='teach', password='pw')
+        user.profile.role = 'teacher'
+        user.profile.forms_responsible = 'F1'
+        user.profile.save()
+        self.client.force_login(user)
+        resp = self.client.get(reverse('grades:student_search'), {'q': 'jo'})
+        self.assertEqual([r['student_id'] for r in resp.json()['results']], ['FS001'])
+
+        admin = get_user_model().objects.create_superuser(username='root', password='pw')
+        self.client.force_login(admin)
+        resp = self.client.get(reverse('admin:grades_student_changelist'), {'q': 'phiri'})
+        self.assertEqual([s.student_id for s in resp.context['cl'].result_list], ['FS002'])
+
+
+class StudentLoginTests(TestCase):
+    def setUp(self):
+        self.student = Student.objects.create(first_name='Thoko', last_name='Banda', student_id='FS100', form='F1')
+
+    def _login(self, username, password):
+        return self.client.post(reverse('grades:student_login'), {'username': username, 'password': password})
+
+    def test_first_login_sets_up_account_once(self):
+        from django.db import connection
+        from django.test.utils import CaptureQueriesContext
+
+        self.assertEqual(self._login('thoko', 'wrong').status_code, 200)
+        self.assertEqual(self._login('Thoko', 'FS100').status_code, 302)
+        self.student.refresh_from_db()
+        self.assertEqual(self.student.user.username, 'stu_FS100')
+        self.assertTrue(self.student.user.check_password('FS100'))
+
+        self.client.logout()
+        with CaptureQueriesContext(connection) as ctx:
+            self.assertEqual(self._login('FS100', 'FS100').status_code, 302)
+        password_writes = [q['sql'] for q in ctx.captured_queries
+                           if q['sql'].startswith('UPDATE') and 'password' in q['sql']]
+        self.assertEqual(password_writes, [])
+        self.assertFalse(any('INSERT INTO "auth_user"' in q['sql'] for q in ctx.captured_queries))
+
+    def test_assigned_password(self):
+        self.student.assigned_password = 'blue42'
+        self.student.save()
+        self.assertEqual(self._login('FS100', 'FS100').status_code, 200)  # ID no longer accepted
+        self.assertEqual(self._login('thoko', 'blue42').status_code, 302)
+        # A teacher reset replaces the stored password on next sign-in
+        Student.objects.filter(pk=self.student.pk).update(assigned_password='green7')
+        self.client.logout()
+        self.assertEqual(self._login('thoko', 'blue42').status_code, 302)
+        self.client.logout()
+        self.assertEqual(self._login('thoko', 'green7').status_code, 302)
+        self.student.refresh_from_db()
+        self.assertTrue(self.student.user.check_password('green7'))
+
+    def test_shared_first_name_needs_student_id(self):
+        from unittest import mock
+        from django.contrib.auth import get_user_model
+        User = get_user_model()
+        self.assertEqual(self._login('FS100', 'FS100').status_code, 302)
+        self.client.logout()
+        Student.objects.create(first_name='THOKO', last_name='Phiri', student_id='FS101', form='F2',
+                               user=User.objects.create_user(username='stu_FS101', password='pw'))
+
+        # An ambiguous first name is refused before any password hashing
+        with mock.patch.object(User, 'check_password', autospec=True, return_value=True) as check:
+            self.assertEqual(self._login('thoko', 'FS100').status_code, 200)
+        self.assertEqual(check.call_count, 0)
+        self.assertEqual(self._login('FS101', 'pw').status_code, 302)
+
+
+class ProvisionAccountsTests(TestCase):
+    def test_creates_links_and_profiles(self):
+        from django.contrib.auth import get_user_model
+        from django.core.management import call_command
+        User = get_user_model()
+        a = Student.objects.create(first_name='A', last_name='A', student_id='PV1', form='F1')
+        b = Student.objects.create(first_name='B', last_name='B', student_id='PV2', form='F1',
+                                   assigned_password='tiger')
+        orphan = User.objects.create_user(username='stu_PV3', password='x')
+        c = Student.objects.create(first_name='C', last_name='C', student_id='PV3', form='F2')
+
+        out = io.StringIO()
+        call_command('provision_student_accounts', workers=2, stdout=out)
+        self.assertIn('Created 2 and linked 3', out.getvalue())
+
+        for student in (a, b, c):
+            student.refresh_from_db()
+        self.assertTrue(a.user.check_password('PV1'))
+        self.assertTrue(b.user.check_password('tiger'))
+        self.assertEqual(c.user, orphan)
+        self.assertEqual(a.user.profile.role, 'student')
+
+        # Provisioned students log straight in through the normal path
+        resp = self.client.post(reverse('grades:student_login'), {'username': 'PV1', 'password': 'PV1'})
+        self.assertEqual(resp.status_code, 302)
+
+
+class ProfileBackfillTests(TestCase):
+    def test_set_based_backfill(self):
+        from django.contrib.auth import get_user_model
+        from django.core.management import call_command
+        from .models import UserProfile
+        User = get_user_model()
+        boss = User.objects.create_superuser(username='boss', password='pw')
+        staff = User.objects.create_user(username='staff', password='pw', is_staff=True)
+        linked = User.objects.create_user(username='stu', password='pw')
+        Student.objects.create(first_name='S', last_name='S', student_id='BF1', user=linked)
+        UserProfile.objects.filter(user__in=[staff, linked]).delete()  # as if created before profiles existed
+        UserProfile.objects.filter(user=boss).update(role='student')
+
+        out = io.StringIO()
+        call_command('create_user_profiles', dry_run=True, stdout=out)
+        self.assertIn('Would create 2 UserProfile(s) (1 student, 1 teacher)', out.getvalue())
+        self.assertEqual(UserProfile.objects.count(), 1)
+
+        call_command('create_user_profiles', stdout=io.StringIO())
+        roles = dict(UserProfile.objects.values_list('user__username', 'role'))
+        self.assertEqual(roles, {'boss': 'admin', 'staff': 'teacher', 'stu': 'student'})
+
+        out = io.StringIO()
+        call_command('init_profiles', stdout=out)
+        self.assertIn('Created 0 new profiles, Updated 0 existing profiles', out.getvalue())
+
+
+class PromotionTests(TestCase):
+    def test_year_end_rollover(self):
+        import os
+        import tempfile
+        from django.core.management import call_command
+        from django.core.management.base import CommandError
+        from .models import ArchivedGrade, GradeRollup, current_academic_year, invalidate_academic_year
+        self.addCleanup(invalidate_academic_year)
+        year = current_academic_year()
+        math = Subject.objects.create(name='Mathematics')
+        forms = {'P1': 'F1', 'P2': 'F2', 'P3': 'F2', 'P4': 'F2', 'P5': 'F3H', 'P6': 'F4S'}
+        for sid, form in forms.items():
+            s = Student.objects.create(first_name=sid, last_name='X', student_id=sid, form=form)
+            Grade.objects.create(student=s, subject=math, score=60, term='T1')
+
+        with tempfile.NamedTemporaryFile('w', suffix='.csv', delete=False) as fh:
+            fh.write('student_id,stream\nP2,Science\nP3,h\n')
+        self.addCleanup(os.unlink, fh.name)
+        with self.assertRaises(CommandError):  # P4 has no stream
+            call_command('promote_students', streams=fh.name, stdout=io.StringIO())
+        with self.assertRaisesMessage(CommandError, 'still has 6 live grade(s)'):
+            call_command('promote_students', streams=fh.name, default_stream='S', stdout=io.StringIO())
+
+        export_dir = self.enterContext(tempfile.TemporaryDirectory())
+        call_command('archive_year', year, export_dir=export_dir, stdout=io.StringIO())
+        self.assertFalse(GradeRollup.objects.filter(count__gt=0).exists())
+        call_command('promote_students', streams=fh.name, default_stream='S', stdout=io.StringIO())
+        result = dict(Student.objects.values_list('student_id', 'form'))
+        self.assertEqual(result, {'P1': 'F2', 'P2': 'F3S', 'P3': 'F3H', 'P4': 'F3S',
+                                  'P5': 'F4H', 'P6': Student.GRADUATED})
+        streams = dict(Student.objects.values_list('student_id', 'stream'))
+        self.assertEqual((streams['P1'], streams['P3'], streams['P5'], streams['P6']),
+                         ('NONE', 'HUMANITIES', 'HUMANITIES', 'NONE'))
+
+        # The school starts the next year with last year's grades archived
+        self.assertEqual(current_academic_year(), year + 1)
+        self.assertFalse(Grade.objects.exists())
+        self.assertEqual(set(ArchivedGrade.objects.values_list('academic_year', 'form')),
+                         {(year, form) for form in forms.values()})
+        self.assertFalse(GradeRollup.objects.filter(count__gt=0).exists())
+
+
+class GeneratedStudentFieldsTests(TestCase):
+    def test_derived_columns_follow_form(self):
+        s = Student.objects.create(first_name='Gen', last_name='X', student_id='G1', form='F3S')
+        self.assertEqual((s.is_senior, s.base_form, s.stream), (True, 'F3', 'SCIENCE'))
+        s.form = 'F2'
+        s.save()
+        self.assertEqual((s.is_senior, s.base_form, s.get_stream_display()), (False, 'F2', 'None'))
+
+        Student.objects.create(first_name='Gen', last_name='Y', student_id='G2', form='F3S')
+        Student.objects.filter(student_id='G2').update(form='F3H')
+        self.assertEqual(
+            list(Student.objects.filter(base_form='F3', stream='HUMANITIES').values_list('student_id', flat=True)),
+            ['G2'],
+        )
+        self.assertFalse(Student.objects.filter(is_senior=True, student_id='G1').exists())
+
+
+class CurriculumTests(TestCase):
+    def test_form_subjects_and_invalidation(self):
+        from .admin import GradeAdminForm
+        from .curriculum import subjects_for_form
+        english = Subject.objects.create(name='English')
+        physics = Subject.objects.create(name='Physics', stream='SCIENCE')
+        Subject.objects.create(name='History', stream='HUMANITIES')
+        agric = Subject.objects.create(name='Agriculture', stream='JUNIOR', form_level='F2')
+
+        self.assertEqual([s.name for s in subjects_for_form('F3S')], ['English', 'Physics'])
+        self.assertEqual([s.name for s in subjects_for_form('F2')], ['Agriculture', 'English'])
+        self.assertEqual(subjects_for_form(Student.GRADUATED), ())
+        with self.assertNumQueries(0):
+            subjects_for_form('F4H')
+
+        agric.form_level = 'ALL'
+        agric.save()
+        self.assertIn(agric, subjects_for_form('F1'))
+
+        student = Student.objects.create(first_name='Cur', last_name='X', student_id='C1', form='F3H')
+        data = {'student': student.pk, 'score': '55', 'term': 'T1', 'academic_year': 2026}
+        form = GradeAdminForm(data={**data, 'subject': physics.pk})
+        self.assertIn('subject', form.errors)
+        form = GradeAdminForm(data={**data, 'subject': english.pk})
+        self.assertTrue(form.is_valid(), form.errors)
+
+
+class ArchiveYearTests(TestCase):
+    def test_archive_closed_year(self):
+        import gzip
+        import os
+        import tempfile
+        from django.contrib.auth import get_user_model
+        from django.core.management import call_command
+        from django.utils import timezone
+        from .archive import ArchiveError, archive_year
+        from .models import (
+            AcademicCalendar, ArchivedGrade, ArchivedResult, ResultSnapshot, TermPublication, invalidate_academic_year,
+        )
+        from .report_card import build_report_card, empty_report_card
+        AcademicCalendar.objects.update_or_create(pk=1, defaults={'current_year': 2026})
+        invalidate_academic_year()
+        self.addCleanup(invalidate_academic_year)
+        math = Subject.objects.create(name='Mathematics')
+        english = Subject.objects.create(name='English')
+        user = get_user_model().objects.create_user(username='stu_A1', password='pw')
+        student = Student.objects.create(first_name='Old', last_name='Timer', student_id='A1', form='F2', user=user)
+        classmate = Student.objects.create(first_name='Kept', last_name='Back', student_id='B1', form='F1')
+        Grade.objects.create(student=student, subject=math, score=50, term='T1', academic_year=2025)
+        Grade.objects.create(student=student, subject=english, score=70, term='T1', academic_year=2025)
+        Grade.objects.create(student=student, subject=math, score=60, term='T2', academic_year=2025)
+        Grade.objects.create(student=classmate, subject=math, score=80, term='T2', academic_year=2025)
+        Grade.objects.create(student=student, subject=math, score=65, term='T1')
+        publication = TermPublication.objects.create(academic_year=2025, term='T1', published_at=timezone.now())
+        ResultSnapshot.objects.create(publication=publication, student=student, form='F1',
+                                      data=empty_report_card(student, 'T1').as_dict())
+
+        # Live results ignore last year's grades even before archiving
+        self.assertEqual([s.score for s in build_report_card(student, 'T1').subjects], [65.0])
+
+        export_dir = self.enterContext(tempfile.TemporaryDirectory())
+        with self.assertRaisesMessage(ArchiveError, '2027 has not started'):
+            archive_year(2027, export_dir)
+        call_command('archive_year', 2025, export_dir=export_dir, stdout=io.StringIO())
+
+        self.assertEqual(list(Grade.objects.values_list('academic_year', flat=True)), [2026])
+        self.assertFalse(TermPublication.objects.exists())
+        self.assertEqual(set(ArchivedGrade.objects.values_list('form', 'subject_name')),
+                         {('F1', 'Mathematics'), ('F1', 'English')})
+        self.assertEqual(ArchivedResult.objects.get().student_code, 'A1')
+        with gzip.open(os.path.join(export_dir, 'grades-2025.csv.gz'), 'rt') as fh:
+            self.assertEqual(len(fh.read().splitlines()), 5)
+
+        # The closed year's transcript: the published term from ArchivedResult,
+        # the rest ranked from ArchivedGrade within last year's form
+        self.client.force_login(user)
+        url = reverse('grades:student_transcript')
+        resp = self.client.get(url, {'year': 2025})
+        self.assertEqual((resp.context['student'].form, resp.context['transcript'].academic_year), ('F1', 2025))
+        self.assertEqual([c.overall_position for c in resp.context['cards']], [None, 2, None])
+        self.assertEqual([(r.subject_name, [x and x.score for x in r.results]) for r in resp.context['rows']],
+                         [('Mathematics', [None, 60.0, None])])
+        self.assertEqual(resp.context['archived_years'], [(2025, '2025')])
+        self.assertEqual(self.client.get(url, {'year': 2025}, HTTP_IF_NONE_MATCH=resp['ETag']).status_code, 304)
+        self.assertEqual(self.client.get(url).context['student'].form, 'F2')
+        self.assertEqual(self.client.get(url, {'year': 2024}).status_code, 404)
+
+
+class RankingExportTests(TestCase):
+    def test_csv_and_xlsx_exports(self):
+        import csv
+        from asgiref.sync import async_to_sync
+        from django.contrib.auth import get_user_model
+        from openpyxl import load_workbook
+
+        @async_to_sync
+        async def body(response):
+            # Consumed the way the ASGI handler streams it
+            return b''.join([chunk async for chunk in response])
+
+        math = Subject.objects.create(name='Mathematics')
+        english = Subject.objects.create(name='English')
+        ann = Student.objects.create(first_name='Ann', last_name='A', student_id='A001', form='F1')
+        ben = Student.objects.create(first_name='Ben', last_name='B', student_id='B001', form='F1')
+        Student.objects.create(first_name='Cat', last_name='C', student_id='C001', form='F1')
+        other = Student.objects.create(first_name='Dan', last_name='D', student_id='D001', form='F2')
+        for student, m, e in ((ann, 70, 65), (ben, 90, 30), (other, 50, 50)):
+            Grade.objects.create(student=student, subject=math, score=m, term='T1')
+            Grade.objects.create(student=student, subject=english, score=e, term='T1')
+
+        user = get_user_model().objects.create_user(username='teach', password='pw')
+        user.profile.role = 'teacher'
+        user.profile.forms_responsible = 'F1'
+        user.profile.save()
+        self.client.force_login(user)
+        url = reverse('grades:export_class_ranking')
+
+        resp = self.client.get(url, {'form': 'F1', 'term': 'T1', 'format': 'csv'})
+        self.assertEqual(resp.status_code, 200)
+        rows = list(csv.reader(io.StringIO(body(resp).decode())))
+        self.assertEqual(rows[0], ['Position', 'Student ID', 'Name', 'Form', 'English', 'Mathematics',
+                                   'Average', 'Points (best six)', 'Passed', 'Subjects taken'])
+        # Ann 67.5 and Ben 60.0 are ranked; Cat has no grades and comes last, unranked
+        self.assertEqual(rows[1:], [
+            ['1', 'A001', 'Ann A', 'F1', '65.0', '70.0', '67.5', '', '2', '2'],
+            ['2', 'B001', 'Ben B', 'F1', '30.0', '90.0', '60.0', '', '1', '2'],
+            ['', 'C001', 'Cat C', 'F1', '', '', '', '', '0', '0'],
+        ])
+
+        self.assertEqual(self.client.get(url, {'form': 'F2', 'format': 'csv'}).status_code, 403)
+        self.assertEqual(self.client.get(url, {'form': 'F1', 'format': 'pdf'}).status_code, 400)
+
+        resp = self.client.get(url, {'form': 'ALL', 'term': 'T1', 'format': 'xlsx'})
+        self.assertEqual(resp.status_code, 200)
+        workbook = load_workbook(io.BytesIO(body(resp)), read_only=True)
+        self.assertEqual(workbook.sheetnames, ['F1'])
+        sheet = [list(row) for row in workbook['F1'].iter_rows(values_only=True)]
+        self.assertEqual(sheet[1][:3], [1, 'A001', 'Ann A'])
+        self.assertEqual(len(sheet), 4)
+
+
+class SqliteProfileTests(TestCase):
+    def test_pragmas_writer_lock_and_benchmark(self):
+        import os
+        import tempfile
+        import threading
+        from django.db import connection
+        from .management.commands.bench_sqlite import run_profile
+        from .writer import file_lock, serialized_writes
+        with connection.cursor() as cursor:
+            pragmas = {name: cursor.execute(f'PRAGMA {name}').fetchone()[0]
+                       for name in ('synchronous', 'cache_size', 'busy_timeout', 'temp_store')}
+        self.assertEqual(pragmas, {'synchronous': 1, 'cache_size': -65536, 'busy_timeout': 20000, 'temp_store': 2})
+
+        with serialized_writes(), serialized_writes():
+            Subject.objects.create(name='Nested')
+
+        # A second bulk writer waits for the first to release the file lock
+        events = []
+        with tempfile.TemporaryDirectory() as tmp:
+            path = os.path.join(tmp, 'db.sqlite3-writer.lock')
+
+            def second():
+                with file_lock(path):
+                    events.append('second')
+
+            with file_lock(path):
+                thread = threading.Thread(target=second)
+                thread.start()
+                thread.join(0.2)
+                events.append('first done')
+            thread.join()
+        self.assertEqual(events, ['first done', 'second'])
+
+        result = run_profile('tuned', seconds=0.3, readers=2, writers=1, students=30, subjects=3)
+        self.assertEqual((result['read_errors'], result['write_errors']), (0, 0))
+        self.assertGreater(result['reads_per_s'], 0)
+        self.assertGreater(result['writes_per_s'], 0)
+
+
+class EmailReportsTests(TestCase):
+    def test_batches_over_one_connection_and_resume(self):
+        from unittest import mock
+        from django.contrib.auth import get_user_model
+        from django.core import mail
+        from django.core.management import call_command
+        from django.core.management.base import CommandError
+        from .models import ReportEmail
+        User = get_user_model()
+        math = Subject.objects.create(name='Mathematics')
+        for i in range(5):
+            user = User.objects.create_user(username=f'stu_E{i}', email=f'e{i}@home.test', password='pw')
+            s = Student.objects.create(first_name=f'E{i}', last_name='X', student_id=f'E{i}', form='F1', user=user)
+            Grade.objects.create(student=s, subject=math, score=50 + i, term='T1')
+        Student.objects.create(first_name='No', last_name='Email', student_id='E9', form='F1')
+        # Still on the address the account was created with
+        user = User.objects.create_user(username='stu_E8', email='E8@example.com', password='pw')
+        Student.objects.create(first_name='Placeholder', last_name='Email', student_id='E8', form='F1', user=user)
+
+        sent_batches = []
+        original = mail.get_connection
+
+        def failing_connection(*args, **kwargs):
+            connection = original(*args, **kwargs)
+            send = connection.send_messages
+
+            def send_messages(messages):
+                if sent_batches:  # the second batch fails every attempt
+                    raise OSError('connection dropped')
+                sent_batches.append(len(messages))
+                return send(messages)
+            connection.send_messages = send_messages
+            return connection
+
+        with self.settings(EMAIL_BACKEND='django.core.mail.backends.locmem.EmailBackend'), \
+                mock.patch('grades.mailing.render_pdf', return_value=b'%PDF-1.4'):
+            with mock.patch('grades.mailing.get_connection', side_effect=failing_connection), \
+                    mock.patch('grades.mailing.time.sleep'), self.assertRaises(CommandError):
+                call_command('email_reports', 'T1', form=['F1'], batch_size=2, rate=0, stdout=io.StringIO())
+            self.assertEqual((sent_batches, len(mail.outbox), ReportEmail.objects.count()), ([2], 2, 2))
+
+            call_command('email_reports', 'T1', form=['F1'], batch_size=2, rate=0, stdout=io.StringIO())
+        self.assertEqual(len(mail.outbox), 5)
+        self.assertEqual(sorted(m.to[0] for m in mail.outbox), [f'e{i}@home.test' for i in range(5)])
+        self.assertEqual(mail.outbox[-1].attachments[0][2], 'application/pdf')
+        self.assertEqual(ReportEmail.objects.count(), 5)
+
+
+class AdminChangelistTests(TestCase):
+    def setUp(self):
+        from django.contrib.auth import get_user_model
+        self.math = Subject.objects.create(name='Mathematics')
+        self.ann = Student.objects.create(first_name='Ann', last_name='A', student_id='A001', form='F1',
+                                          assigned_password='pw1')
+        ben = Student.objects.create(first_name='Ben', last_name='B', student_id='B001', form='F2',
+                                     assigned_password='pw2')
+        self.grades = [Grade.objects.create(student=s, subject=self.math, score=score, term='T1')
+                       for s, score in ((self.ann, 85), (self.ann, 39), (ben, 62))]
+        self.client.force_login(get_user_model().objects.create_superuser(username='root', password='pw'))
+
+    def test_grade_columns_and_single_statement_actions(self):
+        from unittest import mock
+        from django.contrib.admin.models import DELETION, LogEntry
+        from django.db import connection
+        from django.test.utils import CaptureQueriesContext
+        from .models import GradeRollup
+        url = reverse('admin:grades_grade_changelist')
+        resp = self.client.get(url, {'o': '5'})  # by letter
+        self.assertEqual([(g.student.student_id, g.letter_grade) for g in resp.context['cl'].result_list],
+                         [('A001', 'A'), ('B001', 'C'), ('A001', 'F')])
+        self.assertEqual({g.letter_grade for g in resp.context['cl'].result_list},
+                         {g.letter for g in self.grades})
+
+        # Large unfiltered tables show the planner estimate; filtered ones count
+        with mock.patch('grades.admin.estimated_row_count', return_value=2_000_000):
+            self.assertEqual(self.client.get(url).context['cl'].result_count, 2_000_000)
+            self.assertEqual(self.client.get(url, {'term': 'T1'}).context['cl'].result_count, 3)
+
+        # The stock delete action: confirmation page, audit log, then one DELETE
+        selected = {'action': 'delete_selected', '_selected_action': [g.pk for g in self.grades[:2]]}
+        self.assertContains(self.client.post(url, selected), 'Are you sure')
+        with CaptureQueriesContext(connection) as queries:
+            resp = self.client.post(url, {**selected, 'post': 'yes'})
+        self.assertEqual(resp.status_code, 302)
+        grade_writes = [q['sql'] for q in queries if q['sql'].startswith('DELETE FROM "grades_grade"')]
+        self.assertEqual(len(grade_writes), 1)
+        self.assertEqual(list(Grade.objects.values_list('score', flat=True)), [62])
+        self.assertEqual(list(GradeRollup.objects.filter(count__gt=0).values_list('form', 'count')), [('F2', 1)])
+        self.assertEqual(LogEntry.objects.filter(action_flag=DELETION).count(), 2)
+
+        # delete_queryset itself never loads the grades it deletes
+        from django.contrib import admin
+        with CaptureQueriesContext(connection) as queries:
+            admin.site._registry[Grade].delete_queryset(None, Grade.objects.filter(student__form='F2'))
+        self.assertEqual([q['sql'] for q in queries if q['sql'].startswith('SELECT "grades_grade"."id"')], [])
+        self.assertEqual(len([q for q in queries if q['sql'].startswith('DELETE FROM "grades_grade"')]), 1)
+        self.assertFalse(Grade.objects.exists())
+        self.assertFalse(GradeRollup.objects.filter(count__gt=0).exists())
+
+        resp = self.client.post(reverse('admin:grades_student_changelist'), {
+            'action': 'clear_assigned_passwords', 'select_across': '1',
+            '_selected_action': [self.ann.pk],
+        })
+        self.assertEqual(resp.status_code, 302)
+        self.assertFalse(Student.objects.exclude(assigned_password=None).exists())
+
+
+class LiveRankingTests(TestCase):
+    def test_incremental_positions_match_rank_form(self):
+        import random
+        from decimal import Decimal
+        from .live import LiveRanking
+        from .report_card import rank_form
+        rng = random.Random(1)
+        for is_senior, subjects in ((False, 3), (True, 7)):
+            scores = {pk: [(sub, Decimal(rng.randint(20, 95))) for sub in range(subjects)] for pk in range(1, 30)}
+            live = LiveRanking(is_senior)
+            live.load({pk: (('', ''), rows) for pk, rows in scores.items()})
+            positions = {p: live.row(p)['position'] for p in scores if live.row(p)['position']}
+            for _ in range(80):
+                pk = rng.randint(1, 35)
+                scores[pk] = [(sub, Decimal(rng.randint(20, 95))) for sub in range(rng.randint(0, subjects))]
+                moved = live.update(pk, ('', ''), scores[pk])
+                expected = rank_form(is_senior, [(p, sub, sc) for p, rows in scores.items() for sub, sc in rows])
+                current = {p: live.row(p)['position'] for p in scores if live.row(p)['position']}
+                self.assertEqual(current, expected.positions)
+                # Only the students reported as moved can have changed position
+                self.assertLessEqual({p for p in current.keys() | positions.keys()
+                                      if current.get(p) != positions.get(p)}, moved)
+                positions = current
+
+    def test_stream_sends_only_changed_rows(self):
+        import json
+        from datetime import timedelta
+        from asgiref.sync import async_to_sync
+        from django.contrib.auth import get_user_model
+        from .live import ranking_events
+        math = Subject.objects.create(name='Mathematics')
+        english = Subject.objects.create(name='English')
+        ann = Student.objects.create(first_name='Ann', last_name='A', student_id='A001', form='F1')
+        ben = Student.objects.create(first_name='Ben', last_name='B', student_id='B001', form='F1')
+        cat = Student.objects.create(first_name='Cat', last_name='C', student_id='C001', form='F1')
+        Grade.objects.create(student=ann, subject=math, score=70, term='T1')
+        Grade.objects.create(student=ben, subject=math, score=60, term='T1')
+        late = Grade.objects.create(student=cat, subject=math, score=40, term='T1')
+        dan = Student.objects.create(first_name='Dan', last_name='D', student_id='D001', form='F1')  # no grades
+
+        def rows(event):
+            name, data = event.strip().split('\n')
+            return name.split(': ')[1], {r['student_id']: (r['position'], r['metric']) for r in json.loads(data[6:])['rows']}
+
+        @async_to_sync
+        async def watch():
+            events = ranking_events('F1', 'T1', poll_seconds=0.01, max_seconds=5)
+            await anext(events)  # retry interval
+            seen = [rows(await anext(events))]
+            grade = await Grade.objects.acreate(student=ben, subject=english, score=99, term='T1')
+            seen.append(rows(await anext(events)))
+            await grade.adelete()
+            seen.append(rows(await anext(events)))
+            # Committed late: stamped before the newest grade already seen
+            await Grade.objects.filter(pk=late.pk).aupdate(score=65, updated_at=late.updated_at - timedelta(seconds=5))
+            seen.append(rows(await anext(events)))
+            # Moving a student without grades leaves the grade count alone
+            await Student.objects.filter(pk=dan.pk).aupdate(form='F2')
+            event = await anext(events)
+            seen.append((rows(event), json.loads(event.split('data: ')[1])['removed']))
+            await events.aclose()
+            return seen
+
+        snapshot, saved, deleted, late_commit, moved = watch()
+        self.assertEqual(snapshot, ('snapshot', {'A001': (1, '70.0%'), 'B001': (2, '60.0%'), 'C001': (3, '40.0%'),
+                                                 'D001': (None, 'No grades')}))
+        # Cat's row is unchanged, so it is not sent
+        self.assertEqual(saved, ('delta', {'A001': (2, '70.0%'), 'B001': (1, '79.5%')}))
+        self.assertEqual(deleted, ('delta', {'A001': (1, '70.0%'), 'B001': (2, '60.0%')}))
+        self.assertEqual(late_commit, ('delta', {'B001': (3, '60.0%'), 'C001': (2, '65.0%')}))
+        self.assertEqual(moved, (('delta', {}), [dan.pk]))
+
+        user = get_user_model().objects.create_user(username='teach', password='pw')
+        user.profile.role = 'teacher'
+        user.profile.forms_responsible = 'F2'
+        user.profile.save()
+        self.client.force_login(user)
+        url = reverse('grades:class_ranking_live')
+        self.assertEqual(self.client.get(url, {'form': 'F1'}).status_code, 403)
+        resp = self.client.get(url, {'form': 'F2', 'term': 'T1'})
+        self.assertEqual((resp.status_code, resp['Content-Type']), (200, 'text/event-stream'))
+        resp.close()
+
+
+class QueryScalingTests(TestCase):
+    """Each view runs the same number of queries for a class of 10, 100 or 1000."""
+    SIZES = (10, 100, 1000)
+
+    def setUp(self):
+        from django.contrib.auth import get_user_model
+        self.subjects = [Subject.objects.create(name=name) for name in ('Biology', 'English', 'Mathematics')]
+        admin = get_user_model().objects.create_superuser(username='head', password='pw')
+        admin.profile.role = 'admin'
+        admin.profile.save()
+        self.client.force_login(admin)
+        self.seeded = 0
+
+    def _grow_form(self, size):
+        """Add students (with accounts and T1 grades) to Form 1 until it has ``size``."""
+        from django.contrib.auth import get_user_model
+        User = get_user_model()
+        new = range(self.seeded, size)
+        users = User.objects.bulk_create([User(username=f'stu_Q{i:04d}') for i in new])
+        students = Student.objects.bulk_create([
+            Student(first_name=f'S{i}', last_name=f'Q{i:04d}', student_id=f'Q{i:04d}', form='F1', user=user)
+            for i, user in zip(new, users)
+        ])
+        Grade.objects.bulk_create([
+            Grade(student=student, subject=subject, term='T1', score=30 + (student.pk * 7 + subject.pk) % 70)
+            for student in students for subject in self.subjects
+        ])
+        self.seeded = size
+
+    def _queries(self, client, url, params=None):
+        from django.db import connection
+        from django.test.utils import CaptureQueriesContext
+        client.get(url, params)  # first request fills per-process caches
+        with CaptureQueriesContext(connection) as queries:
+            resp = client.get(url, params)
+        self.assertEqual(resp.status_code, 200, url)
+        return len(queries)
+
+    def test_views_do_not_query_per_student(self):
+        from unittest import mock
+        from django.test import Client
+        self._grow_form(self.SIZES[0])
+        student_client = Client()
+        student_client.force_login(Student.objects.get(student_id='Q0000').user)
+        ranking = {'form': 'F1', 'term': 'T1'}
+        views = {
+            'student_grades': (student_client, reverse('grades:student_grades'), {'term': 'T1'}),
+            'class_ranking': (self.client, reverse('grades:class_ranking'), ranking),
+            'class_ranking_pdf': (self.client, reverse('grades:download_class_ranking_pdf'), ranking),
+            'admin_dashboard': (self.client, reverse('grades:admin_dashboard'), None),
+            'api_grades': (self.client, reverse('grades:api_grades'), None),
+            'student_changelist': (self.client, reverse('admin:grades_student_changelist'), None),
+            'grade_changelist': (self.client, reverse('admin:grades_grade_changelist'), None),
+            'subject_changelist': (self.client, reverse('admin:grades_subject_changelist'), None),
+        }
+        counts = {name: [] for name in views}
+        with mock.patch('grades.views.render_pdf', return_value=b'%PDF-1.4'):
+            for size in self.SIZES:
+                self._grow_form(size)
+                for name, (client, url, params) in views.items():
+                    counts[name].append(self._queries(client, url, params))
+
+        for name, per_size in counts.items():
+            with self.subTest(view=name):
+                self.assertEqual(len(set(per_size)), 1, f'{name} queries for {self.SIZES} students: {per_size}')
@@ -0,0 +1,167 @@
+# grades/throttle.py
+"""Node-wide cap on concurrent PDF renders.
+
+WeasyPrint renders are CPU- and memory-heavy, so only ``slots`` of them may
+run at once on a machine, across all worker processes.  Up to ``queue_size``
+further requests wait (at most ``timeout`` seconds) for a slot; anything
+beyond that is refused straight away with ``RenderBusy`` so the view can
+answer 429 instead of tying up a worker.
+
+Slots and queue places are lock files held with ``flock``; the kernel drops
+the lock if a worker dies, so a crash can never leak a slot.  Platforms
+without ``fcntl`` (Windows development) fall back to a per-process semaphore.
+"""
+import asyncio
+import os
+import tempfile
+import threading
+import time
+from contextlib import asynccontextmanager, contextmanager
+
+from django.conf import settings
+from django.http import HttpResponse
+
+try:
+    import fcntl
+except ImportError:  # Windows
+    fcntl = None
+
+POLL_INTERVAL = 0.05
+
+
+class RenderBusy(Exception):
+    """No render slot could be obtained; retry after ``retry_after`` seconds."""
+
+    def __init__(self, retry_after):
+        super().__init__(f"PDF rendering busy, retry after {retry_after}s")
+        self.retry_after = retry_after
+
+
+class RenderSlots:
+    def __init__(self, name, slots, queue_size, timeout, lock_dir=None):
+        self.name = name
+        self.slots = slots
+        self.queue_size = queue_size
+        self.timeout = timeout
+        self.lock_dir = lock_dir or os.path.join(tempfile.gettempdir(), 'school-grades-locks')
+        self._local = threading.BoundedSemaphore(slots)
+        self._local_queue = threading.BoundedSemaphore(slots + queue_size)
+
+    @property
+    def retry_after(self):
+        return max(1, int(self.timeout))
+
+    # -- lock-file primitives ------------------------------------------------
+
+    def _try_lock(self, kind, count):
+        """Grab any free lock file of ``kind``; return its fd or None."""
+        os.makedirs(self.lock_dir, exist_ok=True)
+        for i in range(count):
+            path = os.path.join(self.lock_dir, f'{self.name}-{kind}-{i}.lock')
+            fd = os.open(path, os.O_RDWR | os.O_CREAT, 0o600)
+            try:
+                fcntl.flock(fd, fcntl.LOCK_EX | fcntl.LOCK_NB)
+                return fd
+            except OSError:
+                os.close(fd)
+        return None
+
+    @staticmethod
+    def _release(fd):
+        if fd is not None:
+            os.close(fd)  # closing drops the flock
+
+    # -- public API ----------------------------------------------------------
+
+    def _enter_queue(self):
+        if fcntl is None:
+            if not self._local_queue.acquire(blocking=False):
+                raise RenderBusy(self.retry_after)
+            return None
+        # Every request holds a queue place while waiting *and* rendering.
+        fd = self._try_lock('place', self.slots + self.queue_size)
+        if fd is None:
+            raise RenderBusy(self.retry_after)
+        return fd
+
+    def _leave_queue(self, fd):
+        if fcntl is None:
+            self._local_queue.release()
+        else:
+            self._release(fd)
+
+    def _try_slot(self):
+        if fcntl is None:
+            return self._local.acquire(blocking=False) or None
+        return self._try_lock('slot', self.slots)
+
+    def _release_slot(self, slot):
+        if fcntl is None:
+            self._local.release()
+        else:
+            self._release(slot)
+
+    @contextmanager
+    def acquire(self):
+        """Hold a render slot for the duration of the block (blocking wait)."""
+        place = self._enter_queue()
+        try:
+            deadline = time.monotonic() + self.timeout
+            slot = self._try_slot()
+            while slot is None:
+                if time.monotonic() >= deadline:
+                    raise RenderBusy(self.retry_after)
+                time.sleep(POLL_INTERVAL)
+                slot = self._try_slot()
+            try:
+                yield
+            finally:
+                self._release_slot(slot)
+        finally:
+            self._leave_queue(place)
+
+    @asynccontextmanager
+    async def aacquire(self):
+        """Async variant of acquire(): waits without blocking the event loop."""
+        place = self._enter_queue()
+        try:
+            deadline = time.monotonic() + self.timeout
+            slot = self._try_slot()
+            while slot is None:
+                if time.monotonic() >= deadline:
+                    raise RenderBusy(self.retry_after)
+                await asyncio.sleep(POLL_INTERVAL)
+                slot = self._try_slot()
+            try:
+                yield
+            finally:
+                self._release_slot(slot)
+        finally:
+            self._leave_queue(place)
+
+
+_pdf_slots = None
+
+
+def pdf_slots():
+    """Return the shared limiter configured from PDF_* settings."""
+    global _pdf_slots
+    if _pdf_slots is None:
+        _pdf_slots = RenderSlots(
+            'pdf',
+            slots=getattr(settings, 'PDF_MAX_CONCURRENT_RENDERS', 2),
+            queue_size=getattr(settings, 'PDF_RENDER_QUEUE_SIZE', 8),
+            timeout=getattr(settings, 'PDF_RENDER_QUEUE_TIMEOUT', 10),
+            lock_dir=getattr(settings, 'PDF_RENDER_LOCK_DIR', None),
+        )
+    return _pdf_slots
+
+
+def busy_response(exc):
+    """429 response telling the client when to retry."""
+    response = HttpResponse(
+        "The report generator is busy. Please try again in a few seconds.",
+        status=429, content_type='text/plain',
+    )
+    response['Retry-After'] = str(exc.retry_after)
+    return response
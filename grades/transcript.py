@@ -0,0 +1,230 @@
+# grades/transcript.py
+"""A student's year transcript: every term's result side by side.
+
+All terms come from one query over the form's current-year grades.  Each
+term is ranked once from those rows and assembled exactly like a single
+ReportCard, so the transcript always agrees with the term report cards.
+Published terms use their frozen snapshots and are left out of the query.
+Transcripts and their PDFs are cached for ``TRANSCRIPT_CACHE_SECONDS``
+under a version that changes whenever any grade in the form or any
+publication changes.
+
+Closed years are built the same way from the archive: ArchivedResult for
+the terms that were published and ArchivedGrade, ranked within the form the
+student was in that year, for the rest.
+"""
+import copy
+import hashlib
+from dataclasses import dataclass
+
+from django.conf import settings
+from django.core.cache import cache
+from django.db.models import Count, Max
+from django.utils import timezone
+
+from .curriculum import asubject_order
+from .metrics import record_cache
+from .models import (
+    SENIOR_FORMS, ArchivedGrade, ArchivedResult, Grade, Subject, academic_year_label, acurrent_academic_year,
+)
+from .publishing import apublished_results, snapshot_card
+from .report_card import ReportCard, card_from_form_grades, empty_report_card
+
+TRANSCRIPT_TERMS = [code for code, _ in Grade.TERM_CHOICES]
+
+
+@dataclass(frozen=True)
+class TranscriptRow:
+    subject_name: str
+    results: tuple  # SubjectResult, or None where the subject has no grade that term
+    change: float | None  # latest score minus earliest, when taken in 2+ terms
+
+    @property
+    def trend(self):
+        if self.change is None:
+            return ''
+        return 'up' if self.change > 0 else 'down' if self.change < 0 else 'same'
+
+
+@dataclass(frozen=True)
+class Transcript:
+    student_id: int
+    academic_year: int
+    cards: tuple  # one ReportCard per term, in term order
+    rows: tuple  # one TranscriptRow per subject, in curriculum order
+
+    @property
+    def year_label(self):
+        return academic_year_label(self.academic_year)
+
+    @property
+    def average_scores(self):
+        """Mean score per term (None for terms without grades)."""
+        return tuple(
+            round(sum(s.score for s in card.subjects) / len(card.subjects), 1) if card.subjects else None
+            for card in self.cards
+        )
+
+
+def _year_grades(form, terms, year=None):
+    return (
+        Grade.objects.current(year).filter(student__form=form, term__in=terms).order_by()
+        .select_related('subject').only('student', 'subject__name', 'term', 'score')
+    )
+
+
+def student_in_form(student, form):
+    """An unsaved copy of ``student`` placed in ``form``, e.g. the one they were in a closed year."""
+    if form == student.form:
+        return student
+    past = copy.copy(student)
+    past.form, past.is_senior = form, form in SENIOR_FORMS
+    return past
+
+
+async def _aarchived_grades(year, form, terms):
+    """A closed year's ArchivedGrade rows for ``form`` as unsaved Grades, ready to rank.
+
+    Students and subjects deleted since keep their own keys, by student ID
+    and subject name.
+    """
+    rows = (ArchivedGrade.objects.filter(academic_year=year, form=form, term__in=terms).order_by()
+            .values_list('student_id', 'student_code', 'subject_id', 'subject_name', 'term', 'score'))
+    removed = {}
+    grades = []
+    async for student_id, student_code, subject_id, subject_name, term, score in rows:
+        if student_id is None:
+            student_id = removed.setdefault(('student', student_code), -len(removed) - 1)
+        if subject_id is None:
+            subject_id = removed.setdefault(('subject', subject_name), -len(removed) - 1)
+        grades.append(Grade(student_id=student_id, subject=Subject(pk=subject_id, name=subject_name),
+                            term=term, score=score, academic_year=year))
+    return grades
+
+
+def _rows(cards, order):
+    by_subject = {}
+    for i, card in enumerate(cards):
+        for result in card.subjects:
+            by_subject.setdefault(result.subject_id, [None] * len(cards))[i] = result
+    rows = []
+    for subject_id, results in by_subject.items():
+        taken = [r for r in results if r is not None]
+        change = round(taken[-1].score - taken[0].score, 2) if len(taken) > 1 else None
+        row = TranscriptRow(taken[0].subject_name, tuple(results), change)
+        rows.append(((order.get(subject_id, len(order)), row.subject_name.lower()), row))
+    return tuple(row for _, row in sorted(rows, key=lambda item: item[0]))
+
+
+def _assemble_transcript(student, grades, published, order, year):
+    by_term = {}
+    for g in grades:
+        by_term.setdefault(g.term, []).append(g)
+
+    cards = []
+    for term in TRANSCRIPT_TERMS:
+        if term in published:
+            cards.append(published[term])
+            continue
+        cards.append(card_from_form_grades(student, term, by_term.get(term, []), order))
+    return Transcript(student.pk, year, tuple(cards), _rows(cards, order))
+
+
+async def abuild_transcript(student, published=None, year=None):
+    """Compute a student's Transcript (one grades query for all unpublished terms).
+
+    ``published`` maps term -> ReportCard for terms served from snapshots.
+    A closed ``year`` reads the archive, with ``student`` in that year's form.
+    """
+    published = published or {}
+    live_terms = [t for t in TRANSCRIPT_TERMS if t not in published]
+    if year is None:
+        year = await acurrent_academic_year()
+        grades = [g async for g in _year_grades(student.form, live_terms, year)] if live_terms else []
+    else:
+        grades = await _aarchived_grades(year, student.form, live_terms) if live_terms else []
+    return _assemble_transcript(student, grades, published, await asubject_order(student.form), year)
+
+
+async def atranscript_state(student):
+    """Return (form, published cards by term, version) for a transcript.
+
+    ``version`` covers every grade in the form this year and every current
+    publication; it drives both the ETag and the cache keys.  There is no
+    Last-Modified: the latest ``updated_at`` stays put when grades are
+    deleted.
+    """
+    published, stamps = {}, []
+    for term, (publication, snapshot) in (await apublished_results(student)).items():
+        published[term] = snapshot_card(snapshot) if snapshot else empty_report_card(student, term)
+        stamps.append(f"{term}@{publication.pk}:{publication.published_at.isoformat()}")
+    year = await acurrent_academic_year()
+    stats = await Grade.objects.current(year).filter(student__form=student.form).order_by().aaggregate(
+        last_modified=Max('updated_at'), count=Count('id'))
+    raw = (f"{student.pk}:{student.first_name}:{student.last_name}:{student.form}:"
+           f"{year}:{stats['last_modified']}:{stats['count']}:{','.join(stamps)}")
+    return student.form, published, hashlib.md5(raw.encode()).hexdigest()
+
+
+async def aarchived_transcript_state(student, year):
+    """Return (form, published cards by term, version) for a closed year.
+
+    ``form`` is the one the student was in that year, or None when nothing
+    of theirs was archived for it.
+    """
+    results = [
+        r async for r in ArchivedResult.objects.filter(student=student, academic_year=year).order_by('term')
+        .only('term', 'form', 'data')
+    ]
+    form = results[-1].form if results else await (
+        ArchivedGrade.objects.filter(student=student, academic_year=year).values_list('form', flat=True).afirst()
+    )
+    if form is None:
+        return None, {}, None
+    published = {r.term: ReportCard.from_dict(r.data) for r in results}
+    stats = await ArchivedGrade.objects.filter(academic_year=year, form=form).order_by().aaggregate(
+        last_modified=Max('updated_at'), count=Count('id'))
+    raw = (f"{student.pk}:{student.first_name}:{student.last_name}:{form}:{year}:"
+           f"{stats['last_modified']}:{stats['count']}:{','.join(published)}")
+    return form, published, hashlib.md5(raw.encode()).hexdigest()
+
+
+async def aget_transcript(student, published, version, year=None):
+    timeout = getattr(settings, 'TRANSCRIPT_CACHE_SECONDS', 0)
+    if not timeout:
+        return await abuild_transcript(student, published, year)
+    key = f"transcript:{student.pk}:{version}"
+    transcript = await cache.aget(key)
+    record_cache('transcript', transcript is not None)
+    if transcript is None:
+        transcript = await abuild_transcript(student, published, year)
+        await cache.aset(key, transcript, timeout)
+    return transcript
+
+
+async def acached_pdf(student, version, render):
+    """Return PDF bytes for this transcript version, calling ``render()`` on a miss."""
+    timeout = getattr(settings, 'TRANSCRIPT_CACHE_SECONDS', 0)
+    if not timeout:
+        return await render()
+    key = f"transcript_pdf:{student.pk}:{version}"
+    pdf_bytes = await cache.aget(key)
+    record_cache('transcript_pdf', pdf_bytes is not None)
+    if pdf_bytes is None:
+        pdf_bytes = await render()
+        await cache.aset(key, pdf_bytes, timeout)
+    return pdf_bytes
+
+
+def transcript_context(student, transcript):
+    """Template context for grades/transcript.html and grades/transcript_pdf.html."""
+    return {
+        'student': student,
+        'transcript': transcript,
+        'cards': transcript.cards,
+        'rows': transcript.rows,
+        'averages': transcript.average_scores,
+        'is_senior': student.is_senior,
+        'year_label': transcript.year_label,
+        'current_date': timezone.now().strftime("%B %d, %Y"),
+    }
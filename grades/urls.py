@@ -9,6 +9,8 @@ urlpatterns = [
     path('', views.home, name='home'),
     path('student/<int:pk>/', views.student_detail, name='student_detail'),
     path('api/grades/', views.api_grades, name='api_grades'),
+    path('api/report-card/', views.api_report_card, name='api_report_card'),
+    path('api/students/search/', views.student_search_api, name='student_search'),
 
     # Student authentication and portal
     path('student/login/', views.student_login, name='student_login'),
@@ -16,13 +18,23 @@ urlpatterns = [
     path('dashboard/', views.dashboard, name='dashboard'),
     path('student/grades/', views.student_grades, name='student_grades'),
     path('student/profile/', views.student_profile, name='student_profile'),
+    path('student/transcript/', views.student_transcript, name='student_transcript'),
     
     # PDF downloads (student)
     path('grades/download/', views.download_report_pdf, name='download_report_pdf'),
+    path('grades/download/transcript/', views.download_transcript_pdf, name='download_transcript_pdf'),
     
     # Admin/Teacher reports section
     path('reports/dashboard/', views.admin_dashboard, name='admin_dashboard'),
     path('reports/bulk-download/', views.bulk_download_reports, name='bulk_download_reports'),
     path('reports/class-ranking/', views.class_ranking_report, name='class_ranking'),
     path('reports/class-ranking-pdf/', views.download_class_ranking_pdf, name='download_class_ranking_pdf'),
+    path('reports/class-ranking-export/', views.export_class_ranking, name='export_class_ranking'),
+    path('reports/class-ranking-live/', views.class_ranking_live, name='class_ranking_live'),
+    path('reports/subject-stats/', views.subject_stats_api, name='subject_stats'),
+    path('reports/analytics/', views.analytics_api, name='analytics'),
+    path('reports/publish/', views.publish_term_results, name='publish_term'),
+    path('reports/profiles/', views.profile_captures, name='profiles'),
+    path('reports/profiles/<str:filename>', views.download_profile_capture, name='download_profile'),
+    path('metrics', views.metrics, name='metrics'),
 ]
\ No newline at end of file
@@ -1,23 +1,52 @@
 # grades/views.py
 from django.shortcuts import render, get_object_or_404, redirect
-from django.http import JsonResponse, HttpResponse
-from django.contrib.auth import authenticate, login, logout, get_user_model
+from django.http import FileResponse, Http404, JsonResponse, HttpResponse, StreamingHttpResponse
+from django.contrib.auth import authenticate, login, logout
 from django.contrib.auth.decorators import login_required, user_passes_test
 from django.contrib.auth.forms import PasswordResetForm
+from django.conf import settings
+from django.contrib import messages
 from django.utils import timezone
+from django.utils.cache import patch_cache_control
 from django.template.loader import render_to_string
-from django.db.models import Avg, Q
-import os
+from django.views.decorators.http import condition, require_POST
+from django.db.models import Q
+from asgiref.sync import sync_to_async
+from functools import wraps
+import hashlib
+import hmac
 import io
+import os
+import tempfile
+import time
 from zipfile import ZipFile
 from io import BytesIO
 
 # Import your models
-from .models import Student, Subject, Grade, UserProfile
-
-# Set WeasyPrint DLL path at the module level
-os.environ['WEASYPRINT_DLL_DIRECTORIES'] = r'C:\Program Files\GTK3-Runtime Win64\bin'
-os.environ['PATH'] = r'C:\Program Files\GTK3-Runtime Win64\bin;' + os.environ.get('PATH', '')
+from .models import (
+    SENIOR_FORMS, Student, Grade, UserProfile, academic_year_label, acurrent_academic_year,
+)
+from .pdf import render_pdf, arender_pdf
+from .throttle import RenderBusy, busy_response, pdf_slots
+from .profiling import can_profile, capture_path, list_captures
+from .metrics import record_bulk_job, render_exposition
+from .search import search_students
+from .stats import subject_statistics
+from .curriculum import subjects_for_form
+from .exports import EXPORT_FORMATS, XLSX_CONTENT_TYPE, astream, csv_lines, file_blocks, write_xlsx
+from .live import ranking_events
+from .rollups import GROUP_FIELDS, rollup_summary
+from .report_card import (
+    aget_report_card, aresults_version, build_form_report_cards, empty_report_card, get_report_card,
+    prime_report_cards, report_pdf_context, results_page_context,
+)
+from .archive import aarchived_years
+from .transcript import (
+    aarchived_transcript_state, acached_pdf, aget_transcript, atranscript_state, student_in_form, transcript_context,
+)
+from .publishing import (
+    apublication_for, asnapshot_for, current_publications, snapshot_card, start_publish_term,
+)
 
 
 def _get_logged_student(request):
@@ -31,6 +60,129 @@ def _get_logged_student(request):
         return None
 
 
+async def _aget_logged_student(request):
+    """Async counterpart of _get_logged_student for async views.
+
+    The result is memoised on the request so decorators and the view share
+    one lookup.
+    """
+    if hasattr(request, '_logged_student'):
+        return request._logged_student
+    user = await request.auser()
+    student = None
+    if user.is_authenticated:
+        try:
+            student = await Student.objects.aget(user=user)
+        except Student.DoesNotExist:
+            pass
+    request._logged_student = student
+    return student
+
+
+async def _aresults_validators(request):
+    """Return (etag, last_modified) for the logged-in student's term results.
+
+    Positions depend on every grade in the form, so the ETag covers the
+    whole form/term: the latest grade change plus the grade count (which
+    catches deletions).  Live results send no Last-Modified: the latest
+    ``updated_at`` does not move when a grade is deleted or changed by
+    ``QuerySet.update()``, so If-Modified-Since alone could answer 304 for a
+    changed page.
+    """
+    student = await _aget_logged_student(request)
+    if not student:
+        return None, None
+    term = request.GET.get('term', 'T1')
+
+    # Published terms are frozen: the publication alone identifies the content.
+    publication = request.results_publication = await apublication_for(term)
+    if publication:
+        raw = f"pub:{publication.pk}:{publication.published_at.isoformat()}:{student.pk}"
+        return 'W/"%s"' % hashlib.md5(raw.encode()).hexdigest(), publication.published_at
+
+    request.results_version = await aresults_version(student.form, term)
+    last_modified, count = request.results_version
+    raw = (f"{student.pk}:{student.first_name}:{student.last_name}:{student.form}:"
+           f"{term}:{last_modified}:{count}")
+    etag = 'W/"%s"' % hashlib.md5(raw.encode()).hexdigest()
+    return etag, None
+
+
+def _conditional_on(validators):
+    """Build a decorator answering unchanged requests with 304 before the view runs.
+
+    ``condition()`` calls its validator functions synchronously, so the
+    async ``validators(request)`` is awaited first and its (etag,
+    last_modified) handed over on the request.
+    """
+    def decorator(view):
+        conditional_view = condition(
+            etag_func=lambda request, *args, **kwargs: request.results_validators[0],
+            last_modified_func=lambda request, *args, **kwargs: request.results_validators[1],
+        )(view)
+
+        @wraps(view)
+        async def inner(request, *args, **kwargs):
+            request.results_validators = await validators(request)
+            response = await conditional_view(request, *args, **kwargs)
+            # Per-student content: never share it, and always revalidate.
+            patch_cache_control(response, private=True, no_cache=True)
+            return response
+        return inner
+    return decorator
+
+
+async def _atranscript_year(request):
+    """The closed academic year asked for with ?year=, or None for the current year."""
+    try:
+        year = int(request.GET['year'])
+    except (KeyError, ValueError):
+        return None
+    return year if year < await acurrent_academic_year() else None
+
+
+async def _atranscript_validators(request):
+    """(etag, last_modified) for the logged-in student's transcript; the ETag is the only validator."""
+    student = await _aget_logged_student(request)
+    if not student:
+        return None, None
+    year = request.transcript_year = await _atranscript_year(request)
+    if year is None:
+        request.transcript_state = await atranscript_state(student)
+    else:
+        request.transcript_state = await aarchived_transcript_state(student, year)
+    _, _, version = request.transcript_state
+    return (f'W/"{version}"' if version else None), None
+
+
+results_conditional = _conditional_on(_aresults_validators)
+transcript_conditional = _conditional_on(_atranscript_validators)
+
+
+async def _aterm_result(request, student, term, with_pdf=False):
+    """Return (card, snapshot) for the student's term.
+
+    Once a term is published only its snapshot is read (snapshot is None for
+    students added after publication, who get an empty card); otherwise the
+    card is computed live.
+    """
+    publication = getattr(request, 'results_publication', None)
+    if publication is None:
+        card = await aget_report_card(student, term, request, getattr(request, 'results_version', None))
+        return card, None
+    snapshot = await asnapshot_for(publication, student, with_pdf=with_pdf)
+    if snapshot is None:
+        return empty_report_card(student, term), None
+    return snapshot_card(snapshot), snapshot
+
+
+# Templates and context processors still query the database synchronously,
+# so async views render through a worker thread.
+_arender = sync_to_async(render)
+# Pending messages are only shown by a live render, not by a stored page
+_ahas_messages = sync_to_async(lambda request: len(messages.get_messages(request)) > 0)
+
+
 def home(request):
     """School homepage / landing page."""
     return render(request, 'grades/home.html')
@@ -46,11 +198,11 @@ def student_detail(request, pk):
     })
 
 
-def api_grades(request):
+async def api_grades(request):
     """Return a JSON list of grades with student and subject info."""
     qs = Grade.objects.select_related('student', 'subject').all()
     data = []
-    for g in qs:
+    async for g in qs:
         data.append({
             'id': g.id,
             'student': {
@@ -78,93 +230,10 @@ def student_login(request):
                 'error': 'Please provide username and password'
             })
 
+        # Student ID / first-name logins are handled by StudentBackend, which
+        # only writes on a student's first sign-in
         user = authenticate(request, username=username, password=password)
-        
         if user is None:
-            # Fallback: support two student login methods
-            student = None
-            
-            # Try match by student_id first
-            try:
-                student = Student.objects.get(student_id=username)
-            except Student.DoesNotExist:
-                # Try match by first name (case-insensitive) and assigned_password
-                try:
-                    student = Student.objects.get(
-                        first_name__iexact=username,
-                        assigned_password=password
-                    )
-                except Student.DoesNotExist:
-                    student = None
-
-            if student:
-                User = get_user_model()
-                
-                # Ensure there's a linked Django user
-                if student.user:
-                    u = student.user
-                else:
-                    username_field = f"stu_{student.student_id}"
-                    if not User.objects.filter(username=username_field).exists():
-                        u = User.objects.create_user(
-                            username=username_field,
-                            email=f'{student.student_id}@example.com'
-                        )
-                        u.set_unusable_password()
-                        u.save()
-                        student.user = u
-                        student.save()
-                    else:
-                        u = User.objects.get(username=username_field)
-
-                # If the student matched via the student's ID used as password
-                if student and student.first_name.lower() == username.lower() and password == student.student_id:
-                    # Set the user's password to the student_id and log them in
-                    u.set_password(password)
-                    u.save()
-                    login(request, u, backend='django.contrib.auth.backends.ModelBackend')
-                    return redirect('grades:dashboard')
-
-                # If the student matched via teacher-assigned password
-                if (student and student.assigned_password and 
-                    student.first_name.lower() == username.lower() and 
-                    student.assigned_password == password):
-                    
-                    # Ensure linked user exists
-                    username_field = f"stu_{student.student_id}"
-                    User = get_user_model()
-                    if not student.user:
-                        if not User.objects.filter(username=username_field).exists():
-                            u = User.objects.create_user(
-                                username=username_field,
-                                email=f'{student.student_id}@example.com'
-                            )
-                        else:
-                            u = User.objects.get(username=username_field)
-                        student.user = u
-                        student.save()
-                    else:
-                        u = student.user
-
-                    # Set the user's password to the assigned password and log them in
-                    u.set_password(password)
-                    u.save()
-                    login(request, u, backend='django.contrib.auth.backends.ModelBackend')
-                    return redirect('grades:dashboard')
-
-                # If the user has no usable password, auto-assign temporary password
-                if not u.has_usable_password():
-                    temp_password = student.student_id
-                    u.set_password(temp_password)
-                    u.save()
-                    login(request, u, backend='django.contrib.auth.backends.ModelBackend')
-                    return redirect('grades:dashboard')
-
-                # User has a usable password but authentication failed
-                return render(request, 'grades/student_login.html', {
-                    'error': 'Invalid credentials'
-                })
-
             return render(request, 'grades/student_login.html', {
                 'error': 'Invalid credentials'
             })
@@ -182,181 +251,109 @@ def student_logout(request):
 
 
 @login_required
-def dashboard(request):
+async def dashboard(request):
     """Student dashboard."""
-    student = _get_logged_student(request)
+    student = await _aget_logged_student(request)
     if not student:
         return redirect('grades:student_login')
-    return render(request, 'grades/dashboard.html', {'student': student})
+    return await _arender(request, 'grades/dashboard.html', {'student': student})
 
 
 @login_required
-def student_grades(request):
+@results_conditional
+async def student_grades(request):
     """View student grades for a specific term."""
-    student = _get_logged_student(request)
+    student = await _aget_logged_student(request)
     if not student:
         return redirect('grades:student_login')
     
     # Allow selecting a term via ?term=T1|T2|T3 (default T1)
     term = request.GET.get('term', 'T1')
-    qs = student.grades.select_related('subject').filter(term=term)
+    card, snapshot = await _aterm_result(request, student, term)
+    if snapshot is not None and snapshot.html and not await _ahas_messages(request):
+        return HttpResponse(snapshot.html)
 
-    grades = []
-    for g in qs:
-        score = float(g.score)
-        grade_label = g.grade_label()
-        
-        # Determine grade details based on student level
-        if not student.is_senior:
-            # Junior student grading
-            if score >= 80:
-                short_grade = 'A'
-                comment = 'EXCELLENT'
-            elif score >= 70:
-                short_grade = 'B'
-                comment = 'VERY GOOD'
-            elif score >= 60:
-                short_grade = 'C'
-                comment = 'GOOD'
-            elif score >= 50:
-                short_grade = 'D'
-                comment = 'PASS'
-            else:
-                short_grade = 'F'
-                comment = 'FAIL'
-        else:
-            # Senior student grading
-            sp = g.senior_point()
-            short_grade = str(sp) if sp is not None else ''
-            if sp == 1 or sp == 2:
-                comment = 'DISTINCTION'
-            elif sp == 3:
-                comment = 'STRONG CREDIT'
-            elif sp in (4, 5, 6):
-                comment = 'CREDIT'
-            elif sp in (7, 8):
-                comment = 'PASS'
-            elif sp == 9:
-                comment = 'FAIL'
-            else:
-                comment = ''
-
-        grades.append({
-            'grade_obj': g,
-            'subject': g.subject,
-            'score': score,
-            'grade_label': grade_label,
-            'short_grade': short_grade,
-            'comment': comment,
-            'senior_point': g.senior_point(),
-            'is_pass': g.is_pass(),
-            'created_at': g.created_at,
-        })
+    return await _arender(request, 'grades/student_grades.html', results_page_context(student, card))
 
-    # Compute per-subject positions
-    for item in grades:
-        gobj = item['grade_obj']
-        subject = gobj.subject
-        
-        # Get scores for this subject/form/term sorted descending
-        scores_qs = Grade.objects.filter(
-            subject=subject,
-            term=term,
-            student__form=student.form
-        ).values_list('score', flat=True).distinct().order_by('-score')
-        
-        scores = [float(s) for s in scores_qs]
-        try:
-            pos = scores.index(item['score']) + 1
-        except ValueError:
-            pos = None
-        item['position'] = pos
-
-    # Compute overall position in class for the term
-    students_in_form = Student.objects.filter(form=student.form)
-    student_metrics = {}
-
-    if student.is_senior:
-        # For seniors: calculate total points (lower is better)
-        for s in students_in_form:
-            total_points = 0
-            senior_grades = s.grades.filter(term=term)
-            if senior_grades.exists():
-                points = [g.senior_point() for g in senior_grades if g.senior_point() is not None]
-                if len(points) >= 6:
-                    points.sort()
-                    total_points = sum(points[:6])  # Best 6 points
-                    student_metrics[s.id] = total_points
-    else:
-        # For juniors: calculate average score (higher is better)
-        for s in students_in_form:
-            avg_result = s.grades.filter(term=term).aggregate(Avg('score'))
-            if avg_result['score__avg'] is not None:
-                student_metrics[s.id] = float(avg_result['score__avg'])
-
-    # Determine rankings
-    overall_position = None
-    if student_metrics:
-        if student.is_senior:
-            # For seniors: sort by total points ascending (lower is better)
-            sorted_students = sorted(student_metrics.items(), key=lambda x: x[1])
-        else:
-            # For juniors: sort by average score descending (higher is better)
-            sorted_students = sorted(student_metrics.items(), key=lambda x: x[1], reverse=True)
-        
-        # Find student's position
-        for idx, (stu_id, score_val) in enumerate(sorted_students, 1):
-            if stu_id == student.id:
-                overall_position = idx
-                break
-
-    term_display = {'T1': 'Term 1', 'T2': 'Term 2', 'T3': 'Term 3'}.get(term, term)
 
-    # Summary calculations
-    passed_count = sum(1 for g in grades if g['is_pass'])
+@login_required
+@results_conditional
+async def api_report_card(request):
+    """Return the logged-in student's term result as JSON."""
+    student = await _aget_logged_student(request)
+    if not student:
+        return JsonResponse({'error': 'Not a student account'}, status=403)
+    term = request.GET.get('term', 'T1')
+    card, _ = await _aterm_result(request, student, term)
+    return JsonResponse({
+        'student': {
+            'student_id': student.student_id,
+            'name': f'{student.first_name} {student.last_name}',
+            'form': student.form,
+        },
+        'report_card': card.as_dict(),
+    })
 
-    # Find English subject
-    english = next((g for g in grades if g['subject'].name.lower() == 'english'), None)
 
-    if student.is_senior:
-        # Calculate total points for seniors
-        total_points = None
-        overall_result = 'Fail'
-        
-        if english and english['senior_point'] is not None:
-            other_points = [g['senior_point'] for g in grades 
-                          if g['subject'].name.lower() != 'english' 
-                          and g['senior_point'] is not None]
-            other_points.sort()
-            needed = max(0, 6 - 1)
-            selected = [english['senior_point']] + other_points[:needed]
-            total_points = sum(selected)
-            overall_result = 'Pass' if (passed_count >= 6 and english['is_pass']) else 'Fail'
-        else:
-            overall_result = 'Fail - missing English'
-    else:
-        total_points = None
-        overall_result = 'Pass' if (passed_count >= 6 and english and english['is_pass']) else 'Fail'
+@login_required
+@transcript_conditional
+async def student_transcript(request):
+    """All of a year's terms side by side, with positions and trends.
 
-    return render(request, 'grades/student_grades.html', {
-        'student': student,
-        'grades': grades,
-        'passed_count': passed_count,
-        'total_points': total_points,
-        'overall_result': overall_result,
-        'term': term,
-        'overall_position': overall_position,
-        'term_display': term_display,
+    This year by default; ``?year=`` shows a closed year from the archive.
+    """
+    student = await _aget_logged_student(request)
+    if not student:
+        return redirect('grades:student_login')
+    form, published, version = request.transcript_state
+    if form is None:
+        raise Http404("No archived results for that year.")
+    archived_years = await aarchived_years(student)
+    student = student_in_form(student, form)
+    transcript = await aget_transcript(student, published, version, request.transcript_year)
+    context = transcript_context(student, transcript)
+    context.update({
+        'archived_year': request.transcript_year,
+        'archived_years': [(year, academic_year_label(year)) for year in archived_years],
+        'current_year_label': academic_year_label(await acurrent_academic_year()),
     })
+    return await _arender(request, 'grades/transcript.html', context)
 
 
 @login_required
-def student_profile(request):
+@transcript_conditional
+async def download_transcript_pdf(request):
+    """The year transcript (or a closed year's, with ``?year=``) as one PDF, cached per version."""
+    student = await _aget_logged_student(request)
+    if not student:
+        return redirect('grades:student_login')
+    form, published, version = request.transcript_state
+    if form is None:
+        raise Http404("No archived results for that year.")
+    student = student_in_form(student, form)
+    transcript = await aget_transcript(student, published, version, request.transcript_year)
+
+    async def render():
+        async with pdf_slots().aacquire():
+            return await arender_pdf('grades/transcript_pdf.html', transcript_context(student, transcript))
+
+    try:
+        pdf_bytes = await acached_pdf(student, version, render)
+    except RenderBusy as e:
+        return busy_response(e)
+    response = HttpResponse(pdf_bytes, content_type='application/pdf')
+    filename = f"Transcript_{student.student_id}_{transcript.year_label.replace('/', '-')}.pdf"
+    response['Content-Disposition'] = f'attachment; filename="{filename}"'
+    return response
+
+
+@login_required
+async def student_profile(request):
     """View student profile."""
-    student = _get_logged_student(request)
+    student = await _aget_logged_student(request)
     if not student:
         return redirect('grades:student_login')
-    return render(request, 'grades/student_profile.html', {'student': student})
+    return await _arender(request, 'grades/student_profile.html', {'student': student})
 
 
 def can_print_reports(user):
@@ -371,136 +368,19 @@ def can_print_reports(user):
 
 def generate_student_pdf(student, term, request=None):
     """Generate PDF for a single student (reusable function)."""
-    from weasyprint import HTML
-    from weasyprint.text.fonts import FontConfiguration
-    
-    term_display = {'T1': 'Term 1', 'T2': 'Term 2', 'T3': 'Term 3'}.get(term, term)
-    
-    # Get student grades for the term
-    qs = student.grades.select_related('subject').filter(term=term)
-    
-    grades = []
-    for g in qs:
-        score = float(g.score)
-        if not student.is_senior:
-            # Junior grading
-            if score >= 80:
-                short_grade = 'A'
-                comment = 'EXCELLENT'
-            elif score >= 70:
-                short_grade = 'B'
-                comment = 'VERY GOOD'
-            elif score >= 60:
-                short_grade = 'C'
-                comment = 'GOOD'
-            elif score >= 50:
-                short_grade = 'D'
-                comment = 'PASS'
-            else:
-                short_grade = 'F'
-                comment = 'FAIL'
-        else:
-            # Senior grading
-            sp = g.senior_point()
-            short_grade = str(sp) if sp is not None else ''
-            if sp == 1 or sp == 2:
-                comment = 'DISTINCTION'
-            elif sp == 3:
-                comment = 'STRONG CREDIT'
-            elif sp in (4, 5, 6):
-                comment = 'CREDIT'
-            elif sp in (7, 8):
-                comment = 'PASS'
-            elif sp == 9:
-                comment = 'FAIL'
-            else:
-                comment = ''
-        
-        grades.append({
-            'subject': g.subject,
-            'score': score,
-            'short_grade': short_grade,
-            'comment': comment,
-            'is_pass': g.is_pass(),
-        })
-    
-    # Calculate passed count
-    passed_count = sum(1 for g in grades if g['is_pass'])
-    
-    # Calculate class position
-    overall_position = None
-    students_in_form = Student.objects.filter(form=student.form)
-    
-    if student.is_senior:
-        # Senior position calculation
-        student_scores = {}
-        for s in students_in_form:
-            total_points = 0
-            senior_grades = s.grades.filter(term=term)
-            if senior_grades.exists():
-                points = [g.senior_point() for g in senior_grades if g.senior_point() is not None]
-                if len(points) >= 6:
-                    points.sort()
-                    total_points = sum(points[:6])
-                    student_scores[s.id] = total_points
-        
-        if student_scores:
-            sorted_students = sorted(student_scores.items(), key=lambda x: x[1])
-            for idx, (stu_id, score_val) in enumerate(sorted_students, 1):
-                if stu_id == student.id:
-                    overall_position = idx
-                    break
-    else:
-        # Junior position calculation
-        student_scores = {}
-        for s in students_in_form:
-            avg_result = s.grades.filter(term=term).aggregate(Avg('score'))
-            if avg_result['score__avg'] is not None:
-                student_scores[s.id] = float(avg_result['score__avg'])
-        
-        if student_scores:
-            sorted_students = sorted(student_scores.items(), key=lambda x: x[1], reverse=True)
-            for idx, (stu_id, score_val) in enumerate(sorted_students, 1):
-                if stu_id == student.id:
-                    overall_position = idx
-                    break
-    
-    # Determine overall result
-    english_passed = any(g for g in grades if g['subject'].name.lower() == 'english' and g['is_pass'])
-    overall_result = 'PASS' if (passed_count >= 6 and english_passed) else 'FAIL'
-    
-    context = {
-        'student': student,
-        'grades': grades,
-        'passed_count': passed_count,
-        'total_subjects': len(grades),
-        'overall_position': overall_position,
-        'overall_result': overall_result,
-        'term': term,
-        'term_display': term_display,
-        'current_date': timezone.now().strftime("%B %d, %Y"),
-    }
-    
+    context = report_pdf_context(student, get_report_card(student, term, request))
     try:
-        # Render the PDF template
-        html_string = render_to_string('grades/report_pdf.html', context)
-        
-        # Generate PDF
-        font_config = FontConfiguration()
-        html = HTML(string=html_string)
-        pdf_bytes = html.write_pdf(font_config=font_config)
-        
-        return pdf_bytes
-        
+        return render_pdf('grades/report_pdf.html', context)
     except Exception as e:
         print(f"Error generating PDF: {str(e)}")
         return None
 
 
 @login_required
-def download_report_pdf(request):
+@results_conditional
+async def download_report_pdf(request):
     """Generate PDF using WeasyPrint."""
-    student = _get_logged_student(request)
+    student = await _aget_logged_student(request)
     if not student:
         return redirect('grades:student_login')
     
@@ -508,7 +388,14 @@ def download_report_pdf(request):
     term = request.GET.get('term', 'T1')
     
     try:
-        pdf_bytes = generate_student_pdf(student, term, request)
+        card, snapshot = await _aterm_result(request, student, term, with_pdf=True)
+        if snapshot is not None and snapshot.pdf:
+            pdf_bytes = bytes(snapshot.pdf)
+        else:
+            # WeasyPrint runs on the PDF render pool, off the event loop, and
+            # only once a node-wide render slot is free
+            async with pdf_slots().aacquire():
+                pdf_bytes = await arender_pdf('grades/report_pdf.html', report_pdf_context(student, card))
         
         if pdf_bytes:
             # Return PDF response
@@ -520,6 +407,8 @@ def download_report_pdf(request):
         else:
             return HttpResponse('Failed to generate PDF', status=500)
             
+    except RenderBusy as e:
+        return busy_response(e)
     except Exception as e:
         import traceback
         return HttpResponse(f'PDF Generation Error: {str(e)}<br>{traceback.format_exc()}', status=500)
@@ -552,40 +441,22 @@ def bulk_download_reports(request):
     
     if not students.exists():
         return HttpResponse("No students found in this form.", status=404)
+
+    # Rank the form once and compute every card from a single grades query
+    prime_report_cards(request, build_form_report_cards(students, form, term))
     
     # Create a ZIP file in memory
     zip_buffer = io.BytesIO()
     term_display = {'T1': 'Term1', 'T2': 'Term2', 'T3': 'Term3'}.get(term, term)
     
-    with ZipFile(zip_buffer, 'w') as zip_file:
-        successful = 0
-        failed = 0
-        
-        for student in students:
-            try:
-                # Generate individual PDF for each student
-                pdf_content = generate_student_pdf(student, term, request)
-                if pdf_content:
-                    filename = f"Report_{student.student_id}_{student.last_name}_{term_display}.pdf"
-                    zip_file.writestr(filename, pdf_content)
-                    successful += 1
-                else:
-                    failed += 1
-            except Exception as e:
-                failed += 1
-                print(f"Error generating PDF for {student}: {str(e)}")
-                continue
-        
-        # Add a summary file
-        summary = f"Report Generation Summary\n"
-        summary += f"========================\n"
-        summary += f"Form: {form}\n"
-        summary += f"Term: {term_display}\n"
-        summary += f"Total Students: {students.count()}\n"
-        summary += f"Successfully Generated: {successful}\n"
-        summary += f"Failed: {failed}\n"
-        summary += f"Generated on: {timezone.now().strftime('%Y-%m-%d %H:%M:%S')}\n"
-        zip_file.writestr("GENERATION_SUMMARY.txt", summary)
+    try:
+        # The whole batch renders sequentially in one render slot
+        with pdf_slots().acquire(), ZipFile(zip_buffer, 'w') as zip_file:
+            started = time.perf_counter()
+            successful = _write_report_zip(zip_file, request, students, form, term, term_display)
+            record_bulk_job(successful, time.perf_counter() - started)
+    except RenderBusy as e:
+        return busy_response(e)
     
     # Return ZIP file
     zip_buffer.seek(0)
@@ -593,6 +464,40 @@ def bulk_download_reports(request):
     response['Content-Disposition'] = f'attachment; filename="Reports_Form{form}_{term_display}.zip"'
     return response
 
+
+def _write_report_zip(zip_file, request, students, form, term, term_display):
+    """Write every student's report plus a summary file; return the number written."""
+    successful = 0
+    failed = 0
+    
+    for student in students:
+        try:
+            # Generate individual PDF for each student
+            pdf_content = generate_student_pdf(student, term, request)
+            if pdf_content:
+                filename = f"Report_{student.student_id}_{student.last_name}_{term_display}.pdf"
+                zip_file.writestr(filename, pdf_content)
+                successful += 1
+            else:
+                failed += 1
+        except Exception as e:
+            failed += 1
+            print(f"Error generating PDF for {student}: {str(e)}")
+            continue
+    
+    # Add a summary file
+    summary = f"Report Generation Summary\n"
+    summary += f"========================\n"
+    summary += f"Form: {form}\n"
+    summary += f"Term: {term_display}\n"
+    summary += f"Total Students: {len(students)}\n"
+    summary += f"Successfully Generated: {successful}\n"
+    summary += f"Failed: {failed}\n"
+    summary += f"Generated on: {timezone.now().strftime('%Y-%m-%d %H:%M:%S')}\n"
+    zip_file.writestr("GENERATION_SUMMARY.txt", summary)
+    return successful
+
+
 @login_required
 @user_passes_test(can_print_reports)
 def admin_dashboard(request):
@@ -616,7 +521,7 @@ def admin_dashboard(request):
             'code': form_code,
             'name': form_name,
             'stream': stream_display,
-            'is_senior': form_code in ('F3S', 'F3H', 'F4S', 'F4H')
+            'is_senior': form_code in SENIOR_FORMS
         })
     
     # Get statistics
@@ -625,6 +530,18 @@ def admin_dashboard(request):
     
     # Get recent activity
     recent_grades = Grade.objects.select_related('student', 'subject').order_by('-created_at')[:10]
+
+    # School-wide comparisons come from the precomputed rollup table
+    form_codes = [code for code, _ in available_forms]
+    performance_by_form = _pivot_by_term(
+        rollup_summary(('form', 'term'), form__in=form_codes), 'form',
+        [(code, name) for code, name in available_forms],
+    )
+    subject_summary = rollup_summary(('subject', 'term'), form__in=form_codes)
+    subject_names = sorted({row['subject'] for row in subject_summary})
+    performance_by_subject = _pivot_by_term(
+        subject_summary, 'subject', [(name, name) for name in subject_names],
+    )
     
     context = {
         'user_profile': user_profile,
@@ -634,9 +551,142 @@ def admin_dashboard(request):
         'total_grades': total_grades,
         'recent_grades': recent_grades,
         'term_choices': Grade.TERM_CHOICES,
+        'performance_by_form': performance_by_form,
+        'performance_by_subject': performance_by_subject,
+        'release_terms': _release_terms(),
     }
     
     return render(request, 'grades/admin_dashboard.html', context)
+
+
+@login_required
+@require_POST
+def publish_term_results(request):
+    """Start publishing (freezing) or withdrawing a term's results. Administrators only.
+
+    The work runs in ``manage.py publish_term`` in the background; the 202
+    response carries the term's publication as it stands, and the dashboard
+    shows the new one once the command has finished.
+    """
+    try:
+        is_admin = request.user.profile.is_admin
+    except:
+        is_admin = False
+    if not is_admin:
+        return HttpResponse("Only administrators can publish results.", status=403)
+
+    term = request.POST.get('term')
+    if term not in dict(Grade.TERM_CHOICES):
+        return HttpResponse("Unknown term.", status=400)
+    term_display = dict(Grade.TERM_CHOICES)[term]
+
+    action = 'unpublish' if request.POST.get('action') == 'unpublish' else 'publish'
+    start_publish_term(term, unpublish=action == 'unpublish', user=request.user)
+    publication = current_publications().filter(term=term).first()
+    if action == 'unpublish':
+        message = f"Withdrawing {term_display} results; students will see live results shortly."
+    else:
+        message = (f"Publishing {term_display} results in the background. "
+                   f"Then run 'manage.py warm_results {term}' to pre-render pages and PDFs.")
+    return JsonResponse({
+        'term': term,
+        'action': action,
+        'status': 'started',
+        'message': message,
+        'published_at': publication.published_at.isoformat() if publication else None,
+    }, status=202)
+
+
+@login_required
+@user_passes_test(can_profile)
+def profile_captures(request):
+    """List request profiles captured with ?_profile=1."""
+    return render(request, 'grades/profiles.html', {'captures': list_captures()})
+
+
+@login_required
+@user_passes_test(can_profile)
+def download_profile_capture(request, filename):
+    """Download a saved .prof file or its .txt summary."""
+    name, ext = os.path.splitext(filename)
+    path = capture_path(name, ext)
+    if path is None:
+        return HttpResponse("Profile not found.", status=404)
+    return FileResponse(
+        open(path, 'rb'), as_attachment=ext == '.prof', filename=filename,
+        content_type='text/plain; charset=utf-8' if ext == '.txt' else 'application/octet-stream',
+    )
+
+
+def metrics(request):
+    """Prometheus metrics for every worker on this node."""
+    token = settings.METRICS_TOKEN
+    authorised = token and hmac.compare_digest(
+        request.headers.get('Authorization', ''), f'Bearer {token}')
+    if not authorised and not can_profile(request.user):
+        return HttpResponse("Forbidden", status=403)
+    return HttpResponse(render_exposition(), content_type='text/plain; version=0.0.4; charset=utf-8')
+
+
+def _release_terms():
+    """(term code, name, publication or None) for the results-release panel."""
+    publications = {p.term: p for p in current_publications()}
+    return [(code, name, publications.get(code)) for code, name in Grade.TERM_CHOICES]
+
+
+def _pivot_by_term(summary, key, labels):
+    """Arrange rollup summary rows into one row per label with a cell per term."""
+    cells = {(row[key], row['term']): row for row in summary}
+    rows = []
+    for value, name in labels:
+        terms = [cells.get((value, code)) for code, _ in Grade.TERM_CHOICES]
+        if any(terms):
+            rows.append({'name': name, 'terms': terms})
+    return rows
+
+
+@login_required
+@user_passes_test(can_print_reports)
+def analytics_api(request):
+    """Return grade aggregates from the rollup table as JSON.
+
+    ``group_by`` is a comma-separated list of form, stream, subject and term;
+    ``form``, ``stream``, ``subject`` and ``term`` filter the groups.
+    """
+    group_by = [g for g in request.GET.get('group_by', 'form,term').split(',') if g]
+    if not group_by or any(g not in GROUP_FIELDS for g in group_by):
+        return JsonResponse({'error': f"group_by must use {', '.join(GROUP_FIELDS)}"}, status=400)
+
+    filters = {}
+    for param in ('form', 'stream', 'subject', 'term'):
+        value = request.GET.get(param)
+        if value:
+            filters[GROUP_FIELDS[param]] = value
+
+    try:
+        user_profile = request.user.profile
+    except:
+        return JsonResponse({'error': 'User profile error'}, status=403)
+    if user_profile.is_teacher:
+        filters['form__in'] = user_profile.get_responsible_forms()
+
+    return JsonResponse({
+        'group_by': group_by,
+        'groups': rollup_summary(group_by, **filters),
+    })
+
+
+def _term_grades_by_student(students, form, term):
+    """{student pk: [grades in ``term``]} for ``students`` of ``form``, in one query."""
+    by_pk = {student.pk: student for student in students}
+    grouped = {pk: [] for pk in by_pk}
+    for grade in Grade.objects.current().filter(student__form=form, term=term).select_related('subject'):
+        if grade.student_id in by_pk:
+            grade.student = by_pk[grade.student_id]  # is_pass()/senior_point() need it
+            grouped[grade.student_id].append(grade)
+    return grouped
+
+
 @login_required
 @user_passes_test(can_print_reports)
 def class_ranking_report(request):
@@ -667,9 +717,9 @@ def class_ranking_report(request):
     
     # Rest of the function remains similar...
     # Get all students in the selected form
-    students = Student.objects.filter(form=form).order_by('last_name', 'first_name')
+    students = list(Student.objects.filter(form=form).order_by('last_name', 'first_name'))
     
-    if not students.exists():
+    if not students:
         return render(request, 'grades/class_ranking.html', {
             'error': f"No students found in Form {form}",
             'form': form,
@@ -680,22 +730,16 @@ def class_ranking_report(request):
             'term_choices': Grade.TERM_CHOICES,
         })
     
-    # Get all subjects for this form level
-    subjects = Subject.objects.filter(
-        grade__student__form=form,
-        grade__term=term
-    ).distinct().order_by('name')
-    
-    # If no subjects found, get all subjects from the system
-    if not subjects.exists():
-        subjects = Subject.objects.all().order_by('name')
+    # Subject columns come from the curriculum for this form
+    subjects = subjects_for_form(form)
     
     # Prepare student data with rankings
     student_data = []
+    grades_by_student = _term_grades_by_student(students, form, term)
     
     for student in students:
         # Get all grades for this student in the selected term
-        grades = Grade.objects.filter(student=student, term=term).select_related('subject')
+        grades = grades_by_student[student.pk]
         
         # Create a dictionary of subject->grade for this student
         grade_dict = {grade.subject: grade for grade in grades}
@@ -719,7 +763,7 @@ def class_ranking_report(request):
                 ranking_display = "Incomplete"
         else:
             # For juniors: calculate average score (higher is better)
-            if grades.exists():
+            if grades:
                 total_score = sum(float(grade.score) for grade in grades)
                 avg_score = total_score / len(grades)
                 ranking_metric = -avg_score  # Negative for reverse sort
@@ -737,6 +781,7 @@ def class_ranking_report(request):
                 score = float(grade.score)
                 passed = grade.is_pass()
                 subject_scores.append({
+                    'subject_id': subject.pk,
                     'score': score,
                     'display': f"{score:.1f}",
                     'passed': passed,
@@ -746,6 +791,7 @@ def class_ranking_report(request):
             else:
                 # Student didn't take this subject
                 subject_scores.append({
+                    'subject_id': subject.pk,
                     'score': None,
                     'display': 'AB',
                     'passed': False,
@@ -764,7 +810,7 @@ def class_ranking_report(request):
         })
     
     # Sort students by ranking metric
-    if students.exists() and students.first().is_senior:
+    if students[0].is_senior:
         # For seniors: lower points are better (ascending)
         student_data.sort(key=lambda x: x['ranking_metric'] if x['ranking_metric'] != float('inf') else float('inf'))
     else:
@@ -786,14 +832,89 @@ def class_ranking_report(request):
         'students_data': student_data,
         'subjects': subjects,
         'total_students': len(student_data),
-        'is_senior': students.first().is_senior if students.exists() else False,
+        'is_senior': students[0].is_senior,
         'student_form_choices': Student.FORM_CHOICES,
         'term_choices': Grade.TERM_CHOICES,
+        'subject_stats': subject_statistics(form, term),
     }
     
     return render(request, 'grades/class_ranking.html', context)
 
 
+@login_required
+@user_passes_test(can_print_reports)
+async def class_ranking_live(request):
+    """Server-sent events with class ranking rows as grades are saved."""
+    form = request.GET.get('form', 'F1')
+    term = request.GET.get('term', 'T1')
+
+    # Check authorization
+    try:
+        user_profile = await UserProfile.objects.aget(user=await request.auser())
+        if user_profile.is_teacher and form not in user_profile.get_responsible_forms():
+            return HttpResponse("You are not authorized to view reports for this form.", status=403)
+    except:
+        return HttpResponse("User profile error.", status=403)
+
+    response = StreamingHttpResponse(ranking_events(form, term), content_type='text/event-stream')
+    response['Cache-Control'] = 'no-cache'
+    # Tell nginx not to buffer the stream
+    response['X-Accel-Buffering'] = 'no'
+    return response
+
+
+@login_required
+@user_passes_test(can_print_reports)
+def subject_stats_api(request):
+    """Return per-subject score distributions for a form and term as JSON."""
+    form = request.GET.get('form', 'F1')
+    term = request.GET.get('term', 'T1')
+
+    # Check authorization
+    try:
+        user_profile = request.user.profile
+        if user_profile.is_teacher and form not in user_profile.get_responsible_forms():
+            return JsonResponse({'error': 'Not authorized for this form'}, status=403)
+    except:
+        return JsonResponse({'error': 'User profile error'}, status=403)
+
+    return JsonResponse({
+        'form': form,
+        'term': term,
+        'subjects': subject_statistics(form, term),
+    })
+
+
+@login_required
+@user_passes_test(can_print_reports)
+def student_search_api(request):
+    """Autocomplete: students matching ?q= by ID or name prefix, or a close name."""
+    query = request.GET.get('q', '').strip()
+    try:
+        limit = min(int(request.GET.get('limit', 10)), 50)
+    except ValueError:
+        limit = 10
+
+    # Teachers only see students in the forms they are responsible for
+    try:
+        user_profile = request.user.profile
+        forms = user_profile.get_responsible_forms() if user_profile.is_teacher else None
+    except:
+        return JsonResponse({'error': 'User profile error.'}, status=403)
+
+    results = [
+        {
+            'id': student.pk,
+            'student_id': student.student_id,
+            'name': f"{student.first_name} {student.last_name}",
+            'form': student.form,
+            'form_display': student.get_form_display(),
+        }
+        for student in search_students(query, limit, forms)
+    ]
+    return JsonResponse({'query': query, 'results': results})
+
+
 @login_required
 @user_passes_test(can_print_reports)
 def download_class_ranking_pdf(request):
@@ -803,21 +924,16 @@ def download_class_ranking_pdf(request):
     term = request.GET.get('term', 'T1')
     
     # Get all students in the selected form
-    students = Student.objects.filter(form=form).order_by('last_name', 'first_name')
+    students = list(Student.objects.filter(form=form).order_by('last_name', 'first_name'))
     
     # Get subjects
-    subjects = Subject.objects.filter(
-        grade__student__form=form,
-        grade__term=term
-    ).distinct().order_by('name')
-    
-    if not subjects.exists():
-        subjects = Subject.objects.all().order_by('name')
+    subjects = subjects_for_form(form)
     
     # Prepare data for PDF
     student_data = []
+    grades_by_student = _term_grades_by_student(students, form, term)
     for student in students:
-        grades = Grade.objects.filter(student=student, term=term).select_related('subject')
+        grades = grades_by_student[student.pk]
         grade_dict = {grade.subject: grade for grade in grades}
         
         subject_scores = []
@@ -871,14 +987,8 @@ def download_class_ranking_pdf(request):
     }
     
     try:
-        from weasyprint import HTML
-        
-        # Render PDF template
-        html_string = render_to_string('grades/class_ranking_pdf.html', context)
-        
-        # Generate PDF
-        html = HTML(string=html_string)
-        pdf_bytes = html.write_pdf()
+        with pdf_slots().acquire():
+            pdf_bytes = render_pdf('grades/class_ranking_pdf.html', context)
         
         # Return PDF response
         response = HttpResponse(pdf_bytes, content_type='application/pdf')
@@ -886,9 +996,46 @@ def download_class_ranking_pdf(request):
         response['Content-Disposition'] = f'attachment; filename="{filename}"'
         return response
         
+    except RenderBusy as e:
+        return busy_response(e)
     except Exception as e:
         return HttpResponse(f'PDF Generation Error: {str(e)}', status=500)
 
+
+@login_required
+@user_passes_test(can_print_reports)
+def export_class_ranking(request):
+    """Download class ranking sheets as CSV or XLSX for one form or all forms."""
+    form = request.GET.get('form', 'F1')
+    term = request.GET.get('term', 'T1')
+    export_format = request.GET.get('format', 'csv')
+    if export_format not in EXPORT_FORMATS:
+        return HttpResponse("Unsupported export format.", status=400)
+
+    try:
+        allowed = [code for code, _ in get_available_forms_for_user(request.user.profile)]
+        if form != 'ALL' and form not in allowed:
+            return HttpResponse("You are not authorized to view reports for this form.", status=403)
+    except:
+        return HttpResponse("User profile error.", status=403)
+    forms = allowed if form == 'ALL' else [form]
+
+    filename = f"Class_Ranking_{'All_Forms' if form == 'ALL' else 'Form' + form}_{term}.{export_format}"
+    if export_format == 'csv':
+        response = StreamingHttpResponse(astream(csv_lines(forms, term)), content_type='text/csv')
+    else:
+        # openpyxl's write-only workbook spools to disk; send the file as it is read
+        spool = tempfile.TemporaryFile()
+        try:
+            write_xlsx(forms, term, spool)
+        except Exception:
+            spool.close()
+            raise
+        response = StreamingHttpResponse(astream(file_blocks(spool), batch=1), content_type=XLSX_CONTENT_TYPE)
+    response['Content-Disposition'] = f'attachment; filename="{filename}"'
+    return response
+
+
 def get_available_forms_for_user(user_profile):
     """Get available forms for the current user."""
     if user_profile.is_admin:
@@ -0,0 +1,64 @@
+# grades/warmup.py
+"""Worker warm-up: pay library and template initialisation before taking traffic.
+
+WeasyPrint loads Pango/Cairo and scans system fonts the first time it is used,
+which otherwise lands inside the first PDF request of every worker.
+"""
+import logging
+import time
+
+from django.template.loader import get_template
+from django.urls import get_resolver
+
+logger = logging.getLogger(__name__)
+
+# Templates served on the hot paths; loading them fills the cached loader.
+WARMUP_TEMPLATES = [
+    'grades/base.html',
+    'grades/home.html',
+    'grades/student_login.html',
+    'grades/dashboard.html',
+    'grades/student_grades.html',
+    'grades/student_profile.html',
+    'grades/report_pdf.html',
+    'grades/class_ranking.html',
+    'grades/class_ranking_pdf.html',
+]
+
+
+def warm_up(render=True):
+    """Initialise URLconf, templates and WeasyPrint; return per-phase timings in seconds.
+
+    With ``render=False`` only imports and template loading happen, which is
+    safe to do in a gunicorn master before forking.  A full warm-up also lays
+    out a tiny document so fontconfig/Pango are initialised in this process.
+    Failures are logged, never raised: a worker without PDF support should
+    still serve pages.
+    """
+    timings = {}
+
+    start = time.perf_counter()
+    get_resolver().url_patterns
+    timings['urls'] = time.perf_counter() - start
+
+    start = time.perf_counter()
+    for name in WARMUP_TEMPLATES:
+        get_template(name)
+    timings['templates'] = time.perf_counter() - start
+
+    try:
+        start = time.perf_counter()
+        from grades import pdf  # noqa: F401  (sets WeasyPrint DLL path on Windows)
+        from weasyprint import HTML
+        from weasyprint.text.fonts import FontConfiguration
+        timings['weasyprint_import'] = time.perf_counter() - start
+
+        if render:
+            start = time.perf_counter()
+            HTML(string='<p>warm-up</p>').write_pdf(font_config=FontConfiguration())
+            timings['weasyprint_render'] = time.perf_counter() - start
+    except Exception as e:
+        logger.warning("PDF warm-up skipped: %s", e)
+
+    logger.info("Warm-up finished: %s", ', '.join(f"{k}={v:.3f}s" for k, v in timings.items()))
+    return timings
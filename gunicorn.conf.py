@@ -0,0 +1,70 @@
+# gunicorn.conf.py
+# Serve the ASGI application with uvicorn workers so a single process can
+# hold many concurrent student connections open (e.g. on results day).
+import os
+import time
+
+#
+# GUNICORN_POOL=pdf starts a second, isolated pool for the PDF endpoints
+# (see deploy/nginx.conf for the routing), so slow WeasyPrint renders can
+# never occupy the workers that serve results pages. It only helps behind
+# that nginx config; the Procfile runs the web pool alone.
+POOL = os.environ.get('GUNICORN_POOL', 'web')
+
+worker_class = 'uvicorn_worker.UvicornWorker'
+# Keep idle browser connections around between page loads.
+keepalive = int(os.environ.get('GUNICORN_KEEPALIVE', '75'))
+
+if POOL == 'pdf':
+    bind = f"0.0.0.0:{os.environ.get('PDF_PORT', '8001')}"
+    workers = int(os.environ.get('PDF_WORKERS', '2'))
+    # A bulk class download renders every report in one request.
+    timeout = int(os.environ.get('PDF_TIMEOUT', '300'))
+    # Recycle workers now and then; WeasyPrint's memory use creeps up.
+    max_requests = int(os.environ.get('PDF_MAX_REQUESTS', '200'))
+    max_requests_jitter = 50
+    proc_name = 'school-grades-pdf'
+else:
+    bind = f"0.0.0.0:{os.environ.get('PORT', '8000')}"
+    workers = int(os.environ.get('WEB_CONCURRENCY', '2'))
+    timeout = int(os.environ.get('GUNICORN_TIMEOUT', '120'))
+    proc_name = 'school-grades-web'
+graceful_timeout = 30
+backlog = 2048
+
+accesslog = '-'
+errorlog = '-'
+
+# Opt-in warm-up (WARMUP_WORKERS=1): initialise WeasyPrint, fonts and
+# templates before a worker accepts requests. With GUNICORN_PRELOAD=1 the
+# imports happen once in the master and are shared by forked workers.
+preload_app = os.environ.get('GUNICORN_PRELOAD', '0') == '1'
+WARMUP_WORKERS = os.environ.get('WARMUP_WORKERS', '0') == '1'
+
+
+def when_ready(server):
+    if preload_app and WARMUP_WORKERS:
+        from grades.warmup import warm_up
+        # No rendering in the master: font/Pango state is set up per worker.
+        warm_up(render=False)
+
+
+def post_fork(server, worker):
+    worker.forked_at = time.monotonic()
+
+
+def post_worker_init(worker):
+    if WARMUP_WORKERS:
+        from grades.warmup import warm_up
+        warm_up(render=True)
+    worker.log.info("Worker %s ready in %.3fs", worker.pid, time.monotonic() - worker.forked_at)
+
+
+def child_exit(server, worker):
+    # Fold the exited worker's metrics file into the archive (grades/metrics.py)
+    os.environ.setdefault('DJANGO_SETTINGS_MODULE', 'school_grades.settings')
+    from grades.metrics import compact
+    try:
+        compact([worker.pid])
+    except Exception:
+        server.log.exception("Could not compact metrics of worker %s", worker.pid)
@@ -28,6 +28,7 @@ INSTALLED_APPS = [
 ]
 
 MIDDLEWARE = [
+    'grades.metrics.MetricsMiddleware',
     'django.middleware.security.SecurityMiddleware',
     'whitenoise.middleware.WhiteNoiseMiddleware',
     'django.contrib.sessions.middleware.SessionMiddleware',
@@ -36,6 +37,14 @@ MIDDLEWARE = [
     'django.contrib.auth.middleware.AuthenticationMiddleware',
     'django.contrib.messages.middleware.MessageMiddleware',
     'django.middleware.clickjacking.XFrameOptionsMiddleware',
+    'grades.profiling.ProfilingMiddleware',
+]
+
+# Students sign in with their student ID or first name (grades/backends.py);
+# staff and teachers use their username via the standard backend.
+AUTHENTICATION_BACKENDS = [
+    'grades.backends.StudentBackend',
+    'django.contrib.auth.backends.ModelBackend',
 ]
 
 ROOT_URLCONF = 'school_grades.urls'
@@ -57,6 +66,7 @@ TEMPLATES = [
 ]
 
 WSGI_APPLICATION = 'school_grades.wsgi.application'
+ASGI_APPLICATION = 'school_grades.asgi.application'
 
 # Database - FIXED: Correct logic for Railway build and runtime
 DATABASE_URL = os.environ.get('DATABASE_URL')
@@ -66,12 +76,37 @@ DATABASE_URL = os.environ.get('DATABASE_URL')
 
 DATABASE_URL = os.environ.get('DATABASE_URL')
 
+# SQLite profile for the fallback below, which is also the supported setup
+# for small schools on one box.  WAL lets results-day reads run alongside
+# grade entry; IMMEDIATE transactions take the write lock up front, so
+# concurrent writers queue on the busy timeout instead of failing with
+# "database is locked".  Bulk jobs also queue on
+# grades.writer.serialized_writes().  `manage.py bench_sqlite` compares
+# this profile with SQLite's defaults.
+SQLITE_OPTIONS = {
+    # Seconds a writer waits for the lock (sqlite busy_timeout)
+    'timeout': int(os.environ.get('SQLITE_BUSY_TIMEOUT', '20')),
+    'transaction_mode': 'IMMEDIATE',
+    # Run on every new connection; journal_mode is stored in the file, the rest is per connection
+    'init_command': ';'.join([
+        'PRAGMA journal_mode=WAL',
+        'PRAGMA synchronous=NORMAL',
+        f"PRAGMA mmap_size={int(os.environ.get('SQLITE_MMAP_BYTES', str(256 * 1024 * 1024)))}",
+        # Negative cache_size is in KiB
+        f"PRAGMA cache_size=-{int(os.environ.get('SQLITE_CACHE_KB', '65536'))}",
+        'PRAGMA temp_store=MEMORY',
+    ]),
+}
+
 # Always try to use DATABASE_URL first (for Railway runtime)
 if DATABASE_URL:
     DATABASES = {
         'default': dj_database_url.config(
             default=DATABASE_URL,
-            conn_max_age=600,
+            # Under ASGI every request runs its sync code in a fresh thread, so
+            # persistent per-thread connections would pile up; keep them off
+            # unless a deployment explicitly opts in.
+            conn_max_age=int(os.environ.get('DB_CONN_MAX_AGE', '0')),
             conn_health_checks=True,
         )
     }
@@ -81,7 +116,8 @@ else:
     DATABASES = {
         'default': {
             'ENGINE': 'django.db.backends.sqlite3',
-            'NAME': BASE_DIR / 'db.sqlite3',
+            'NAME': os.environ.get('SQLITE_PATH', BASE_DIR / 'db.sqlite3'),
+            'OPTIONS': SQLITE_OPTIONS,
         }
     }
 
@@ -101,9 +137,74 @@ STATIC_ROOT = os.path.join(BASE_DIR, 'staticfiles')
 # WhiteNoise configuration for serving static files
 STATICFILES_STORAGE = 'whitenoise.storage.CompressedManifestStaticFilesStorage'
 
-# Email configuration
-EMAIL_BACKEND = 'django.core.mail.backends.console.EmailBackend'
-DEFAULT_FROM_EMAIL = 'no-reply@example.com'
+# PDF rendering: size of the thread pool async views hand WeasyPrint work to
+PDF_RENDER_THREADS = int(os.environ.get('PDF_RENDER_THREADS', '2'))
+
+# Node-wide cap on concurrent PDF renders (shared by all workers through lock
+# files). Up to PDF_RENDER_QUEUE_SIZE more requests wait PDF_RENDER_QUEUE_TIMEOUT
+# seconds for a slot; beyond that the client gets 429 with Retry-After.
+PDF_MAX_CONCURRENT_RENDERS = int(os.environ.get('PDF_MAX_CONCURRENT_RENDERS', '2'))
+PDF_RENDER_QUEUE_SIZE = int(os.environ.get('PDF_RENDER_QUEUE_SIZE', '8'))
+PDF_RENDER_QUEUE_TIMEOUT = float(os.environ.get('PDF_RENDER_QUEUE_TIMEOUT', '10'))
+PDF_RENDER_LOCK_DIR = os.environ.get('PDF_RENDER_LOCK_DIR') or None
+
+# Cache computed report cards (seconds; 0 disables). Keys change whenever a
+# grade in the student's form/term changes, so entries never go stale.
+REPORT_CARD_CACHE_SECONDS = int(os.environ.get('REPORT_CARD_CACHE_SECONDS', '0'))
+
+# Cache transcripts and their PDFs (seconds; 0 disables). Keyed on the same
+# kind of version (every grade and publication in the form), so this only
+# bounds how long unused entries stay around.
+TRANSCRIPT_CACHE_SECONDS = int(os.environ.get('TRANSCRIPT_CACHE_SECONDS', '3600'))
+
+# Live class ranking streams (grades/live.py) check for saved grades this
+# often, and close after LIVE_RANKING_MAX_SECONDS so browsers reconnect with
+# a fresh snapshot rather than holding a worker connection indefinitely.
+LIVE_RANKING_POLL_SECONDS = float(os.environ.get('LIVE_RANKING_POLL_SECONDS', '2'))
+LIVE_RANKING_MAX_SECONDS = float(os.environ.get('LIVE_RANKING_MAX_SECONDS', '300'))
+
+# Academic year a new database starts in. The live year is then stored in the
+# database (AcademicCalendar) and only `manage.py promote_students` moves it
+# on; closed years are moved out with `manage.py archive_year`. Unset, a new
+# database starts in the year under way, with years starting every
+# ACADEMIC_YEAR_START_MONTH (which also decides labels such as 2025/26).
+ACADEMIC_YEAR = int(os.environ.get('ACADEMIC_YEAR', '0')) or None
+ACADEMIC_YEAR_START_MONTH = int(os.environ.get('ACADEMIC_YEAR_START_MONTH', '1'))
+# How long a worker may use its cached live academic year before re-reading
+# it; promotion clears it immediately in the process that runs it
+ACADEMIC_YEAR_CACHE_SECONDS = int(os.environ.get('ACADEMIC_YEAR_CACHE_SECONDS', '60'))
+# Where archive_year writes compressed per-year exports
+ARCHIVE_EXPORT_DIR = os.environ.get('ARCHIVE_EXPORT_DIR', os.path.join(BASE_DIR, 'archive'))
+
+# How long a worker may use its cached curriculum (form -> subjects) map
+# before re-reading Subject; edits in the same worker clear it immediately
+CURRICULUM_CACHE_SECONDS = int(os.environ.get('CURRICULUM_CACHE_SECONDS', '300'))
+
+# Where admin-requested request profiles (?_profile=1) are written
+PROFILE_DIR = os.environ.get('PROFILE_DIR', os.path.join(BASE_DIR, 'profiles'))
+
+# Metrics: per-worker files merged by /metrics; exited workers' files are
+# folded into one archive file, so keep METRICS_DIR local to each node.
+# Scrapers authenticate with "Authorization: Bearer $METRICS_TOKEN"; without
+# a token only admins can view.
+METRICS_DIR = os.environ.get('METRICS_DIR') or None
+METRICS_TOKEN = os.environ.get('METRICS_TOKEN', '')
+
+# Email configuration. Use the file backend (with EMAIL_FILE_PATH) or locmem
+# to try out `manage.py email_reports` locally.
+EMAIL_BACKEND = os.environ.get('EMAIL_BACKEND', 'django.core.mail.backends.console.EmailBackend')
+DEFAULT_FROM_EMAIL = os.environ.get('DEFAULT_FROM_EMAIL', 'no-reply@example.com')
+EMAIL_HOST = os.environ.get('EMAIL_HOST', 'localhost')
+EMAIL_PORT = int(os.environ.get('EMAIL_PORT', '25'))
+EMAIL_HOST_USER = os.environ.get('EMAIL_HOST_USER', '')
+EMAIL_HOST_PASSWORD = os.environ.get('EMAIL_HOST_PASSWORD', '')
+EMAIL_USE_TLS = os.environ.get('EMAIL_USE_TLS', 'False') == 'true'
+EMAIL_FILE_PATH = os.environ.get('EMAIL_FILE_PATH', os.path.join(BASE_DIR, 'sent_emails'))
+
+# email_reports: messages per SMTP send_messages() call, and the most
+# messages per minute it sends (0 = unthrottled)
+REPORT_EMAIL_BATCH_SIZE = int(os.environ.get('REPORT_EMAIL_BATCH_SIZE', '20'))
+REPORT_EMAIL_RATE_PER_MINUTE = int(os.environ.get('REPORT_EMAIL_RATE_PER_MINUTE', '120'))
 
 # Admin site customization
 ADMIN_SITE_HEADER = "Fortune Seekers School Administration"